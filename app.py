@@ -1,11 +1,17 @@
 
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, jsonify, url_for, flash, session, redirect
+from flask import Flask, render_template, request, jsonify, url_for, flash, session, redirect, Response, stream_with_context
 app = Flask(__name__)
 app.secret_key = "supersecretkey123"
 
 import os
 import json
+import base64
+import io
+import hmac
+import numpy as np
+from urllib.parse import quote
+from werkzeug.http import http_date
 from pymongo import MongoClient
 from bson import ObjectId
 from datetime import datetime, timedelta
@@ -17,14 +23,23 @@ from utils.generate_deadlines import GenerateDeadlines
 from utils.generate_req_docs import Generate_Documents
 import glob
 from dotenv import load_dotenv
-from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from utils.doc_reference_generator import handle_document_reference_request
+from utils.doc_reference_generator import handle_document_reference_request, stream_document_reference
+from utils.retriever import get_retriever
+from utils.similar_cases import build_similar_queries, explain_in_background
+from utils.semantic_cache import SemanticCache
+from utils.embeddings import EmbeddingStore, embed_texts, text_key, EMBED_MAX_TEXTS, EMBED_MAX_CHARS
+from utils import llm_gateway
+from utils.job_queue import JobQueue, job_response
+from utils.llm_schemas import parse_stats
+from utils.verify_strategy import run_gemini_verification
+from utils import query_pipeline
+from utils.blob_store import create_blob_store, read_payload, BlobTooLarge, BLOB_CHUNK_SIZE, blob_key
+from utils.upload_sessions import UploadSessions, UploadError
+from utils.records import Records
+from utils.image_prep import ScanImagePreparer, UnsupportedDocument
 import ssl
-from google import genai
 import re
-FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "faiss_index")
 # Load environment variables
 load_dotenv()
 
@@ -34,7 +49,8 @@ client = MongoClient(
     tls=True,
     tlsCAFile=ssl.get_default_verify_paths().cafile
 )
-db = client["soven_legal"]
+# The load test points this at its own database, so benchmark data never lands in production
+db = client[os.getenv("MONGO_DB", "soven_legal")]
 
 # Collections
 users = db["users"]
@@ -42,11 +58,113 @@ documents = db["documents"]
 deadlines_col = db["deadlines"]
 answers_col = db["find_users"]
 lawyers = db["lawyers"]
+# Reads of documents go through named views so listings never fetch file payloads
+document_records = Records(documents)
+embedding_store = EmbeddingStore(db["query_embeddings"])
+llm_gateway.configure_prompt_cache(db["llm_prompt_cache"])
+llm_gateway.configure_token_ledger(db["llm_token_usage"])
+# Uploaded files live here, keyed by SHA-256; records keep only metadata and blob_key
+blob_store = create_blob_store(db)
+# Resumable uploads in pieces, assembled on disk and then moved into the blob store
+upload_sessions = UploadSessions(db["upload_sessions"])
+# Scans send Gemini a downscaled, re-encoded derivative, cached by the upload's content hash
+scan_images = ScanImagePreparer(blob_store, db["scan_images"])
 bcrypt = Bcrypt(app)
 
 # Google API key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# Ask Gemini why each similar case succeeded, after the find_users page is served
+EXPLAIN_SIMILAR_CASES = os.getenv("EXPLAIN_SIMILAR_CASES", "true").lower() == "true"
+
+# find_users answers are shared between users of the same tenant. Users
+# without a tenant_id (all of them, until tenants are provisioned) share
+# DEFAULT_TENANT, so today the cache is global. That is safe: a cached
+# answer holds only cases from the shared corpus, never the asker's query.
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+semantic_cache = SemanticCache()
+
+# LLM-backed endpoints enqueue here and answer 202; clients poll /api/jobs/<id>
+job_queue = JobQueue(db["jobs"])
+job_queue.start()
+
+
+def wants_stream():
+    """Clients opt into token streaming with Accept: text/event-stream"""
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse_response(events):
+    """Relay (event, data) pairs to the browser as Server-Sent Events"""
+    def render():
+        for event, data in events:
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return Response(
+        stream_with_context(render()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def blob_response(fileobj, size, etag, content_type, filename, last_modified=None, as_attachment=False):
+    """
+    Serve a seekable file object in BLOB_CHUNK_SIZE pieces. The ETag is the
+    content hash, so If-None-Match answers 304 without reading the file, and
+    a single Range (guarded by If-Range) answers 206. Multi-range requests
+    get the whole file.
+    """
+    headers = {
+        "ETag": f'"{etag}"',
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"{'attachment' if as_attachment else 'inline'}; filename*=UTF-8''{quote(filename or 'file')}"
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if request.if_none_match.contains_weak(etag):
+        fileobj.close()
+        return Response(status=304, headers=headers)
+
+    start, stop, status = 0, size, 200
+    range_header = request.range
+    if_range = request.if_range
+    range_applies = not (if_range.etag or if_range.date) or if_range.etag == etag
+    if range_header is not None and range_applies and len(range_header.ranges) == 1:
+        bounds = range_header.range_for_length(size)
+        if bounds is None:
+            fileobj.close()
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status=416, headers=headers)
+        start, stop = bounds
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+
+    def body():
+        try:
+            fileobj.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = fileobj.read(min(BLOB_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            fileobj.close()
+
+    headers["Content-Length"] = str(stop - start)
+    return Response(body(), status=status, headers=headers,
+                    mimetype=content_type or "application/octet-stream", direct_passthrough=True)
+
+
+# Load the find_users embedding model and FAISS index once per worker
+if os.getenv("RETRIEVER_WARMUP", "true").lower() == "true":
+    try:
+        get_retriever().warm_up()
+    except Exception as e:
+        print(f"Retriever warm-up failed: {str(e)}")
+
 
 #ROUTES
 
@@ -120,7 +238,7 @@ def documents_list():
         return redirect(url_for("login"))
 
     user_id = session["user"]
-    docs = list(documents.find({"user_id": user_id}))
+    docs = list(document_records.find({"user_id": user_id}, "list"))
     for doc in docs:
         doc["id"] = str(doc["_id"])
         doc["scan_status"] = doc.get("scan_status", "pending")
@@ -138,18 +256,126 @@ def documents_list():
     )   
 
 
+def upload_fields():
+    """Metadata of an upload request: the form fields of a multipart body, else the JSON body"""
+    if request.files:
+        return request.form
+    return request.get_json(silent=True) or {}
+
+
+def upload_source():
+    """(filename, content_type) as announced by the client, before any bytes are stored"""
+    upload = request.files.get("file")
+    if upload is not None:
+        return upload.filename or "", upload.mimetype or ""
+    upload_id = upload_fields().get("upload_id")
+    if upload_id:
+        upload_session = upload_sessions.get(upload_id, session.get("user"))
+        return upload_session["filename"], upload_session["content_type"]
+    return "", ""
+
+
+def receive_upload(user_id, legacy_field, max_size=None):
+    """
+    Store the file of an upload request in the blob store, whichever way it
+    was sent:
+      - multipart/form-data with a `file` part, streamed from Werkzeug's
+        spooled temp file;
+      - JSON {"upload_id": ...} naming a finished /api/uploads session;
+      - JSON with the whole file base64-encoded in `legacy_field` (older clients).
+    Returns (blob_key, size).
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        return blob_store.put_file(upload.stream, max_size=max_size)
+
+    data = upload_fields()
+    if data.get("upload_id"):
+        key, size, _ = upload_sessions.complete(data["upload_id"], user_id, blob_store, max_size=max_size)
+        return key, size
+
+    if not data.get(legacy_field):
+        raise UploadError(f"Missing {legacy_field}")
+    file_bytes = base64.b64decode(data[legacy_field].split(",")[-1])
+    if max_size is not None and len(file_bytes) > max_size:
+        raise BlobTooLarge(f"File is larger than {max_size} bytes")
+    return blob_store.put(file_bytes), len(file_bytes)
+
+
+@app.route("/api/uploads", methods=["POST"])
+def create_upload():
+    """Start a resumable upload: {"filename", "size", "content_type"}"""
+    owner = session.get("user")
+    if not owner:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json() or {}
+    try:
+        upload = upload_sessions.create(owner, data.get("filename", ""), data.get("size"), data.get("content_type", ""))
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    upload["upload_url"] = url_for("upload_chunk", upload_id=upload["upload_id"])
+    return jsonify(upload), 201
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+def get_upload(upload_id):
+    """Where to resume: the number of bytes accepted so far"""
+    owner = session.get("user")
+    if not owner:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        upload = upload_sessions.get(upload_id, owner)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({"upload_id": upload_id, "offset": upload["offset"], "size": upload["size"]})
+
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT"])
+def upload_chunk(upload_id):
+    """Append one piece; the raw body carries Content-Range: bytes <start>-<end>/<total>"""
+    owner = session.get("user")
+    if not owner:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    match = re.match(r"bytes (\d+)-(\d+)/(\d+)$", request.headers.get("Content-Range", ""))
+    if not match:
+        return jsonify({"error": "Content-Range header required"}), 400
+    start, end = int(match.group(1)), int(match.group(2))
+
+    try:
+        offset = upload_sessions.append(upload_id, owner, start, request.stream, end - start + 1)
+    except UploadError as e:
+        return jsonify({"error": str(e), "offset": e.offset}), e.status
+    upload = upload_sessions.get(upload_id, owner)
+    return jsonify({"upload_id": upload_id, "offset": offset, "size": upload["size"],
+                    "complete": offset == upload["size"]})
+
+
 @app.route("/document/upload", methods=["POST"])
 def upload_document():
-    data = request.get_json()
     user_id = session.get("user")
 
     if not user_id:
         return jsonify({"error": "Unauthorized"}), 401
 
+    fields = upload_fields()
+    if not fields.get("name"):
+        return jsonify({"error": "Missing name"}), 400
+
+    try:
+        _, content_type = upload_source()
+        key, size = receive_upload(user_id, "file")
+    except (UploadError, BlobTooLarge) as e:
+        return jsonify({"error": str(e)}), getattr(e, "status", 400)
+
     doc = {
         "user_id": user_id,
-        "name": data["name"],
-        "base64_format": data["file"],
+        "name": fields["name"],
+        "blob_key": key,
+        "blob_size": size,
+        "content_type": content_type,
         "api_status": "not scanned yet",
         "scan_status": "pending",
         "uploaded_at": datetime.utcnow()
@@ -167,11 +393,29 @@ from utils.doc_scan import Image_Analyser
 @app.route("/document/scan/<doc_id>", methods=["POST"])
 def scan_document(doc_id):
     # Fetch document
-    doc = documents.find_one({"_id": ObjectId(doc_id)})
-    if not doc or "base64_format" not in doc:
+    doc = document_records.find_one(
+        {"_id": ObjectId(doc_id), "$or": [{"blob_key": {"$exists": True}}, {"base64_format": {"$exists": True}}]},
+        "owner"
+    )
+    if not doc:
         return jsonify({"error": "No image found for this document"}), 400
 
-    base64_data = doc["base64_format"]
+    job_id = job_queue.enqueue("scan_document", owner=doc.get("user_id") or session.get("user"), doc_id=doc_id)
+    return jsonify(job_response(job_id)), 202
+
+
+@job_queue.handler("scan_document")
+def scan_document_job(doc_id):
+    doc = document_records.find_one({"_id": ObjectId(doc_id)}, "payload")
+    image_bytes = read_payload(blob_store, doc, "base64_format") if doc else None
+    if not image_bytes:
+        return {"error": "No image found for this document"}, 400
+
+    try:
+        prepared = scan_images.prepare(image_bytes, source_key=doc.get("blob_key"))
+    except UnsupportedDocument as e:
+        return {"error": str(e)}, 415
+
     query = doc.get("query", "General legal validation")
     doc_type = doc.get("doc_type", doc.get("name", "unknown"))
     
@@ -196,7 +440,9 @@ def scan_document(doc_id):
         analyzer = Image_Analyser(
             query=query,
             doc_type=doc_type,
-            base64_data=base64_data,
+            base64_data=None,
+            image_bytes=prepared.data,
+            mime_type=prepared.mime_type,
             required_elements=required_elements,
             visual_reference=visual_reference
         )
@@ -222,21 +468,21 @@ def scan_document(doc_id):
             {"$set": update_data}
         )
 
-        return jsonify({
+        return {
             "message": "Document scanned successfully!",
             "result": result,
             "summary": update_data["scan_summary"]
-        })
+        }, 200
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 @app.route("/user/<user_id>/document_status", methods=["GET"])
 def get_user_document_status(user_id):
     """
     Get comprehensive document status for a user including compliance
     """
     try:
-        user_docs = documents.find({"user_id": user_id})
+        user_docs = document_records.find({"user_id": user_id}, "status")
         doc_status = []
         
         for doc in user_docs:
@@ -525,13 +771,22 @@ def analyse_query():
         if not query_text:
             return jsonify({"error": "No query provided"}), 400
 
+        user_id = session["user"]
+        job_id = job_queue.enqueue("analyse_query", owner=user_id, user_id=user_id, query_text=query_text)
+        return jsonify(job_response(job_id)), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@job_queue.handler("analyse_query")
+def analyse_query_job(user_id, query_text):
+    try:
         qa = Query_Analysis(query_text)
         result = qa.call_api()
 
         if "status" not in result:
-            return jsonify({"error": "Analysis failed"}), 500
-
-        user_id = session["user"]
+            return {"error": "Analysis failed"}, 500
 
         update_data = {
             "scan_status": True,
@@ -545,15 +800,25 @@ def analyse_query():
             {"$set": update_data}
         )
 
-        return jsonify({"message": "Analysis complete", "result": result})
+        return {"message": "Analysis complete", "result": result}, 200
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
     
     
 @app.route("/generate_deadlines/<query_id>", methods=["POST"])
 def generate_deadlines(query_id):
+    query = queries.find_one({"_id": ObjectId(query_id)}, {"user_id": 1})
+    if not query:
+        return jsonify({"status": "error", "message": "Query not found"}), 404
+
+    job_id = job_queue.enqueue("generate_deadlines", owner=query.get("user_id"), query_id=query_id)
+    return jsonify(job_response(job_id)), 202
+
+
+@job_queue.handler("generate_deadlines")
+def generate_deadlines_job(query_id):
     print(f"=== GENERATE DEADLINES DEBUG ===")
     print(f"Query ID received: {query_id}")
     
@@ -562,7 +827,7 @@ def generate_deadlines(query_id):
         query = queries.find_one({"_id": ObjectId(query_id)})
         if not query:
             print("ERROR: Query not found in database")
-            return jsonify({"status": "error", "message": "Query not found"}), 404
+            return {"status": "error", "message": "Query not found"}, 404
         
         query_text = query.get("text", "")
         print(f"Query found: {query_text}")
@@ -620,16 +885,16 @@ def generate_deadlines(query_id):
             saved_deadlines = updated_query.get("deadlines", [])
             print(f"Verification - deadlines in DB: {len(saved_deadlines)}")
             
-            return jsonify({"status": "success", "deadlines": processed_deadlines})
+            return {"status": "success", "deadlines": processed_deadlines}, 200
         else:
             print("No valid deadlines generated")
-            return jsonify({"status": "error", "message": "Could not generate any valid deadlines"})
+            return {"status": "error", "message": "Could not generate any valid deadlines"}, 200
         
     except Exception as e:
         print(f"EXCEPTION in generate_deadlines: {str(e)}")
         import traceback
         print(f"Traceback: {traceback.format_exc()}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return {"status": "error", "message": str(e)}, 500
 
 
 def generate_fallback_deadlines(query_text):
@@ -724,16 +989,26 @@ def get_single_query(query_id):
 
 @app.route("/generate_documents/<query_id>", methods=["POST"])
 def generate_documents(query_id):
-    query = queries.find_one({"_id": ObjectId(query_id)})
+    query = queries.find_one({"_id": ObjectId(query_id)}, {"user_id": 1})
     if not query:
         return jsonify({"status": "error", "message": "Query not found"}), 404
 
+    job_id = job_queue.enqueue("generate_documents", owner=query.get("user_id"), query_id=query_id)
+    return jsonify(job_response(job_id)), 202
+
+
+@job_queue.handler("generate_documents")
+def generate_documents_job(query_id):
+    query = queries.find_one({"_id": ObjectId(query_id)})
+    if not query:
+        return {"status": "error", "message": "Query not found"}, 404
+
     try:
         generator = Generate_Documents(query["text"])
         documents_data = generator.call_api()
 
         if "error" in str(documents_data):
-            return jsonify({"status": "error", "message": "Failed to generate documents"}), 400
+            return {"status": "error", "message": "Failed to generate documents"}, 400
 
         queries.update_one(
             {"_id": ObjectId(query_id)},
@@ -743,13 +1018,74 @@ def generate_documents(query_id):
             }}
         )
 
-        return jsonify({
+        return {
             "status": "success", 
             "documents": documents_data.get("documents", [])
-        })
+        }, 200
         
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return {"status": "error", "message": str(e)}, 500
+
+
+@app.route("/analyse_query/full/<query_id>", methods=["POST"])
+def analyse_query_full(query_id):
+    """Analysis, deadlines and documents for a saved query, written back in one update"""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    query = queries.find_one({"_id": ObjectId(query_id), "user_id": session["user"]}, {"_id": 1})
+    if not query:
+        return jsonify({"status": "error", "message": "Query not found"}), 404
+
+    job_id = job_queue.enqueue("analyse_query_full", owner=session["user"], query_id=query_id)
+    return jsonify(job_response(job_id)), 202
+
+
+@job_queue.handler("analyse_query_full")
+def analyse_query_full_job(query_id):
+    query = queries.find_one({"_id": ObjectId(query_id)}, {"text": 1})
+    if not query:
+        return {"status": "error", "message": "Query not found"}, 404
+
+    query_text = query.get("text", "")
+    result = query_pipeline.analyse_query(query_text)
+    analysis = result["analysis"]
+
+    raw_deadlines = result["deadlines"] or []
+    if not raw_deadlines and (analysis or {}).get("status") != "irrelevant":
+        raw_deadlines = generate_fallback_deadlines(query_text)
+        if result["deadlines"] is None:
+            result["sources"]["deadlines"] = "template"
+    deadlines = [
+        {
+            "id": str(ObjectId()),
+            "task": dl["task"].strip(),
+            "due_date": dl["due_date"].strip(),
+            "completed": dl.get("completed", False)
+        }
+        for dl in raw_deadlines
+    ]
+
+    update = {"deadlines": deadlines}
+    if analysis is not None:
+        update.update({"scan_status": True, "scan_result": analysis["message"]})
+    if result["documents"] is not None:
+        update.update({"documents": result["documents"], "documents_generated_at": datetime.utcnow()})
+    queries.update_one({"_id": ObjectId(query_id)}, {"$set": update})
+
+    # A section that failed validation is None; only the valid ones were saved
+    failed = [name for name, source in result["sources"].items() if source == "failed"]
+    response = {
+        "status": "partial" if failed else "success",
+        "result": analysis,
+        "deadlines": deadlines,
+        "documents": result["documents"] or [],
+        "sources": result["sources"]
+    }
+    if failed:
+        response["failed"] = failed
+        response["message"] = f"Could not generate: {', '.join(failed)}"
+    return response, 200
 
 
 # Serve Lawyers Page (HTML)
@@ -927,7 +1263,7 @@ def get_user_progress(user_id):
     
     try:
         user_queries = list(queries.find({"user_id": user_id}))
-        user_docs = list(documents.find({"user_id": user_id}))
+        user_docs = list(document_records.find({"user_id": user_id}, "progress"))
         user_deadlines = list(deadlines.find({"user_id": user_id}))
         
         progress_data = {
@@ -1026,17 +1362,34 @@ def generate_chat_assistance(chat_id):
         )
         print("=== [DEBUG] ChatWithLawyer Initialized ===")
 
+        context = {
+            "main_query": main_query,
+            "progress_percentage": progress_data.get('overall_completion', 0),
+            "recent_messages": len(chat.get("messages", []))
+        }
+
+        if wants_stream():
+            def events():
+                yield "context", context
+                reply = []
+                try:
+                    for chunk in chat_assistant.stream_reply():
+                        reply.append(chunk)
+                        yield "chunk", chunk
+                except Exception as e:
+                    yield "error", {"success": False, "error": str(e)}
+                    return
+                yield "done", {"success": True, "suggested_message": "".join(reply).strip()}
+
+            return sse_response(events())
+
         response = chat_assistant.generate_response()
         print(f"=== [DEBUG] AI Response: {response} ===")
 
         return jsonify({
             "success": True,
             "suggested_message": response.get("assistant_reply", ""),
-            "context": {
-                "main_query": main_query,
-                "progress_percentage": progress_data.get('overall_completion', 0),
-                "recent_messages": len(chat.get("messages", []))
-            }
+            "context": context
         })
 
     except Exception as e:
@@ -1087,10 +1440,6 @@ def chat_interface():
 
 @app.route("/find_users/<query_id>", methods=["GET"])
 def answer_query(query_id):
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vectorstore = FAISS.load_local("faiss_index", embedding_model, allow_dangerous_deserialization=True)
-    retriever = FAISS.load_local("faiss_index", embedding_model, allow_dangerous_deserialization=True).as_retriever(search_kwargs={"k": 6})
     if "user" not in session:
         return redirect(url_for("login"))
 
@@ -1119,80 +1468,31 @@ def answer_query(query_id):
         query_text = query_doc["text"]
         print(f"Processing new query: {query_text}")
 
-        # Retrieve docs
+        # Serve a near-identical query answered earlier within the same tenant
+        user = users.find_one({"_id": ObjectId(user_id)}, {"tenant_id": 1}) or {}
+        tenant_id = user.get("tenant_id", DEFAULT_TENANT)
         try:
-            docs = retriever.invoke(query_text)
-            context = "\n".join([d.page_content for d in docs[:6]])
-            print(f"Retrieved {len(docs)} documents from FAISS")
+            query_embedding = embed_texts([query_text], store=embedding_store)[0]
+            cached = semantic_cache.lookup(tenant_id, query_embedding)
         except Exception as e:
-            print(f"FAISS retrieval error: {str(e)}")
+            print(f"Query embedding error: {str(e)}")
             return jsonify({"error": "Failed to retrieve similar documents"}), 500
 
-        # Generate response
-        # llm = ChatGoogleGenerativeAI(
-        #     model="gemini-1.5-pro",
-        #     google_api_key=GEMINI_API_KEY,
-        #     temperature=0.2,
-        #     max_output_tokens=512
-        # )
-
-        prompt = f"""
-You are a legal AI assistant that finds similar legal queries. 
-Based on the context provided, return the 6 most similar queries to the user's query.
-
-Return ONLY a valid JSON object with this exact structure:
-
-{{
-  "similar_queries": {{
-    "Query1": {{
-      "OID": "string",
-      "name": "string",
-      "advocate": "string",
-      "Query": "string",
-      "state_of_resolvation": "Yes/No",
-      "how_it_got_resolved": "string"
-    }},
-    "Query2": {{ ... }},
-    "Query3": {{ ... }},
-    "Query4": {{ ... }},
-    "Query5": {{ ... }},
-    "Query6": {{ ... }}
-  }}
-}}
-
-Context (similar legal documents/queries): {context}
-
-User query: {query_text}
-
-⚠️ IMPORTANT: 
-- Return only the JSON object, no additional text, no explanations. 
-- Replace `...` with actual data. 
-- Ensure valid JSON syntax.
-"""
-
-        try:
-            api_key = os.environ.get("GEMINI_API_KEY")
-            client = genai.Client(api_key=api_key)
-            resp = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[prompt]
-            )
-            
-            response = resp.text.strip()
-
-            start = response.find("{")
-            end = response.rfind("}") + 1
-            output = response[start:end]
-
+        if cached:
+            similar_queries, similarity, cache_key = cached
+            print(f"Semantic cache hit for query_id: {query_id} (similarity {similarity:.3f})")
+            data = {"query": query_text, "similar_queries": similar_queries}
+        else:
+            # Retrieve similar cases and build the payload from their stored fields
             try:
-                data = json.loads(output)
-                print(data)
-            except json.JSONDecodeError:
-                print("JSON parsing failed")
-                data = {"query": query_text, "similar_queries": {}}
-        except Exception as e:
-            print(f"LLM call failed: {str(e)}")
-            return jsonify({"error": "AI call failed"}), 500
+                docs = get_retriever().search(query_text, embedding=query_embedding)
+                print(f"Retrieved {len(docs)} documents from FAISS")
+            except Exception as e:
+                print(f"FAISS retrieval error: {str(e)}")
+                return jsonify({"error": "Failed to retrieve similar documents"}), 500
+
+            data = {"query": query_text, "similar_queries": build_similar_queries(docs)}
+            cache_key = semantic_cache.store(tenant_id, query_embedding, data["similar_queries"])
 
         # Save to cache
         try:
@@ -1203,6 +1503,19 @@ User query: {query_text}
                 "created_at": datetime.utcnow()
             })
             print(f"Saved result to cache for query_id: {query_id}")
+
+            # Explanations are written back to the semantic cache entry, so only a
+            # hit that arrives before they do pays for another ExplainSuccess call
+            unexplained = {
+                key: case for key, case in data["similar_queries"].items() if not case.get("why_it_succeeded")
+            }
+            if EXPLAIN_SIMILAR_CASES and unexplained:
+                explain_in_background(
+                    answers_col, query_id, user_id, query_text, unexplained,
+                    on_explained=lambda explanations: semantic_cache.annotate(
+                        tenant_id, cache_key, "why_it_succeeded", explanations
+                    )
+                )
         except Exception as e:
             print(f"Database save error: {str(e)}")
 
@@ -1218,6 +1531,148 @@ User query: {query_text}
         print(f"Unexpected error in answer_query: {str(e)}")
         return jsonify({"error": "An unexpected error occurred"}), 500
 
+@app.route("/api/embeddings/batch", methods=["POST"])
+def batch_embeddings():
+    """
+    Embed many texts as a background job. Accepts {"texts": [...]} or
+    {"query_ids": [...]} for the current user's saved queries and answers
+    202. Once the job succeeds, fetch the vectors from
+    /api/embeddings/batch/<job_id>.
+    """
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        data = request.get_json() or {}
+        texts = data.get("texts")
+        if texts is None and data.get("query_ids"):
+            query_ids = [ObjectId(qid) for qid in data["query_ids"] if ObjectId.is_valid(qid)]
+            by_id = {
+                str(q["_id"]): q.get("text", "")
+                for q in queries.find({"_id": {"$in": query_ids}, "user_id": session["user"]}, {"text": 1})
+            }
+            texts = [by_id[str(qid)] for qid in query_ids if str(qid) in by_id]
+
+        if not isinstance(texts, list) or not texts:
+            return jsonify({"error": "Provide a non-empty list of texts or query_ids"}), 400
+        if len(texts) > EMBED_MAX_TEXTS:
+            return jsonify({"error": f"At most {EMBED_MAX_TEXTS} texts per request"}), 400
+        texts = [str(text) for text in texts]
+        if sum(len(text) for text in texts) > EMBED_MAX_CHARS:
+            return jsonify({"error": f"At most {EMBED_MAX_CHARS} characters per request"}), 413
+
+        job_id = job_queue.enqueue("batch_embeddings", owner=session["user"], texts=texts)
+        return jsonify(job_response(job_id)), 202
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@job_queue.handler("batch_embeddings")
+def batch_embeddings_job(texts):
+    # Vectors go to the embedding store; the job result only names them, keeping it far below 16 MB
+    vectors = embed_texts(texts, store=embedding_store)
+    return {"count": int(vectors.shape[0]), "dim": int(vectors.shape[1]),
+            "keys": [text_key(text) for text in texts]}, 200
+
+
+@app.route("/api/embeddings/batch/<job_id>", methods=["GET"])
+def batch_embeddings_result(job_id):
+    """Vectors of a finished batch job as JSON, or a .npy array with ?format=npy"""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = job_queue.get(job_id)
+    if not job or job.get("owner") != session["user"] or job.get("name") != "batch_embeddings":
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] != "succeeded":
+        return jsonify({"job_id": job_id, "status": job["status"], "error": job.get("error")}), 409
+
+    keys = job["result"]["keys"]
+    found = embedding_store.get_many(set(keys))
+    if len(found) < len(set(keys)):
+        return jsonify({"error": "Vectors have expired; submit the batch again"}), 410
+
+    vectors = np.stack([found[key] for key in keys])
+    if request.args.get("format") == "npy":
+        buffer = io.BytesIO()
+        np.save(buffer, vectors)
+        return app.response_class(buffer.getvalue(), mimetype="application/octet-stream")
+
+    return jsonify({
+        "count": int(vectors.shape[0]),
+        "dim": int(vectors.shape[1]),
+        "vectors": vectors.tolist()
+    })
+
+def is_admin_request():
+    """Operator endpoints need the X-Admin-Token header to match INDEX_ADMIN_TOKEN"""
+    admin_token = os.getenv("INDEX_ADMIN_TOKEN")
+    return bool(admin_token) and hmac.compare_digest(request.headers.get("X-Admin-Token", ""), admin_token)
+
+@app.route("/api/metrics", methods=["GET"])
+def get_metrics():
+    """Process-level metrics for this worker"""
+    if not is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify({
+        "retriever": get_retriever().get_metrics(),
+        "semantic_cache": semantic_cache.get_metrics(),
+        "prompt_cache": llm_gateway.prompt_cache.get_metrics(),
+        "job_queue": job_queue.get_metrics(),
+        "llm_streams": llm_gateway.stream_stats.get_metrics(),
+        "query_pipeline": dict(query_pipeline.pipeline_metrics),
+        "llm_parsing": parse_stats.get_metrics(),
+        "llm_limiter": llm_gateway.limiter.get_metrics(),
+        "llm_resilience": llm_gateway.resilience.get_metrics(),
+        "llm_tokens": llm_gateway.token_ledger.get_metrics(),
+        "scan_images": scan_images.get_metrics()
+    })
+
+@app.route("/api/metrics/tokens", methods=["GET"])
+def get_token_usage():
+    """Token usage per route across all workers, from the hourly Mongo rollups"""
+    if not is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        hours = int(request.args.get("hours", 24))
+        llm_gateway.token_ledger.flush()
+        return jsonify({"hours": hours, "routes": llm_gateway.token_ledger.rollup(hours)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    owner = job.get("owner")
+    if owner and owner not in (session.get("user"), session.get("lawyer")):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    response = {"job_id": job_id, "status": job["status"]}
+    if job["status"] in ("succeeded", "failed"):
+        response["http_status"] = job.get("http_status")
+        response["result"] = job.get("result")
+        response["error"] = job.get("error")
+    return jsonify(response)
+
+
+@app.route("/api/index/reload", methods=["POST"])
+def reload_index():
+    """Swap in the latest published find_users index without a restart"""
+    if not is_admin_request():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        version = get_retriever().reload(force=request.args.get("force", "false").lower() == "true")
+        return jsonify({"success": True, "index_version": version})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @app.route('/lawyer-signup')
 def lawyer_signup():
     """Render the lawyer signup page"""
@@ -1631,6 +2086,7 @@ def get_lawyer_stats():
 import base64
 import mimetypes
 case_files = db["case_files"]
+case_file_records = Records(case_files)
 
 @app.route("/upload-case-file")
 def upload_case_file_page():
@@ -1647,33 +2103,44 @@ def upload_case_file():
         return jsonify({"success": False, "message": "Unauthorized"}), 401
     
     try:
-        data = request.get_json()
+        # Multipart form, finished /api/uploads session, or the older base64 JSON body
+        data = dict(upload_fields())
         user_id = session["user"]
+        try:
+            filename, content_type = upload_source()
+        except UploadError as e:
+            return jsonify({"success": False, "message": str(e)}), e.status
+        data.setdefault('original_name', filename)
+        data.setdefault('file_type', os.path.splitext(data['original_name'] or "")[1].lstrip("."))
         
         # Validate required fields
-        required_fields = ['file_name', 'original_name', 'file_type', 'file_size', 'base64_data', 'file_category']
+        required_fields = ['file_name', 'original_name', 'file_type', 'file_category']
         for field in required_fields:
             if not data.get(field):
                 return jsonify({"success": False, "message": f"Missing {field}"}), 400
         
-        max_size = 10 * 1024 * 1024  
-        if data['file_size'] > max_size:
-            return jsonify({"success": False, "message": "File size too large. Maximum 10MB allowed."}), 400
-        
         # Validate file type
         allowed_extensions = ['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png', 'txt', 'xls', 'xlsx']
         if data['file_type'].lower() not in allowed_extensions:
             return jsonify({"success": False, "message": "File type not allowed"}), 400
         
+        max_size = 10 * 1024 * 1024  
+        try:
+            key, size = receive_upload(user_id, 'base64_data', max_size=max_size)
+        except BlobTooLarge:
+            return jsonify({"success": False, "message": "File size too large. Maximum 10MB allowed."}), 400
+        except UploadError as e:
+            return jsonify({"success": False, "message": str(e)}), e.status
+        
         # Create file document
         file_doc = {
             "user_id": user_id,
             "file_name": data['file_name'],
             "original_name": data['original_name'],
             "file_type": data['file_type'].lower(),
-            "file_size": data['file_size'],
-            "mime_type": data.get('mime_type', ''),
-            "base64_data": data['base64_data'],
+            "file_size": size,
+            "mime_type": data.get('mime_type') or content_type,
+            "blob_key": key,
             "file_category": data['file_category'],
             "description": data.get('description', data['file_name']),
             "uploaded_at": datetime.utcnow(),
@@ -1700,12 +2167,11 @@ def get_case_files():
         return jsonify({"error": "Unauthorized"}), 401
     
     user_id = session["user"]
-    files = list(case_files.find({"user_id": user_id, "status": "active"}))
+    files = list(case_file_records.find({"user_id": user_id, "status": "active"}, "list"))
     
     for file in files:
         file["_id"] = str(file["_id"])
         file["file_size_mb"] = round(file["file_size"] / (1024 * 1024), 2)
-        file.pop("base64_data", None)
     
     return jsonify({"success": True, "files": files})
 
@@ -1717,17 +2183,19 @@ def get_case_file(file_id):
     user_id = session["user"]
     
     try:
-        file_doc = case_files.find_one({
+        file_doc = case_file_records.find_one({
             "_id": ObjectId(file_id), 
             "user_id": user_id,
             "status": "active"
-        })
+        }, "detail")
         
         if not file_doc:
             return jsonify({"error": "File not found"}), 404
         
         file_doc["_id"] = str(file_doc["_id"])
         file_doc["file_size_mb"] = round(file_doc["file_size"] / (1024 * 1024), 2)
+        # The bytes are served by the download endpoint, not inlined as base64
+        file_doc["download_url"] = url_for("download_case_file", file_id=file_doc["_id"])
         
         return jsonify({"success": True, "file": file_doc})
         
@@ -1735,6 +2203,43 @@ def get_case_file(file_id):
         print(f"Error getting case file: {str(e)}")
         return jsonify({"error": "Failed to retrieve file"}), 500
 
+@app.route("/api/case-file/<file_id>/download")
+def download_case_file(file_id):
+    """Raw bytes of a case file, with ETag, conditional GET and Range support; ?download=1 for an attachment"""
+    if "user" not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if not ObjectId.is_valid(file_id):
+        return jsonify({"error": "Invalid file ID"}), 400
+
+    try:
+        query = {"_id": ObjectId(file_id), "user_id": session["user"], "status": "active"}
+        file_doc = case_file_records.find_one(query, "detail")
+        if not file_doc:
+            return jsonify({"error": "File not found"}), 404
+
+        if file_doc.get("blob_key"):
+            key = file_doc["blob_key"]
+            fileobj, size = blob_store.open(key), blob_store.size(key)
+        else:
+            # Stored before the blob store; only these records are decoded in memory
+            data = read_payload(blob_store, case_file_records.find_one(query, "payload"), "base64_data")
+            if data is None:
+                return jsonify({"error": "File not found"}), 404
+            key, fileobj, size = blob_key(data), io.BytesIO(data), len(data)
+
+        return blob_response(
+            fileobj, size, key,
+            content_type=file_doc.get("mime_type"),
+            filename=file_doc.get("original_name") or file_doc.get("file_name"),
+            last_modified=file_doc.get("uploaded_at"),
+            as_attachment=request.args.get("download") == "1"
+        )
+
+    except Exception as e:
+        print(f"Error downloading case file: {str(e)}")
+        return jsonify({"error": "Failed to retrieve file"}), 500
+
 # Route to delete a case file
 @app.route("/api/case-file/<file_id>", methods=["DELETE"])
 def delete_case_file(file_id):
@@ -1781,16 +2286,30 @@ def generate_doc_reference():
         if not doc_name:
             return jsonify({"success": False, "message": "Missing doc_name"}), 400
 
+        if wants_stream():
+            return sse_response(stream_document_reference(doc_name, query_data))
+
+        job_id = job_queue.enqueue("generate_doc_reference", owner=session.get("user"),
+                                   doc_name=doc_name, query_data=query_data)
+        return jsonify(job_response(job_id)), 202
+
+    except Exception as e:
+        return jsonify({"success": False, "message": "Unexpected error", "error": str(e)}), 500
+
+
+@job_queue.handler("generate_doc_reference")
+def generate_doc_reference_job(doc_name, query_data):
+    try:
         # Call utility function
         result = handle_document_reference_request(doc_name, query_data)
 
         if result["success"]:
-            return jsonify(result), 200
+            return result, 200
         else:
-            return jsonify(result), 500
+            return result, 500
 
     except Exception as e:
-        return jsonify({"success": False, "message": "Unexpected error", "error": str(e)}), 500
+        return {"success": False, "message": "Unexpected error", "error": str(e)}, 500
 
 
 @app.route("/see_reference")
@@ -2069,7 +2588,7 @@ def lawyer_case_details(case_id):
     client = users.find_one({"_id": ObjectId(case["user_id"])})
     lawyer = lawyers.find_one({"_id": ObjectId(case["lawyer_id"])})
     milestones = list(case_milestones.find({"hired_lawyer_id": ObjectId(case_id)}).sort("due_date", 1))
-    uploaded_documents = list(documents.find({"user_id": str(case["user_id"])}))
+    uploaded_documents = list(document_records.find({"user_id": str(case["user_id"])}, "list"))
 
     return render_template(
         "lawyer_case_details.html",
@@ -2101,6 +2620,31 @@ def save_strategy(case_id):
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
+@app.route("/lawyer/case/<case_id>/status", methods=["POST"])
+def update_case_status(case_id):
+    if "lawyer" not in session:
+        return jsonify({"success": False, "message": "Unauthorized"}), 401
+
+    data = request.get_json() or {}
+    new_status = data.get("status")
+    if new_status not in ["active", "completed"]:
+        return jsonify({"success": False, "message": "Invalid status"}), 400
+    if not ObjectId.is_valid(case_id):
+        return jsonify({"success": False, "message": "Case not found"}), 404
+
+    # last_updated is what the case indexer watches; completed cases join the find_users corpus
+    update_data = {"status": new_status, "last_updated": datetime.utcnow()}
+    update_data["completed_date"] = datetime.utcnow() if new_status == "completed" else None
+
+    result = hired_lawyers.update_one(
+        {"_id": ObjectId(case_id), "lawyer_id": session["lawyer"]},
+        {"$set": update_data}
+    )
+    if result.matched_count == 0:
+        return jsonify({"success": False, "message": "Case not found"}), 404
+    return jsonify({"success": True, "status": new_status})
+
+
 @app.route("/lawyer/chat-interface")
 def lawyer_chat_interface():
     if "lawyer" not in session:
@@ -2254,31 +2798,13 @@ def verify_strategy(case_id):
     try:
         force_refresh = request.args.get('force', 'false').lower() == 'true'
 
-        pipeline = [
-            {"$match": {"_id": ObjectId(case_id)}},
-            {"$lookup": {
-                "from": "case_milestones",
-                "localField": "_id",
-                "foreignField": "hired_lawyer_id",
-                "as": "milestones"
-            }},
-            {"$project": {
-                "user_id": 1,
-                "lawyer_id": 1,
-                "case_title": 1,
-                "case_strategy": 1,
-                "milestones": 1
-            }}
-        ]
-
-        case_data = list(db.hired_lawyers.aggregate(pipeline))
-        if not case_data:
+        # Milestones are only needed for a fresh verification, which the job loads itself
+        case = db.hired_lawyers.find_one({"_id": ObjectId(case_id)}, {"case_title": 1, "case_strategy": 1})
+        if not case:
             return jsonify({"success": False, "message": "Case not found"}), 404
 
-        case = case_data[0]
         case_title = case.get("case_title", "Untitled Case")
         strategy = case.get("case_strategy", "No strategy provided.")
-        milestones = case.get("milestones", [])
 
         if not force_refresh:
             recent_verification = db.strategy_verifications.find_one(
@@ -2303,6 +2829,29 @@ def verify_strategy(case_id):
                     "from_cache": True
                 })
 
+        job_id = job_queue.enqueue("verify_strategy", owner=session.get("lawyer") or session.get("user"),
+                                   case_id=case_id)
+        return jsonify(job_response(job_id)), 202
+
+    except Exception as e:
+        print(f"Error in verify_strategy: {str(e)}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+
+@job_queue.handler("verify_strategy")
+def verify_strategy_job(case_id):
+    try:
+        case = db.hired_lawyers.find_one(
+            {"_id": ObjectId(case_id)},
+            {"user_id": 1, "lawyer_id": 1, "case_title": 1, "case_strategy": 1}
+        )
+        if not case:
+            return {"success": False, "message": "Case not found"}, 404
+
+        case_title = case.get("case_title", "Untitled Case")
+        strategy = case.get("case_strategy", "No strategy provided.")
+        milestones = list(case_milestones.find({"hired_lawyer_id": ObjectId(case_id)}))
+
         for m in milestones:
             if isinstance(m.get("due_date"), str):
                 try:
@@ -2330,7 +2879,7 @@ def verify_strategy(case_id):
 
         db.strategy_verifications.insert_one(verification_record)
 
-        return jsonify({
+        return {
             "success": True,
             "case_title": case_title,
             "strategy": strategy,
@@ -2341,11 +2890,11 @@ def verify_strategy(case_id):
             "deadlines": ai_feedback.get("suggested_deadlines", []),
             "verified_at": verification_record["verified_at"].strftime("%d %b %Y at %I:%M %p"),
             "from_cache": False
-        })
+        }, 200
 
     except Exception as e:
         print(f"Error in verify_strategy: {str(e)}")
-        return jsonify({"success": False, "message": str(e)}), 500
+        return {"success": False, "message": str(e)}, 500
 
 @app.route("/api/verification-history/<case_id>", methods=["GET"])
 def get_verification_history(case_id):
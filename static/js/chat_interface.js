@@ -139,19 +139,29 @@ async function generateAiAssistance() {
   try {
     const response = await fetch(`/chat/${currentChatId}/ai-assist`, {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' }
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' }
     });
-    
-    const data = await response.json();
-    
-    if (data.success) {
-      messageInput.value = data.suggested_message;
-      messageInput.focus();
-      
-      showAiContext(data.context);
-    } else {
+
+    if (!response.ok) {
+      const data = await response.json();
       showNotification('Failed to generate AI assistance: ' + data.error, 'error');
+      return;
     }
+
+    // The suggestion is typed into the input as it streams in
+    messageInput.value = '';
+    await readEventStream(response, (event, data) => {
+      if (event === 'context') {
+        showAiContext(data);
+      } else if (event === 'chunk') {
+        messageInput.value += data;
+      } else if (event === 'done') {
+        messageInput.value = data.suggested_message;
+        messageInput.focus();
+      } else if (event === 'error') {
+        showNotification('Failed to generate AI assistance: ' + data.error, 'error');
+      }
+    });
   } catch (error) {
     console.error('Error generating AI assistance:', error);
     showNotification('Error generating AI assistance', 'error');
@@ -132,8 +132,8 @@ function saveQuery() {
 // Analyze Query
 function analyseQuery() {
     fetch("/analyse_query", {method: "POST"})
-    .then(res => res.json())
-    .then(data => {
+    .then(res => waitForJob(res))
+    .then(({ data }) => {
         alert(data.result || "Analysis complete!");
     })
     .catch(() => showNotification("Error analyzing query", "error"));
@@ -202,8 +202,8 @@ function scan_query(queryText) {
         headers: {"Content-Type": "application/json"},
         body: JSON.stringify({query: queryText})
     })
-    .then(res => res.json())
-    .then(data => {
+    .then(res => waitForJob(res))
+    .then(({ data }) => {
         if (data.result) {
             showNotification("Analysis complete!");
             const content = `
@@ -220,6 +220,41 @@ function scan_query(queryText) {
     .catch(() => showNotification("Error analyzing query", "error"));
 }
 
+// Analysis, deadlines and documents for a saved query from one combined LLM call
+function analyse_query_full(queryId) {
+    showNotification("Analyzing query...", "info");
+    fetch(`/analyse_query/full/${queryId}`, { method: "POST" })
+    .then(res => waitForJob(res))
+    .then(({ ok, data }) => {
+        if (!ok || !["success", "partial"].includes(data.status)) {
+            showNotification(data.message || data.error || "Analysis failed", "error");
+            return;
+        }
+
+        if (data.status === "partial") {
+            showNotification(data.message, "warning");
+        } else {
+            showNotification("Analysis complete!");
+        }
+        const analysis = data.result || { status: "failed", message: "Analysis could not be generated" };
+        document.getElementById("analysisContent").innerHTML = `
+            <p><strong>Status:</strong> ${analysis.status}</p>
+            <p><strong>Message:</strong> ${analysis.message}</p>
+            <p><strong>Deadlines:</strong> ${data.deadlines.length} generated</p>
+            <p><strong>Documents:</strong> ${data.documents.length} required</p>
+        `;
+        document.getElementById("analysisResults").style.display = "block";
+
+        const queryIndex = savedQueries.findIndex(q => q.id === queryId);
+        if (queryIndex !== -1) {
+            savedQueries[queryIndex].deadlines = data.deadlines;
+            savedQueries[queryIndex].documents = data.documents;
+            renderGeneratedDeadlines(queryId);
+        }
+    })
+    .catch(() => showNotification("Error analyzing query", "error"));
+}
+
 async function generate_deadlines_ai(queryId) {
     console.log("=== FRONTEND DEBUG ===");
     console.log("Query ID:", queryId);
@@ -239,13 +274,13 @@ async function generate_deadlines_ai(queryId) {
             }
         });
         
-        console.log("Response status:", res.status);
+        const { ok, status, data } = await waitForJob(res);
+        console.log("Response status:", status);
         
-        if (!res.ok) {
-            throw new Error(`HTTP error! status: ${res.status}`);
+        if (!ok) {
+            throw new Error(`HTTP error! status: ${status}`);
         }
         
-        const data = await res.json();
         console.log("Response data:", data);
         
         if (data.status === "success") {
@@ -101,42 +101,30 @@ function uploadDocument() {
     uploadBtn.textContent = 'Uploading...';
     uploadBtn.disabled = true;
 
-    let reader = new FileReader();
-    reader.onload = function(e) {
-        let base64Data = e.target.result.split(",")[1];
-
-        fetch("/document/upload", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                name: name,
-                file: base64Data,
-                user_id: currentUserId || "{{ user.id }}" // Jinja fallback
-            })
-        })
-        .then(res => res.json())
-        .then(data => {
-            if (data.status === 'success') {
-                showNotification("Document uploaded successfully!", 'success');
-                // Clear form
-                document.getElementById("docName").value = '';
-                document.getElementById("docFile").value = '';
-                // Reload page to show new document
-                setTimeout(() => location.reload(), 1000);
-            } else {
-                showNotification(data.error || "Error uploading document.", 'error');
-            }
-        })
-        .catch(err => {
-            console.error(err);
-            showNotification("Error uploading document.", 'error');
-        })
-        .finally(() => {
-            uploadBtn.textContent = originalText;
-            uploadBtn.disabled = false;
-        });
-    };
-    reader.readAsDataURL(file);
+    postFile("/document/upload", file, { name: name }, progress => {
+        uploadBtn.textContent = `Uploading... ${Math.round(progress * 100)}%`;
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.status === 'success') {
+            showNotification("Document uploaded successfully!", 'success');
+            // Clear form
+            document.getElementById("docName").value = '';
+            document.getElementById("docFile").value = '';
+            // Reload page to show new document
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            showNotification(data.error || "Error uploading document.", 'error');
+        }
+    })
+    .catch(err => {
+        console.error(err);
+        showNotification("Error uploading document.", 'error');
+    })
+    .finally(() => {
+        uploadBtn.textContent = originalText;
+        uploadBtn.disabled = false;
+    });
 }
 
 
@@ -149,7 +137,7 @@ async function scanDocument(docId) {
         scanBtn.disabled = true;
 
         const response = await fetch(`/document/scan/${docId}`, { method: "POST" });
-        const data = await response.json();
+        const { data } = await waitForJob(response);
 
         if (data.error) {
             showNotification("Error: " + data.error, 'error');
@@ -316,7 +304,7 @@ async function generate_req_docs_ai(queryId) {
         generateBtn.disabled = true;
         
         const res = await fetch(`/generate_documents/${queryId}`, { method: "POST" });
-        const data = await res.json();
+        const { data } = await waitForJob(res);
 
         if (data.status === "success") {
             showNotification("Documents generated successfully!", 'success');
@@ -493,25 +481,47 @@ async function handle_doc_reference() {
         // Pick the first document (or let user choose later)
         const docName = query.documents[0].name || query.documents[0];
 
+        // The reference is rendered in a new tab while it streams in
+        const preview = window.open("", "_blank");
+
         // Call backend to generate HTML reference
         const res = await fetch("/generate_doc_reference", {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
             body: JSON.stringify({
                 doc_name: docName,
                 query_data: query   // pass full query object
             })
         });
 
-        const data = await res.json();
-
-        if (data.success) {
-            showNotification("Reference generated successfully!", "success");
-            // Redirect to see the generated HTML
-            window.location.href = "/see_reference";
-        } else {
+        if (!res.ok) {
+            const data = await res.json();
+            if (preview) preview.close();
             showNotification(data.message || "Failed to generate reference", "error");
+            return;
         }
+
+        let html = "";
+        let written = 0;
+        await readEventStream(res, (event, data) => {
+            if (event === "chunk") {
+                html += data;
+                // Hold back a leading markdown fence until we know where it ends
+                const body = html.replace(/^\s*```(html)?\s*/, "");
+                if (preview && !/^\s*`/.test(body) && body.length > written) {
+                    preview.document.write(body.slice(written));
+                    written = body.length;
+                }
+            } else if (event === "done") {
+                showNotification("Reference generated successfully!", "success");
+                // Swap the live preview for the cleaned, saved copy
+                if (preview) preview.location.href = "/see_reference";
+                else window.location.href = "/see_reference";
+            } else if (event === "error") {
+                if (preview) preview.close();
+                showNotification(data.message || "Failed to generate reference", "error");
+            }
+        });
     } catch (err) {
         console.error("Error generating reference:", err);
         showNotification("Error generating reference", "error");
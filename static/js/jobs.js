@@ -0,0 +1,27 @@
+// LLM-backed endpoints answer 202 with a job id; poll the job until it finishes
+// and resolve with the same { ok, status, data } the endpoint used to return directly
+async function waitForJob(response, intervalMs = 1000) {
+    const data = await response.json();
+    if (response.status !== 202 || !data.job_id) {
+        return { ok: response.ok, status: response.status, data };
+    }
+
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+
+        const res = await fetch(data.status_url || `/api/jobs/${data.job_id}`);
+        const job = await res.json();
+        if (!res.ok) {
+            return { ok: false, status: res.status, data: job };
+        }
+
+        if (job.status === "succeeded" || job.status === "failed") {
+            const status = job.http_status || (job.status === "succeeded" ? 200 : 500);
+            return {
+                ok: status < 400,
+                status,
+                data: job.result || { error: job.error, message: job.error }
+            };
+        }
+    }
+}
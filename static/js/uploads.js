@@ -0,0 +1,62 @@
+// Files up to this size go as one multipart request; larger ones are sent
+// in pieces through /api/uploads so a dropped connection only costs one piece
+const RESUMABLE_THRESHOLD = 8 * 1024 * 1024;
+const MAX_CHUNK_RETRIES = 5;
+
+// Send `file` with a resumable upload session and resolve with its upload_id.
+// The endpoint the file is meant for is then called with { upload_id }.
+async function uploadResumable(file, onProgress) {
+    const created = await fetch("/api/uploads", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ filename: file.name, size: file.size, content_type: file.type })
+    });
+    const upload = await created.json();
+    if (!created.ok) throw new Error(upload.error || "Could not start upload");
+
+    let offset = upload.offset;
+    let retries = 0;
+    while (offset < file.size) {
+        const end = Math.min(offset + upload.chunk_size, file.size);
+        try {
+            const res = await fetch(upload.upload_url, {
+                method: "PUT",
+                headers: { "Content-Range": `bytes ${offset}-${end - 1}/${file.size}` },
+                body: file.slice(offset, end)
+            });
+            const data = await res.json();
+            if (res.ok || res.status === 409) {
+                // 409: the server already has a different offset; continue from there
+                offset = data.offset;
+                retries = 0;
+            } else {
+                throw new Error(data.error || `Upload failed (${res.status})`);
+            }
+        } catch (err) {
+            if (++retries > MAX_CHUNK_RETRIES) throw err;
+            await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+            const res = await fetch(upload.upload_url);
+            if (res.ok) offset = (await res.json()).offset;
+        }
+        if (onProgress) onProgress(offset / file.size);
+    }
+    return upload.upload_id;
+}
+
+// POST `file` with the given metadata fields to `url`: multipart for small
+// files, a finished resumable session for large ones. Resolves with the fetch Response.
+async function postFile(url, file, fields, onProgress) {
+    if (file.size <= RESUMABLE_THRESHOLD) {
+        const form = new FormData();
+        Object.entries(fields).forEach(([key, value]) => form.append(key, value));
+        form.append("file", file);
+        return fetch(url, { method: "POST", body: form });
+    }
+
+    const uploadId = await uploadResumable(file, onProgress);
+    return fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ ...fields, upload_id: uploadId })
+    });
+}
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+def project(doc, projection):
+    """Apply a Mongo projection the way the server does"""
+    if not projection:
+        return dict(doc)
+    fields = {field: value for field, value in projection.items() if field != "_id"}
+    if fields and all(value in (0, False) for value in fields.values()):
+        result = {field: value for field, value in doc.items() if field not in fields}
+    else:
+        result = {field: value for field, value in doc.items() if fields.get(field)}
+        result["_id"] = doc["_id"]
+    if projection.get("_id") in (0, False):
+        result.pop("_id", None)
+    return result
+
+
+class FakeCursor(list):
+    def sort(self, field, direction):
+        return FakeCursor(sorted(self, key=lambda doc: doc[field], reverse=direction < 0))
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for the queries the utils make"""
+
+    def __init__(self, docs=(), name=""):
+        self.name = name
+        self.docs = {doc["_id"]: dict(doc) for doc in docs}
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def _matches(self, doc, query):
+        for field, condition in query.items():
+            if field == "$or":
+                if not any(self._matches(doc, branch) for branch in condition):
+                    return False
+                continue
+            value = doc.get(field)
+            if isinstance(condition, dict):
+                if "$gt" in condition and not (value is not None and value > condition["$gt"]):
+                    return False
+                if "$lt" in condition and not (value is not None and value < condition["$lt"]):
+                    return False
+                if "$in" in condition and value not in condition["$in"]:
+                    return False
+                if "$ne" in condition and value == condition["$ne"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(project(doc, projection) for doc in self.docs.values() if self._matches(doc, query or {}))
+
+    def find_one(self, query=None, projection=None):
+        return next(iter(self.find(query, projection)), None)
+
+    def insert_one(self, doc):
+        self.docs[doc["_id"]] = doc
+
+    def update_one(self, query, update, upsert=False):
+        doc = next((doc for doc in self.docs.values() if self._matches(doc, query)), None)
+        if doc is None and not upsert:
+            return SimpleNamespace(matched_count=0)
+        matched = int(doc is not None)
+        doc = doc if doc is not None else dict(query)
+        doc.update(update.get("$set", {}))
+        self.docs[doc["_id"]] = doc
+        return SimpleNamespace(matched_count=matched)
+
+    def find_one_and_update(self, query, update, sort=None, return_document=None):
+        matches = [doc for doc in self.docs.values() if self._matches(doc, query)]
+        for field, direction in reversed(sort or []):
+            matches.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        if not matches:
+            return None
+        doc = matches[0]
+        doc.update(update.get("$set", {}))
+        for field, step in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + step
+        return dict(doc)
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def delete_one(self, query):
+        doc = self.find_one(query)
+        if doc is not None:
+            del self.docs[doc["_id"]]
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection(name=name)
+        return self[name]
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def make_collection():
+    """FakeCollection(docs=(), name=""), an in-memory stand-in for a pymongo collection"""
+    return FakeCollection
+
+
+@pytest.fixture
+def fake_db():
+    return FakeDb()
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from bson import ObjectId
+
+from utils.case_indexer import CaseIndexer
+
+
+class UnusedStore:
+    def load(self, *args, **kwargs):
+        raise AssertionError("the index should not be loaded")
+
+    def publish(self, *args, **kwargs):
+        raise AssertionError("nothing should be published")
+
+
+class RecordingStore:
+    """Hands out one writable vector store and records every publish"""
+
+    def __init__(self):
+        self.vectorstore = SimpleNamespace(index=SimpleNamespace(ntotal=0), ids=[], metadatas=[])
+        self.vectorstore.add_embeddings = self._add
+        self.published = []
+
+    def _add(self, pairs, metadatas, ids):
+        self.vectorstore.ids += ids
+        self.vectorstore.metadatas += metadatas
+        self.vectorstore.index.ntotal += len(ids)
+
+    def load(self, embedding_model, writable=False):
+        return 1, self.vectorstore
+
+    def publish(self, vectorstore, tombstones):
+        self.published.append(set(tombstones))
+
+
+def test_completed_cases_are_indexed_and_updates_tombstone_the_old_vector(fake_db, make_collection, monkeypatch):
+    monkeypatch.setattr("utils.case_indexer.embed_texts", lambda texts, **kwargs: np.zeros((len(texts), 4)))
+    monkeypatch.setattr("utils.case_indexer.INDEX_COMPACT_RATIO", 2.0)
+    closed_id = ObjectId()
+    fake_db["hired_lawyers"] = make_collection([
+        {"_id": closed_id, "status": "completed", "case_title": "Deposit dispute",
+         "last_updated": datetime.utcnow() - timedelta(minutes=2)},
+        {"_id": ObjectId(), "status": "active", "case_title": "Still open",
+         "last_updated": datetime.utcnow() - timedelta(minutes=1)}
+    ])
+    store = RecordingStore()
+    indexer = CaseIndexer(fake_db, store=store)
+    indexer.embedding_model = object()
+
+    assert indexer.run_once() == 2
+    [first_id] = store.vectorstore.ids
+    assert store.vectorstore.metadatas[0]["OID"] == str(closed_id)
+    assert store.published == [set()]
+
+    fake_db["hired_lawyers"].update_one({"_id": closed_id}, {"$set": {
+        "case_strategy": "Settled in mediation", "last_updated": datetime.utcnow()
+    }})
+
+    assert indexer.run_once() == 1
+    second_id = store.vectorstore.ids[-1]
+    assert second_id != first_id
+    assert store.vectorstore.metadatas[-1]["how_it_got_resolved"] == "Settled in mediation"
+    assert store.published[-1] == {first_id}
+
+
+def test_edits_to_unindexed_cases_only_move_the_watermark(fake_db, make_collection):
+    edited_at = datetime.utcnow() - timedelta(minutes=5)
+    db = fake_db
+    db["hired_lawyers"] = make_collection([
+        {"_id": ObjectId(), "status": "active", "case_title": "Deposit dispute", "last_updated": edited_at}
+    ])
+    db["index_state"] = make_collection([
+        {"_id": "find_users_cases", "watermark": edited_at - timedelta(days=1), "last_compacted_at": datetime.utcnow()}
+    ])
+
+    indexer = CaseIndexer(db, store=UnusedStore())
+
+    assert indexer.run_once() == 1
+    assert db["index_state"].find_one({"_id": "find_users_cases"})["watermark"] == edited_at
+    assert indexer.run_once() == 0
@@ -0,0 +1,23 @@
+import numpy as np
+
+from utils import embeddings
+
+
+class RecordingModel:
+    def __init__(self):
+        self.seen = []
+
+    def encode(self, texts, **kwargs):
+        self.seen += texts
+        return np.ones((len(texts), 3))
+
+
+def test_multi_line_texts_are_encoded_like_langchain_does(monkeypatch):
+    model = RecordingModel()
+    monkeypatch.setattr(embeddings, "_model", model)
+
+    vectors = embeddings.embed_texts(["OID: 1\nQuery: deposit", "OID: 1 Query: deposit"])
+
+    assert model.seen == ["OID: 1 Query: deposit"]
+    assert vectors.shape == (2, 3)
+    assert embeddings.text_key("a\nb") == embeddings.text_key("a b")
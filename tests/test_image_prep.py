@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from PIL import Image
+
+from utils.image_prep import EXIF_ORIENTATION, UnsupportedDocument, derive
+
+
+def encode(image, format, **params):
+    out = io.BytesIO()
+    image.save(out, format=format, **params)
+    return out.getvalue()
+
+
+def test_small_upright_png_passes_through():
+    data = encode(Image.new("RGB", (40, 20), "white"), "PNG")
+    assert derive(data) == (data, "image/png")
+
+
+def test_exif_rotated_photo_is_re_encoded_upright():
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = 6  # stored sideways, displayed rotated 90 degrees
+    data = encode(Image.new("RGB", (40, 20), "white"), "JPEG", exif=exif)
+
+    derived, mime_type = derive(data)
+
+    assert derived != data and mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(derived)).size == (20, 40)
+
+
+def test_truncated_image_is_unsupported():
+    data = encode(Image.effect_noise((200, 200), 64).convert("RGB"), "PNG")
+    with pytest.raises(UnsupportedDocument):
+        derive(data[:len(data) // 2])
+
+
+def test_decompression_bomb_is_unsupported(monkeypatch):
+    data = encode(Image.new("RGB", (100, 100), "white"), "PNG")
+    # Pillow refuses images over twice MAX_IMAGE_PIXELS outright
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 1000)
+    with pytest.raises(UnsupportedDocument):
+        derive(data)
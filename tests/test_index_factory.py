@@ -0,0 +1,38 @@
+import pytest
+
+from utils.index_factory import factory_string, trainable
+
+
+def test_pq_codebooks_shrink_to_what_the_corpus_can_train():
+    # The shipped index has 20 vectors: 16 centroids per codebook is the most it can train
+    assert factory_string("ivfpq", 20, 384) == "IVF1,PQ48x4"
+    assert factory_string("ivfpq", 100000, 384).endswith(",PQ48x8")
+
+
+def test_too_small_corpus_is_rejected_with_a_clear_message():
+    assert not trainable("ivfpq", 10)
+    assert trainable("flat", 10)
+    with pytest.raises(ValueError, match="at least 16 vectors"):
+        factory_string("ivfpq", 10, 384)
+
+
+def test_rebuild_of_a_quantised_index_re_embeds_instead_of_reconstructing(monkeypatch):
+    faiss = pytest.importorskip("faiss")
+    import numpy as np
+    from types import SimpleNamespace
+    from utils import embeddings
+    from utils.index_factory import build_index, rebuild
+
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(64, 8)).astype(np.float32)
+    texts = [f"case {i}" for i in range(64)]
+    monkeypatch.setattr(embeddings, "embed_texts", lambda batch, store=None: vectors[[texts.index(t) for t in batch]])
+
+    docstore = SimpleNamespace(search=lambda doc_id: SimpleNamespace(page_content=texts[doc_id]), delete=lambda ids: None)
+    vectorstore = SimpleNamespace(index=build_index(vectors, "sq8"), docstore=docstore,
+                                  index_to_docstore_id=dict(enumerate(range(64))))
+
+    rebuild(vectorstore, "flat", drop_ids=[0])
+
+    assert isinstance(faiss.downcast_index(vectorstore.index), faiss.IndexFlat)
+    np.testing.assert_array_equal(vectorstore.index.reconstruct_n(0, 63), vectors[1:])
@@ -0,0 +1,40 @@
+import pytest
+
+from utils.job_queue import JobQueue, QUEUED, SUCCEEDED, FAILED
+
+
+@pytest.mark.parametrize("backend", ["local", "mongo"])
+def test_zero_workers_only_enqueues(backend, make_collection):
+    queue = JobQueue(make_collection(), backend=backend, workers=0)
+    queue.handler("noop")(lambda: ({}, 200))
+
+    queue.enqueue("noop")
+    queue.start()
+
+    assert [job["status"] for job in queue.collection.docs.values()] == [QUEUED]
+    assert queue._executor is None and queue._pollers == []
+
+
+def test_negative_worker_count_is_rejected(make_collection):
+    with pytest.raises(ValueError, match="JOB_WORKERS"):
+        JobQueue(make_collection(), workers=-1)
+
+
+def test_local_jobs_record_their_result_or_error(make_collection):
+    queue = JobQueue(make_collection(), backend="local", workers=1)
+    queue.handler("echo")(lambda text: ({"text": text}, 201))
+
+    @queue.handler("broken")
+    def broken():
+        raise RuntimeError("Gemini unavailable")
+
+    done = queue.enqueue("echo", owner="u1", text="hello")
+    failed = queue.enqueue("broken", owner="u1")
+    queue._get_executor().shutdown(wait=True)
+
+    job = queue.get(done)
+    assert (job["status"], job["result"], job["http_status"]) == (SUCCEEDED, {"text": "hello"}, 201)
+    assert "kwargs" not in job
+    job = queue.get(failed)
+    assert (job["status"], job["error"], job["http_status"]) == (FAILED, "Gemini unavailable", 500)
+    assert queue.get_metrics()["succeeded"] == 1 and queue.get_metrics()["failed"] == 1
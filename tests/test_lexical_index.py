@@ -0,0 +1,15 @@
+from utils.lexical_index import tokenize
+
+
+def provisions(text):
+    return [token for token in tokenize(text) if "_" in token]
+
+
+def test_statutory_references_become_single_tokens():
+    assert provisions("Order XXXIX Rule 2A read with Section 138 and S. 482") == [
+        "order_xxxix", "rule_2a", "section_138", "section_482"
+    ]
+
+
+def test_ordinary_words_after_a_keyword_are_not_roman_numerals():
+    assert provisions("the order civil court said the rule did apply") == []
@@ -0,0 +1,64 @@
+import pytest
+
+from utils.llm_resilience import ResilientCaller, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from utils.rate_limiter import RateLimitTimeout
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+def timed_out():
+    raise RateLimitTimeout("no capacity")
+
+
+def half_open_caller():
+    caller = ResilientCaller(max_retries=0)
+    caller.breaker.state = OPEN
+    caller.breaker.cooldown = 0
+    return caller
+
+
+def test_rate_limit_timeouts_do_not_close_a_half_open_breaker():
+    caller = half_open_caller()
+
+    for _ in range(3):
+        with pytest.raises(RateLimitTimeout):
+            caller.call(timed_out)
+        assert caller.breaker.state == HALF_OPEN
+
+    # The probe slot is freed each time, so a real call can still close it
+    assert caller.call(lambda: "ok") == "ok"
+    assert caller.breaker.state == CLOSED
+
+
+def test_rate_limit_timeouts_keep_the_failure_count():
+    caller = ResilientCaller(max_retries=0)
+    caller.breaker.failures = 2
+
+    def unavailable():
+        raise ProviderError(503)
+
+    with pytest.raises(ProviderError):
+        caller.call(unavailable)
+    with pytest.raises(RateLimitTimeout):
+        caller.call(timed_out)
+    with pytest.raises(ProviderError):
+        caller.call(unavailable)
+
+    assert caller.breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda: "ok")
+
+
+def test_provider_rejection_still_counts_as_an_answer():
+    caller = half_open_caller()
+
+    def bad_request():
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        caller.call(bad_request)
+    assert caller.breaker.state == CLOSED
@@ -0,0 +1,43 @@
+from utils import query_pipeline
+
+
+def test_a_failed_analysis_fallback_is_reported_not_saved_as_the_analysis(monkeypatch):
+    monkeypatch.setattr(query_pipeline.CombinedAnalysis, "call_api", lambda self: {
+        "status": "error",
+        "deadlines": [{"task": "File petition", "due_date": "2030-01-01"}],
+        "documents": [{"name": "Sale deed"}]
+    })
+    monkeypatch.setattr(query_pipeline.Query_Analysis, "call_api",
+                        lambda self: {"status": "error", "message": "Could not analyze query properly."})
+
+    result = query_pipeline.analyse_fully("Boundary dispute with neighbour")
+
+    assert result["analysis"] is None
+    assert result["sources"] == {"analysis": "failed", "deadlines": "combined", "documents": "combined"}
+
+
+def test_parallel_sections_that_fail_validation_are_reported(monkeypatch):
+    monkeypatch.setattr(query_pipeline.Query_Analysis, "call_api",
+                        lambda self: {"status": "solvable", "message": "Solvable."})
+    monkeypatch.setattr(query_pipeline.GenerateDeadlines, "call_api",
+                        lambda self: {"deadlines": [], "error": "API call failed: 503"})
+    monkeypatch.setattr(query_pipeline.Generate_Documents, "call_api",
+                        lambda self: {"documents": ["API call failed: 503"]})
+
+    result = query_pipeline.analyse_in_parallel("Cheque bounced under Section 138")
+
+    assert result["analysis"] == {"status": "solvable", "message": "Solvable."}
+    assert result["deadlines"] is None and result["documents"] is None
+    assert result["sources"] == {"analysis": "separate", "deadlines": "failed", "documents": "failed"}
+
+
+def test_an_irrelevant_query_may_have_no_deadlines_or_documents_in_parallel(monkeypatch):
+    monkeypatch.setattr(query_pipeline.Query_Analysis, "call_api",
+                        lambda self: {"status": "irrelevant", "message": "Not a legal issue."})
+    monkeypatch.setattr(query_pipeline.GenerateDeadlines, "call_api", lambda self: {"deadlines": []})
+    monkeypatch.setattr(query_pipeline.Generate_Documents, "call_api", lambda self: {"documents": []})
+
+    result = query_pipeline.analyse_in_parallel("What is the weather today?")
+
+    assert (result["deadlines"], result["documents"]) == ([], [])
+    assert set(result["sources"].values()) == {"separate"}
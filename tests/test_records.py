@@ -0,0 +1,46 @@
+import pytest
+
+from utils.records import PAYLOAD_FIELDS, PAYLOAD_VIEWS, VIEWS, Records, check_views
+
+
+STORED = {
+    # A legacy record with inline base64 next to a blob-store one
+    "documents": [
+        {"_id": 1, "user_id": "u1", "name": "lease.pdf", "uploaded_at": "2024-01-01", "scan_status": True,
+         "scan_result": "ok", "doc_type": "lease", "query": "q", "base64_format": "JVBERi0x..."},
+        {"_id": 2, "user_id": "u1", "name": "id.png", "uploaded_at": "2024-01-02", "scan_status": False,
+         "scan_result": None, "blob_key": "ab" * 32}
+    ],
+    "case_files": [
+        {"_id": 3, "user_id": "u1", "file_name": "f.pdf", "original_name": "f.pdf", "file_type": "pdf",
+         "file_size": 10, "mime_type": "application/pdf", "file_category": "evidence", "description": "",
+         "uploaded_at": "2024-01-03", "status": "active", "base64_data": "JVBERi0x..."}
+    ]
+}
+
+
+@pytest.mark.parametrize("collection, view", [
+    (collection, view) for collection, views in VIEWS.items() for view in views if view not in PAYLOAD_VIEWS
+])
+def test_listing_and_metadata_views_never_return_payloads(collection, view, make_collection):
+    records = Records(make_collection(STORED[collection], name=collection))
+
+    for doc in list(records.find({}, view)) + [records.find_one({}, view)]:
+        assert not set(doc) & set(PAYLOAD_FIELDS[collection])
+
+
+def test_payload_view_returns_the_file(make_collection):
+    records = Records(make_collection(STORED["case_files"], name="case_files"))
+    assert records.find_one({}, "payload")["base64_data"] == "JVBERi0x..."
+
+
+def test_unknown_view_is_refused_rather_than_returning_whole_records(make_collection):
+    records = Records(make_collection(STORED["documents"], name="documents"))
+    with pytest.raises(KeyError):
+        records.find({}, "everything")
+
+
+@pytest.mark.parametrize("projection", [{}, {"_id": 0}, {"name": 1, "base64_format": 1}, {"scan_result": 0}])
+def test_views_that_could_leak_a_payload_are_rejected(projection):
+    with pytest.raises(ValueError):
+        check_views("documents", {"leaky": projection})
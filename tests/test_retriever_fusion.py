@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from utils.index_store import IndexHandle
+from utils.lexical_index import LexicalIndex, RRF_K
+from utils.retriever import FindUsersRetriever
+
+
+class FakeIndex:
+    """FAISS stand-in that returns a fixed nearest-neighbour order"""
+
+    def __init__(self, order):
+        self.order = order
+
+    def search(self, query, k):
+        return np.zeros((1, k), dtype=np.float32), np.asarray([self.order[:k]], dtype=np.int64)
+
+
+class FakeDocstore:
+    def __init__(self, texts):
+        # Same shape as MmapDocstore.search: doc_id is the row's docstore id
+        self.rows = [(f"uuid{i}", text) for i, text in enumerate(texts)]
+
+    def search(self, position):
+        doc_id, text = self.rows[position]
+        return SimpleNamespace(page_content=text, metadata={"doc_id": doc_id})
+
+
+def make_handle(texts, vector_order):
+    vectorstore = SimpleNamespace(
+        index=FakeIndex(vector_order),
+        docstore=FakeDocstore(texts),
+        index_to_docstore_id=list(range(len(texts)))
+    )
+    # Built the way publish() builds it from a writable legacy docstore: keyed by text
+    lexical = LexicalIndex.from_texts(texts, texts)
+    return IndexHandle("test", vectorstore, lexical=lexical)
+
+
+def test_document_hit_by_both_retrievers_appears_once_with_summed_score():
+    texts = [
+        "cheque dishonoured under section 138 negotiable instruments act",
+        "landlord withheld the security deposit",
+        "boundary wall encroachment on ancestral land"
+    ]
+    handle = make_handle(texts, vector_order=[0, 1, 2])
+
+    fused = FindUsersRetriever()._fuse(handle, "section 138 cheque", [0.0], fetch=3)
+
+    doc_ids = [doc.metadata["doc_id"] for doc, _ in fused]
+    assert doc_ids.count("uuid0") == 1
+    assert len(doc_ids) == len(set(doc_ids))
+
+    scores = {doc.metadata["doc_id"]: score for doc, score in fused}
+    # Rank 1 in the vector list and rank 1 in the BM25 list
+    assert scores["uuid0"] == 2 / (RRF_K + 1)
+    assert doc_ids[0] == "uuid0"
+
+
+def test_lexical_only_hit_is_added_after_fusion():
+    texts = ["order xxxix temporary injunction", "salary unpaid for three months"]
+    handle = make_handle(texts, vector_order=[1])
+
+    fused = FindUsersRetriever()._fuse(handle, "order xxxix injunction", [0.0], fetch=1)
+
+    assert [doc.metadata["doc_id"] for doc, _ in fused] == ["uuid1", "uuid0"]
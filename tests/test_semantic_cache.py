@@ -0,0 +1,24 @@
+from utils.semantic_cache import SemanticCache
+
+
+def test_explanations_annotated_later_are_served_on_the_next_hit():
+    cache = SemanticCache(threshold=0.9)
+    served = {"Query1": {"OID": "a"}, "Query2": {"OID": "b"}}
+    key = cache.store("default", [1.0, 0.0], served)
+
+    assert cache.annotate("default", key, "why_it_succeeded", {"Query1": "settled early"})
+
+    value, similarity, hit_key = cache.lookup("default", [0.99, 0.01])
+    assert hit_key == key and similarity > 0.9
+    assert value["Query1"]["why_it_succeeded"] == "settled early"
+    assert "why_it_succeeded" not in value["Query2"]
+    # The answer handed out before the explanation arrived is not edited underneath its reader
+    assert "why_it_succeeded" not in served["Query1"]
+
+
+def test_annotating_an_evicted_entry_is_a_no_op():
+    cache = SemanticCache(max_entries=1)
+    key = cache.store("default", [1.0, 0.0], {"Query1": {}})
+    cache.store("default", [0.0, 1.0], {"Query1": {}})
+
+    assert not cache.annotate("default", key, "why_it_succeeded", {"Query1": "x"})
@@ -0,0 +1,70 @@
+import io
+import fcntl
+
+import pytest
+
+from utils.upload_sessions import UploadSessions, UploadError
+
+
+@pytest.fixture
+def uploads(tmp_path, make_collection):
+    return UploadSessions(make_collection(), directory=str(tmp_path))
+
+
+def test_a_late_duplicate_piece_cannot_overwrite_accepted_bytes(uploads):
+    upload_id = uploads.create("u1", "lease.pdf", 6)["upload_id"]
+    assert uploads.append(upload_id, "u1", 0, io.BytesIO(b"abc"), 3) == 3
+    assert uploads.append(upload_id, "u1", 3, io.BytesIO(b"def"), 3) == 6
+
+    with pytest.raises(UploadError) as error:
+        uploads.append(upload_id, "u1", 0, io.BytesIO(b"XYZ"), 3)
+    assert (error.value.status, error.value.offset) == (409, 6)
+
+    with open(uploads._part_path(upload_id), "rb") as f:
+        assert f.read() == b"abcdef"
+
+
+def test_a_piece_is_refused_while_another_request_holds_the_upload(uploads):
+    upload_id = uploads.create("u1", "lease.pdf", 6)["upload_id"]
+
+    with open(uploads._part_path(upload_id), "r+b") as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        with pytest.raises(UploadError) as error:
+            uploads.append(upload_id, "u1", 0, io.BytesIO(b"abc"), 3)
+    assert (error.value.status, error.value.offset) == (409, 0)
+
+    assert uploads.append(upload_id, "u1", 0, io.BytesIO(b"abc"), 3) == 3
+
+
+class RecordingBlobStore:
+    def __init__(self):
+        self.puts = 0
+
+    def put_file(self, f, max_size=None):
+        self.puts += 1
+        return "ab" * 32, len(f.read())
+
+
+def test_a_second_complete_finds_the_upload_gone(uploads):
+    upload_id = uploads.create("u1", "lease.pdf", 3)["upload_id"]
+    uploads.append(upload_id, "u1", 0, io.BytesIO(b"abc"), 3)
+    blobs = RecordingBlobStore()
+
+    assert uploads.complete(upload_id, "u1", blobs)[:2] == ("ab" * 32, 3)
+    with pytest.raises(UploadError) as error:
+        uploads.complete(upload_id, "u1", blobs)
+    assert error.value.status == 404
+    assert blobs.puts == 1
+
+
+def test_complete_is_refused_once_another_call_has_claimed_the_upload(uploads):
+    upload_id = uploads.create("u1", "lease.pdf", 3)["upload_id"]
+    uploads.append(upload_id, "u1", 0, io.BytesIO(b"abc"), 3)
+    # The state a concurrent complete() leaves between its claim and its unlink
+    uploads.collection.update_one({"_id": upload_id}, {"$set": {"completing": True}})
+    blobs = RecordingBlobStore()
+
+    with pytest.raises(UploadError) as error:
+        uploads.complete(upload_id, "u1", blobs)
+    assert error.value.status == 404
+    assert blobs.puts == 0
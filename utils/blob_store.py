@@ -0,0 +1,213 @@
+import os
+import base64
+import hashlib
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv()
+# local: files under BLOB_DIR; gridfs: a GridFS bucket in the app database
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "local")
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "blobs"))
+BLOB_BUCKET = os.getenv("BLOB_BUCKET", "blobs")
+# Bytes read and written per step when streaming a file into the store
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(1024 * 1024)))
+
+
+def blob_key(data):
+    """Content address of a payload: hex SHA-256 of its bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobTooLarge(ValueError):
+    """A streamed file went past the caller's max_size"""
+
+
+def spool(fileobj, directory, max_size=None):
+    """
+    Copy `fileobj` into a temp file in `directory` in BLOB_CHUNK_SIZE steps,
+    hashing as it goes. Returns (temp_path, key, size); memory use does not
+    depend on the file size.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = fileobj.read(BLOB_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise BlobTooLarge(f"File is larger than {max_size} bytes")
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
+
+class LocalBlobStore:
+    """
+    Blobs as files under `root`, fanned out as ab/cd/<sha256>. Writes go to
+    a temp file in the same directory and are renamed into place, so a
+    reader never sees a partial blob and concurrent writers of the same
+    content are harmless.
+    """
+
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def put(self, data):
+        """Store `data` unless identical content is already present; returns its key"""
+        key = blob_key(data)
+        if self.exists(key):
+            return key
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return key
+
+    def put_file(self, fileobj, max_size=None):
+        """Streaming put: spool next to the blobs, then rename into place. Returns (key, size)"""
+        tmp_path, key, size = spool(fileobj, self.root, max_size)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.unlink(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        return key, size
+
+    def open(self, key):
+        """Seekable binary file object for the blob"""
+        return open(self._path(key), "rb")
+
+    def size(self, key):
+        return os.path.getsize(self._path(key))
+
+    def get(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+
+class GridFSBlobStore:
+    """Blobs in a GridFS bucket, with the SHA-256 key as the file _id so dedup is a primary-key lookup"""
+
+    def __init__(self, db, bucket=BLOB_BUCKET):
+        import gridfs
+        self.bucket = gridfs.GridFSBucket(db, bucket_name=bucket)
+        self.files = db[f"{bucket}.files"]
+
+    def exists(self, key):
+        return self.files.count_documents({"_id": key}, limit=1) > 0
+
+    def put(self, data):
+        from gridfs.errors import FileExists
+        key = blob_key(data)
+        if self.exists(key):
+            return key
+        try:
+            self.bucket.upload_from_stream_with_id(key, key, data)
+        except FileExists:
+            # Another worker stored the same content first
+            pass
+        return key
+
+    def put_file(self, fileobj, max_size=None):
+        """
+        Streaming put. GridFS needs the _id before the first byte is sent, so
+        the file is spooled to local disk while hashing and uploaded from
+        there. Returns (key, size)
+        """
+        from gridfs.errors import FileExists
+        tmp_path, key, size = spool(fileobj, tempfile.gettempdir(), max_size)
+        try:
+            if not self.exists(key):
+                with open(tmp_path, "rb") as f:
+                    self.bucket.upload_from_stream_with_id(key, key, f)
+        except FileExists:
+            pass
+        finally:
+            os.unlink(tmp_path)
+        return key, size
+
+    def open(self, key):
+        """GridOut: a seekable file object that fetches chunks lazily"""
+        return self.bucket.open_download_stream(key)
+
+    def size(self, key):
+        return self.files.find_one({"_id": key}, {"length": 1})["length"]
+
+    def get(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+
+def create_blob_store(db=None, backend=BLOB_BACKEND):
+    if backend == "gridfs":
+        return GridFSBlobStore(db)
+    if backend == "local":
+        return LocalBlobStore()
+    raise ValueError(f"Unknown BLOB_BACKEND '{backend}'")
+
+
+def read_payload(store, record, legacy_field):
+    """
+    Bytes of a record's file: from the blob store when it has a blob_key,
+    otherwise decoded from the base64 string older records keep inline.
+    Returns None when the record has neither.
+    """
+    if record.get("blob_key"):
+        return store.get(record["blob_key"])
+    legacy = record.get(legacy_field)
+    if legacy:
+        return base64.b64decode(legacy.split(",")[-1])
+    return None
+
+
+def migrate(collection, store, legacy_field):
+    """Move inline base64 payloads of `collection` into the blob store; returns how many moved"""
+    moved = 0
+    for record in collection.find({legacy_field: {"$exists": True}}, {legacy_field: 1}):
+        data = base64.b64decode(record[legacy_field].split(",")[-1])
+        key = store.put(data)
+        collection.update_one(
+            {"_id": record["_id"]},
+            {"$set": {"blob_key": key, "blob_size": len(data)}, "$unset": {legacy_field: ""}}
+        )
+        moved += 1
+    return moved
+
+
+if __name__ == "__main__":
+    # One-off migration of existing uploads: python -m utils.blob_store
+    import ssl
+    from pymongo import MongoClient
+
+    mongo = MongoClient(
+        os.getenv("MONGO_URI"),
+        tls=True,
+        tlsCAFile=ssl.get_default_verify_paths().cafile
+    )
+    db = mongo[os.getenv("MONGO_DB", "soven_legal")]
+    blob_store = create_blob_store(db)
+
+    print(f"documents: {migrate(db['documents'], blob_store, 'base64_format')} moved")
+    print(f"case_files: {migrate(db['case_files'], blob_store, 'base64_data')} moved")
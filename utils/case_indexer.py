@@ -0,0 +1,214 @@
+import os
+import ssl
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from bson import ObjectId
+from utils.index_store import IndexStore
+from utils.retriever import EMBEDDING_MODEL_NAME
+from utils.embeddings import EmbeddingStore, embed_texts
+from utils.index_factory import rebuild, trainable, FAISS_INDEX_TYPE
+
+load_dotenv()
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "64"))
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", "60"))
+# Compact once deleted vectors make up this share of the index
+INDEX_COMPACT_RATIO = float(os.getenv("INDEX_COMPACT_RATIO", "0.1"))
+INDEX_COMPACT_INTERVAL = float(os.getenv("INDEX_COMPACT_INTERVAL", str(24 * 3600)))
+
+STATE_ID = "find_users_cases"
+EPOCH = datetime(1970, 1, 1)
+CASE_FIELDS = {"user_id": 1, "lawyer_id": 1, "query_id": 1, "case_title": 1,
+               "case_strategy": 1, "status": 1, "last_updated": 1}
+
+
+class CaseIndexer:
+    """
+    Incrementally indexes resolved cases into the find_users corpus.
+
+    A case is a completed hired_lawyers record joined with its query, client
+    and advocate. Lawyers close a case through /lawyer/case/<id>/status,
+    which bumps last_updated. New and updated cases are embedded in batches
+    and appended to a copy of the live index, which is then published as a
+    new version.
+    Updated and deleted cases leave a tombstone on their old vector; tombstoned
+    vectors are filtered out at query time and physically removed by periodic
+    compaction.
+
+    Indexing state (watermark, live docstore id per case, tombstones) is kept
+    in the index_state collection so the worker can resume after a restart.
+    Run a single instance with `python -m utils.case_indexer`.
+    """
+
+    def __init__(self, db, store=None, batch_size=INDEX_BATCH_SIZE):
+        self.db = db
+        self.store = store or IndexStore()
+        self.batch_size = batch_size
+        self.state_col = db["index_state"]
+        self.embedding_store = EmbeddingStore(db["query_embeddings"])
+        self.embedding_model = None
+
+    def _load_state(self):
+        state = self.state_col.find_one({"_id": STATE_ID}) or {}
+        return {
+            "watermark": state.get("watermark", EPOCH),
+            "entries": state.get("entries", {}),
+            "tombstones": set(state.get("tombstones", [])),
+            "last_compacted_at": state.get("last_compacted_at", datetime.utcnow())
+        }
+
+    def _save_state(self, state):
+        self.state_col.update_one(
+            {"_id": STATE_ID},
+            {"$set": {
+                "watermark": state["watermark"],
+                "entries": state["entries"],
+                "tombstones": sorted(state["tombstones"]),
+                "last_compacted_at": state["last_compacted_at"],
+                "updated_at": datetime.utcnow()
+            }},
+            upsert=True
+        )
+
+    def _get_embedding_model(self):
+        if self.embedding_model is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            self.embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        return self.embedding_model
+
+    def build_case(self, hired):
+        """Turn a hired_lawyers record into (text, metadata) for the index"""
+        query = None
+        if hired.get("query_id") and ObjectId.is_valid(hired["query_id"]):
+            query = self.db.queries.find_one({"_id": ObjectId(hired["query_id"])}, {"text": 1})
+        client = None
+        if hired.get("user_id") and ObjectId.is_valid(hired["user_id"]):
+            client = self.db.users.find_one({"_id": ObjectId(hired["user_id"])}, {"name": 1})
+        lawyer = None
+        if hired.get("lawyer_id") and ObjectId.is_valid(hired["lawyer_id"]):
+            lawyer = self.db.lawyers.find_one({"_id": ObjectId(hired["lawyer_id"])}, {"name": 1})
+
+        metadata = {
+            "OID": str(hired["_id"]),
+            "name": (client or {}).get("name", "Anonymous"),
+            "advocate": (lawyer or {}).get("name", "Unknown"),
+            "Query": (query or {}).get("text") or hired.get("case_title", ""),
+            "state_of_resolvation": "Yes",
+            "how_it_got_resolved": hired.get("case_strategy", "") or hired.get("case_title", "")
+        }
+        text = "\n".join(f"{key}: {value}" for key, value in metadata.items())
+        return text, metadata
+
+    def _changed_cases(self, watermark):
+        return self.db.hired_lawyers.find({"last_updated": {"$gt": watermark}}, CASE_FIELDS).sort("last_updated", 1)
+
+    def run_once(self):
+        """Index everything that changed since the last run. Returns the number of cases touched."""
+        state = self._load_state()
+        tombstones_before = set(state["tombstones"])
+        additions = []
+        touched = 0
+
+        for hired in self._changed_cases(state["watermark"]):
+            case_id = str(hired["_id"])
+            old_doc_id = state["entries"].pop(case_id, None)
+            if old_doc_id:
+                state["tombstones"].add(old_doc_id)
+
+            if hired.get("status") == "completed":
+                text, metadata = self.build_case(hired)
+                # A fresh id per indexing: the tombstoned vector for an earlier
+                # edit is still in the docstore until compaction
+                doc_id = f"case:{case_id}:{ObjectId()}"
+                metadata["doc_id"] = doc_id
+                additions.append((doc_id, text, metadata))
+                state["entries"][case_id] = doc_id
+
+            state["watermark"] = max(state["watermark"], hired["last_updated"])
+            touched += 1
+
+        compaction_due = self._compaction_due(state)
+        if compaction_due:
+            touched += self._reconcile_deleted(state)
+
+        # Changes to cases that were never indexed (e.g. still active) only move the watermark
+        index_changed = bool(additions) or state["tombstones"] != tombstones_before
+        if not index_changed and not (compaction_due and state["tombstones"]):
+            if compaction_due:
+                state["last_compacted_at"] = datetime.utcnow()
+            if touched or compaction_due:
+                self._save_state(state)
+            return touched
+
+        embedding_model = self._get_embedding_model()
+        _, vectorstore = self.store.load(embedding_model, writable=True)
+        for start in range(0, len(additions), self.batch_size):
+            batch = additions[start:start + self.batch_size]
+            texts = [text for _, text, _ in batch]
+            vectors = embed_texts(texts, batch_size=self.batch_size, store=self.embedding_store)
+            vectorstore.add_embeddings(
+                list(zip(texts, vectors.tolist())),
+                metadatas=[metadata for _, _, metadata in batch],
+                ids=[doc_id for doc_id, _, _ in batch]
+            )
+
+        if compaction_due or self._tombstone_ratio(vectorstore, state) >= INDEX_COMPACT_RATIO:
+            self._compact(vectorstore, state)
+
+        self.store.publish(vectorstore, tombstones=state["tombstones"])
+        self._save_state(state)
+        print(f"Indexed {len(additions)} cases, {len(state['tombstones'])} tombstones pending")
+        return touched
+
+    def _compaction_due(self, state):
+        return (datetime.utcnow() - state["last_compacted_at"]).total_seconds() > INDEX_COMPACT_INTERVAL
+
+    def _tombstone_ratio(self, vectorstore, state):
+        return len(state["tombstones"]) / max(vectorstore.index.ntotal, 1)
+
+    def _reconcile_deleted(self, state):
+        """Tombstone cases whose hired_lawyers record no longer exists"""
+        case_ids = [ObjectId(case_id) for case_id in state["entries"] if ObjectId.is_valid(case_id)]
+        existing = {
+            str(doc["_id"])
+            for doc in self.db.hired_lawyers.find({"_id": {"$in": case_ids}}, {"_id": 1})
+        }
+        deleted = [case_id for case_id in state["entries"] if case_id not in existing]
+        for case_id in deleted:
+            state["tombstones"].add(state["entries"].pop(case_id))
+        return len(deleted)
+
+    def _compact(self, vectorstore, state):
+        """
+        Physically remove tombstoned vectors. The index is rebuilt rather than
+        edited in place because HNSW indexes cannot remove vectors.
+        """
+        present = set(vectorstore.index_to_docstore_id.values())
+        removable = [doc_id for doc_id in state["tombstones"] if doc_id in present]
+        kind = FAISS_INDEX_TYPE
+        if not trainable(kind, vectorstore.index.ntotal - len(removable)):
+            print(f"Too few vectors to train {kind}, compacting into a flat index")
+            kind = "flat"
+        rebuild(vectorstore, kind, drop_ids=removable, store=self.embedding_store)
+        state["tombstones"] = set()
+        state["last_compacted_at"] = datetime.utcnow()
+        print(f"Compacted index, removed {len(removable)} vectors")
+
+    def run_forever(self, interval=INDEX_POLL_INTERVAL):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Case indexing failed: {str(e)}")
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    from pymongo import MongoClient
+
+    mongo = MongoClient(
+        os.getenv("MONGO_URI"),
+        tls=True,
+        tlsCAFile=ssl.get_default_verify_paths().cafile
+    )
+    CaseIndexer(mongo[os.getenv("MONGO_DB", "soven_legal")]).run_forever()
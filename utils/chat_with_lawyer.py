@@ -1,8 +1,9 @@
 import os
-import json
 import re
-from google import genai
 from dotenv import load_dotenv
+from utils.llm_gateway import generate_json, stream, INTERACTIVE
+from utils.llm_schemas import CHAT_REPLY
+from utils.prompt_budget import fit_text, trim_turns, QUERY_TOKEN_BUDGET, CHAT_HISTORY_TOKEN_BUDGET
 
 load_dotenv()
 API_KEY = os.environ.get("GEMINI_API_KEY")
@@ -72,12 +73,15 @@ class ChatWithLawyer:
                     continue
         return None
 
-    def generate_response(self):
-        work_percentage = self.calculate_work_done_percentage()
+    def _work_percentage(self):
         try:
-            work_percentage = float(work_percentage)
+            return float(self.calculate_work_done_percentage())
         except (ValueError, TypeError):
-            work_percentage = 0.0
+            return 0.0
+
+    def build_prompt(self, plain_text=False):
+        """Prompt for the reply; plain_text asks for the message alone so it can be streamed"""
+        work_percentage = self._work_percentage()
         is_fee_discussion = self.detect_fee_discussion()
         mentioned_fee = self.extract_mentioned_fee()
         
@@ -106,8 +110,17 @@ You are in a FEE NEGOTIATION scenario. Your primary goals:
 5. Suggest specific percentage-based reductions
 """
 
-        
-        full_prompt = f"""
+        if plain_text:
+            output_format = "Return ONLY the message text the user should send, with no JSON, headings or commentary."
+        else:
+            output_format = """Return ONLY a valid JSON object with the following format, and nothing else:
+{
+  "assistant_reply": "string",
+  "negotiation_strategy": "string",
+  "potential_savings": "string"
+}"""
+
+        return f"""
 You are an AI legal assistant helping a user negotiate with their lawyer. Your role is to:
 1. Support the user's interests while maintaining professionalism
 2. Help craft persuasive, data-driven arguments
@@ -117,9 +130,9 @@ You are an AI legal assistant helping a user negotiate with their lawyer. Your r
 {negotiation_context}
 
 CONTEXT:
-- User's legal matter: {self.query}
+- User's legal matter: {fit_text(self.query, QUERY_TOKEN_BUDGET)}
 - User's preparation progress: {self.user_progress}
-- Current conversation: {self.chat_till_now}
+- Current conversation: {trim_turns(self.chat_till_now, CHAT_HISTORY_TOKEN_BUDGET)}
 - Work completed by user: {work_percentage:.1f}%
 
 {potential_savings}
@@ -132,67 +145,13 @@ INSTRUCTIONS:
 - Focus on value delivered vs. standard rates
 - If not fee-related, provide general legal communication assistance
 
-Return ONLY a valid JSON object with the following format, and nothing else:
-{{
-  "assistant_reply": "string",
-  "negotiation_strategy": "string",
-  "potential_savings": "string"
-}}
-
+{output_format}
 """
 
-        try:
-            
-            print(f"==== GENAI MODULE CHECK ====")
-            print(f"genai module: {genai}")
-            print(f"genai dir: {dir(genai)}")
-            print(f"genai configure method: {hasattr(genai, 'configure')}")
-            print(f"genai GenerativeModel class: {hasattr(genai, 'GenerativeModel')}")
-            
-            
-            if not self.api_key:
-                raise Exception("GEMINI_API_KEY not found in environment variables")
-            
-            print(f"==== API KEY CHECK ====")
-            print(f"API Key exists: {bool(self.api_key)}")
-            print(f"API Key length: {len(self.api_key) if self.api_key else 0}")
-            
-            client = genai.Client(api_key=self.api_key)
-            print("==== CLIENT INITIALIZED ====")
-            
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[full_prompt]
-            )
-            print("==== API CALL COMPLETED ====")
-
-            
-             
-            print("==== RAW GEMINI RESPONSE ====")
-            print(response)
-
-            
-            try:
-                response_text = getattr(response, "text", "").strip()
-                print("==== EXTRACTED TEXT ====")
-                print(response_text)
-            except Exception as inner_e:
-                print("==== TEXT EXTRACTION ERROR ====")
-                print(inner_e)
-                raise
-
-            
-            match = re.search(r"\{.*\}", response_text, re.DOTALL)
-            if match:
-                json_text = match.group(0)
-                parsed = json.loads(json_text)
-            else:
-                raise json.JSONDecodeError("No JSON found", response_text, 0)
-
-        except (json.JSONDecodeError, Exception) as e:
-            
-            if is_fee_discussion and work_percentage > 20:
-                fallback_message = f"""Dear [Lawyer's Name],
+    def fallback_reply(self):
+        work_percentage = self._work_percentage()
+        if self.detect_fee_discussion() and work_percentage > 20:
+            return f"""Dear [Lawyer's Name],
 
 I wanted to discuss the fee structure for my case. I've been quite proactive in preparing the groundwork:
 
@@ -204,11 +163,44 @@ I wanted to discuss the fee structure for my case. I've been quite proactive in
 Given this substantial preparation, I believe a fee adjustment reflecting the work already completed would be fair. Would you be open to discussing a rate that accounts for these efforts?
 
 Best regards"""
-            else:
-                fallback_message = "I'd like to discuss this matter further. Could you provide more details about your approach and timeline?"
+        return "I'd like to discuss this matter further. Could you provide more details about your approach and timeline?"
+
+    def stream_reply(self):
+        """Yield the suggested message in chunks; falls back to the canned reply if nothing arrives"""
+        sent = False
+        try:
+            if not self.api_key:
+                raise Exception("GEMINI_API_KEY not found in environment variables")
+            for chunk in stream(self.build_prompt(plain_text=True), api_key=self.api_key, route="chat_assist"):
+                sent = True
+                yield chunk
+        except Exception as e:
+            print(f"ChatWithLawyer stream failed: {str(e)}")
+            if sent:
+                raise
+        if not sent:
+            yield self.fallback_reply()
+
+    def generate_response(self):
+        work_percentage = self._work_percentage()
+        is_fee_discussion = self.detect_fee_discussion()
+        full_prompt = self.build_prompt()
+
+        try:
+            if not self.api_key:
+                raise Exception("GEMINI_API_KEY not found in environment variables")
+            
+            print(f"==== API KEY CHECK ====")
+            print(f"API Key exists: {bool(self.api_key)}")
+            print(f"API Key length: {len(self.api_key) if self.api_key else 0}")
+            
+            parsed = generate_json(full_prompt, CHAT_REPLY, "chat_reply", api_key=self.api_key, priority=INTERACTIVE)
+            print("==== API CALL COMPLETED ====")
+            print(parsed)
 
+        except Exception as e:
             parsed = {
-                "assistant_reply": fallback_message,
+                "assistant_reply": self.fallback_reply(),
                 "negotiation_strategy": "Professional fee negotiation based on completed work" if is_fee_discussion else "General inquiry",
                 "potential_savings": f"{work_percentage:.1f}% work completed"
             }
@@ -1,8 +1,8 @@
-import google.generativeai as genai
 import os
 from dotenv import load_dotenv
-import json
 from pathlib import Path
+from utils.llm_gateway import generate_text, stream
+from utils.prompt_budget import compact_json, fit_text, QUERY_TOKEN_BUDGET, REFERENCE_TOKEN_BUDGET
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
@@ -10,8 +10,6 @@ GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 class DocumentReferenceGenerator:
     def __init__(self, api_key=GEMINI_API_KEY):
         self.api_key = api_key
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
         
     def generate_reference_html(self, doc_name, query_context, required_elements=None, visual_reference=None):
         """
@@ -26,19 +24,41 @@ class DocumentReferenceGenerator:
         Returns:
             str: Generated HTML content
         """
-        
-        # Build the system prompt
-        system_prompt = f"""
+        try:
+            html_content = generate_text(
+                self._build_prompt(doc_name, query_context, required_elements, visual_reference),
+                api_key=self.api_key,
+                route="doc_reference"
+            )
+                
+            # Clean up the response to ensure it's valid HTML
+            html_content = self._clean_html_response(html_content)
+            
+            return html_content
+            
+        except Exception as e:
+            return self._generate_error_html(doc_name, str(e))
+
+    def stream_reference_html(self, doc_name, query_context, required_elements=None, visual_reference=None):
+        """
+        Streaming variant of generate_reference_html: yields raw HTML chunks as
+        they arrive. The caller joins them and runs _clean_html_response on the result.
+        """
+        prompt = self._build_prompt(doc_name, query_context, required_elements, visual_reference)
+        yield from stream(prompt, api_key=self.api_key, route="doc_reference")
+
+    def _build_prompt(self, doc_name, query_context, required_elements=None, visual_reference=None):
+        return f"""
 You are an expert legal document reference generator for legal documents.
 
 Document Type: {doc_name}
-Legal Query Context: {query_context}
+Legal Query Context: {fit_text(query_context, QUERY_TOKEN_BUDGET)}
 
 Required Elements (if available):
-{json.dumps(required_elements or [], indent=2)}
+{compact_json(required_elements or [], REFERENCE_TOKEN_BUDGET)}
 
 Visual Reference Information (if available):
-{json.dumps(visual_reference or {}, indent=2)}
+{compact_json(visual_reference or {}, REFERENCE_TOKEN_BUDGET)}
 
 Generate a comprehensive HTML visual reference similar to image or how it looks if seen in direct using stylings for "{doc_name}" that includes Sample Format/Template 
 
@@ -56,22 +76,7 @@ Return ONLY the complete HTML document with embedded CSS and any necessary JavaS
 The HTML should be a standalone, complete document that can be saved as doc_reference.html.
 """
 
-        try:
-            response = self.model.generate_content([{"text": system_prompt}])
-            
-            if hasattr(response, "text"):
-                html_content = response.text
-            else:
-                html_content = response.candidates[0].content.parts[0].text
-                
-            # Clean up the response to ensure it's valid HTML
-            html_content = self._clean_html_response(html_content)
-            
-            return html_content
-            
-        except Exception as e:
-            return self._generate_error_html(doc_name, str(e))
-    
+
     def save_reference_html(self, html_content, output_path="templates/doc_reference.html"):
         """
         Save the generated HTML content to a file
@@ -167,45 +172,13 @@ def handle_document_reference_request(doc_name, query_data):
         # Initialize the generator
         generator = DocumentReferenceGenerator()
         
-        # Extract information from query data
-        query_context = query_data.get('text', '')
-        
-        # Find the specific document and its details
-        documents = query_data.get('documents', [])
-        required_elements = None
-        visual_reference = None
-        
-        # If documents is a list of objects with more details
-        if documents and isinstance(documents[0], dict):
-            for doc in documents:
-                if doc.get('name') == doc_name or doc == doc_name:
-                    required_elements = doc.get('required_elements', [])
-                    visual_reference = doc.get('visual_reference', {})
-                    break
-        
         # Generate the HTML reference
         html_content = generator.generate_reference_html(
             doc_name=doc_name,
-            query_context=query_context,
-            required_elements=required_elements,
-            visual_reference=visual_reference
+            **_reference_context(doc_name, query_data)
         )
         
-        # Save to doc_reference.html
-        success = generator.save_reference_html(html_content)
-        
-        if success:
-            return {
-                'success': True,
-                'message': f'Reference generated successfully for {doc_name}',
-                'file_path': 'templates/doc_reference.html'
-            }
-        else:
-            return {
-                'success': False,
-                'message': 'Failed to save reference file',
-                'error': 'File save error'
-            }
+        return _save_result(generator, doc_name, html_content)
             
     except Exception as e:
         return {
@@ -215,3 +188,66 @@ def handle_document_reference_request(doc_name, query_data):
         }
 
 
+def _reference_context(doc_name, query_data):
+    """Query text plus the stored requirements of `doc_name`, as generator kwargs"""
+    # Extract information from query data
+    query_context = query_data.get('text', '')
+    
+    # Find the specific document and its details
+    documents = query_data.get('documents', [])
+    required_elements = None
+    visual_reference = None
+    
+    # If documents is a list of objects with more details
+    if documents and isinstance(documents[0], dict):
+        for doc in documents:
+            if doc.get('name') == doc_name or doc == doc_name:
+                required_elements = doc.get('required_elements', [])
+                visual_reference = doc.get('visual_reference', {})
+                break
+
+    return {
+        'query_context': query_context,
+        'required_elements': required_elements,
+        'visual_reference': visual_reference
+    }
+
+
+def _save_result(generator, doc_name, html_content):
+    # Save to doc_reference.html
+    if generator.save_reference_html(html_content):
+        return {
+            'success': True,
+            'message': f'Reference generated successfully for {doc_name}',
+            'file_path': 'templates/doc_reference.html'
+        }
+    return {
+        'success': False,
+        'message': 'Failed to save reference file',
+        'error': 'File save error'
+    }
+
+
+def stream_document_reference(doc_name, query_data):
+    """
+    Streaming counterpart of handle_document_reference_request. Yields
+    ("chunk", html_text) as the model writes, then ("done", result) once the
+    cleaned document has been saved, or ("error", result) on failure.
+    """
+    generator = DocumentReferenceGenerator()
+    chunks = []
+    try:
+        for chunk in generator.stream_reference_html(doc_name, **_reference_context(doc_name, query_data)):
+            chunks.append(chunk)
+            yield "chunk", chunk
+    except Exception as e:
+        yield "error", {
+            'success': False,
+            'message': f'Failed to generate reference for {doc_name}',
+            'error': str(e)
+        }
+        return
+
+    html_content = generator._clean_html_response("".join(chunks))
+    result = _save_result(generator, doc_name, html_content)
+    yield ("done" if result['success'] else "error"), result
@@ -1,14 +1,21 @@
-import google.generativeai as genai
 import os
+import base64
 from dotenv import load_dotenv
-import json
+from utils.llm_gateway import generate_json, image_part
+from utils.llm_schemas import DOC_SCAN, SchemaError
+from utils.prompt_budget import compact_json, fit_text, QUERY_TOKEN_BUDGET, REFERENCE_TOKEN_BUDGET
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 class Image_Analyser:
-    def __init__(self, query, doc_type, base64_data, required_elements=None, visual_reference=None, api_key=GEMINI_API_KEY):
+    def __init__(self, query, doc_type, base64_data, required_elements=None, visual_reference=None, api_key=GEMINI_API_KEY,
+                 image_bytes=None, mime_type="image/jpeg"):
         self.query = query
         self.doc_type = doc_type
         self.base64_data = base64_data
+        # Raw bytes from the blob store; base64_data is only decoded when these are absent
+        self.image_bytes = image_bytes
+        # Set from the detected format by utils.image_prep; older callers send JPEG data
+        self.mime_type = mime_type
         self.required_elements = required_elements or []
         self.visual_reference = visual_reference or {}
         self.api_key = api_key
@@ -17,13 +24,13 @@ class Image_Analyser:
 You are an expert document verification assistant for Indian legal documents.
 
 Document Type: {self.doc_type}
-Legal Query Context: {self.query}
+Legal Query Context: {fit_text(self.query, QUERY_TOKEN_BUDGET)}
 
 Required Elements to Check:
-{json.dumps(self.required_elements, indent=2)}
+{compact_json(self.required_elements, REFERENCE_TOKEN_BUDGET)}
 
 Visual Reference Standards:
-{json.dumps(self.visual_reference, indent=2)}
+{compact_json(self.visual_reference, REFERENCE_TOKEN_BUDGET)}
 
 Your tasks:
 1. Verify if this is a genuine {self.doc_type}
@@ -57,39 +64,24 @@ Provide your analysis in this JSON format:
 
     def analyze_legal_doc(self):
         try:
-            
-            genai.configure(api_key=self.api_key)
-            model = genai.GenerativeModel("gemini-2.0-flash")
-
-            
-            image_part = {
-                "inline_data": {
-                    "mime_type": "image/jpeg",  
-                    "data": self.base64_data.split(",")[-1]  
-                }
-            }
-
-            
-            response = model.generate_content(
-                [
-                    {"text": self.system_prompt},
-                    image_part
-                ],
-                generation_config={"response_mime_type": "application/json"}
-            )
-
-            
-            if hasattr(response, "text"):
-                output = response.text
-            else:
-                output = response.candidates[0].content.parts[0].text
+            image_bytes = self.image_bytes
+            if image_bytes is None:
+                image_bytes = base64.b64decode(self.base64_data.split(",")[-1])
 
             try:
-                return json.loads(output)
-            except json.JSONDecodeError:
+                return generate_json(
+                    [
+                        self.system_prompt,
+                        image_part(image_bytes, self.mime_type)
+                    ],
+                    DOC_SCAN,
+                    "doc_scan",
+                    api_key=self.api_key
+                )
+            except SchemaError as e:
                 return {
                     "overall_validity": "error",
-                    "detailed_analysis": f"Could not parse analysis result: {output}",
+                    "detailed_analysis": f"Could not parse analysis result: {str(e)}",
                     "error": True
                 }
 
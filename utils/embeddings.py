@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import hashlib
+import threading
+from datetime import datetime
+import numpy as np
+from dotenv import load_dotenv
+from utils.retriever import get_retriever, EMBEDDING_MODEL_NAME
+
+load_dotenv()
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_TEXTS = int(os.getenv("EMBED_MAX_TEXTS", "5000"))
+# Batch requests are stored as job documents, which Mongo caps at 16 MB
+EMBED_MAX_CHARS = int(os.getenv("EMBED_MAX_CHARS", str(4 * 1024 * 1024)))
+# Stored vectors are recomputed after this long; callers only lose the saved encode
+EMBED_STORE_TTL = int(os.getenv("EMBED_STORE_TTL", str(30 * 24 * 3600)))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_sentence_model():
+    """
+    Return the sentence-transformers model for this process. Reuses the
+    retriever's model when it is already loaded so a worker holds one copy.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                retriever = get_retriever()
+                if retriever.embedding_model is not None:
+                    _model = retriever.embedding_model.client
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+def prepare_text(text):
+    """
+    The text as the model sees it. LangChain's HuggingFaceEmbeddings, which
+    built the index and embeds queries in the retriever, flattens newlines
+    first; every vector in one index has to follow the same convention.
+    """
+    return text.replace("\n", " ")
+
+
+def text_key(text, model_name=EMBEDDING_MODEL_NAME):
+    return hashlib.sha256(f"{model_name}\n{prepare_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """Mongo-backed store of text embeddings keyed by sha256(model, text), expiring after `ttl`"""
+
+    def __init__(self, collection, model_name=EMBEDDING_MODEL_NAME, ttl=EMBED_STORE_TTL):
+        self.collection = collection
+        self.model_name = model_name
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=ttl)
+        except Exception as e:
+            print(f"Embedding store index setup failed: {str(e)}")
+
+    def get_many(self, keys):
+        found = {}
+        for doc in self.collection.find({"_id": {"$in": list(keys)}}, {"vector": 1}):
+            found[doc["_id"]] = np.frombuffer(doc["vector"], dtype=np.float32)
+        return found
+
+    def put_many(self, items):
+        from bson.binary import Binary
+        from pymongo import UpdateOne
+
+        operations = [
+            UpdateOne(
+                {"_id": key},
+                {"$setOnInsert": {
+                    "vector": Binary(np.asarray(vector, dtype=np.float32).tobytes()),
+                    "model": self.model_name,
+                    "dim": len(vector),
+                    "created_at": datetime.utcnow()
+                }},
+                upsert=True
+            )
+            for key, vector in items
+        ]
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE, store=None):
+    """
+    Embed a list of texts in mini-batches and return a float32 array of
+    shape (len(texts), dim). Newlines are flattened as in prepare_text().
+    Duplicate texts are embedded once, and texts already in `store` are not
+    embedded again.
+    """
+    texts = [prepare_text(text) for text in texts]
+    keys = [text_key(text) for text in texts]
+    vectors = store.get_many(set(keys)) if store is not None and keys else {}
+
+    pending = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            pending.setdefault(key, text)
+
+    if pending:
+        model = get_sentence_model()
+        pending_keys = list(pending.keys())
+        encoded = model.encode(
+            [pending[key] for key in pending_keys],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+        new_vectors = dict(zip(pending_keys, encoded))
+        vectors.update(new_vectors)
+        if store is not None:
+            store.put_many(new_vectors.items())
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([vectors[key] for key in keys])
+
+
+def benchmark(n_texts=2000, batch_sizes=(8, 16, 32, 64, 128)):
+    """Report embedding throughput (texts/sec) on this machine for each batch size"""
+    texts = [
+        f"Tenant dispute {i}: landlord withheld the security deposit under section {i % 200} of the Rent Act"
+        for i in range(n_texts)
+    ]
+    model = get_sentence_model()
+    model.encode(texts[:batch_sizes[0]], batch_size=batch_sizes[0], show_progress_bar=False)
+
+    results = []
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+        elapsed = time.perf_counter() - started
+        results.append({"batch_size": batch_size, "seconds": round(elapsed, 3), "texts_per_sec": round(n_texts / elapsed, 1)})
+        print(f"batch_size={batch_size:<4} {n_texts / elapsed:8.1f} texts/sec")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
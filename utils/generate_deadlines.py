@@ -1,12 +1,26 @@
 import os
-import json
-import re
-from google import genai
 from dotenv import load_dotenv
 
+from utils.llm_gateway import generate_json
+from utils.llm_schemas import DEADLINES, SchemaError
+from utils.prompt_budget import fit_text, QUERY_TOKEN_BUDGET
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
+def clean_deadlines(deadlines):
+    """Keep the entries that have both a task and a due date; default completed to False"""
+    valid_deadlines = []
+    for deadline in deadlines:
+        if (isinstance(deadline, dict) and 
+            deadline.get("task") and 
+            deadline.get("due_date")):
+            
+            deadline.setdefault("completed", False)
+            valid_deadlines.append(deadline)
+    return valid_deadlines
+
+
 class GenerateDeadlines:
     def __init__(self, query, api_key=GEMINI_API_KEY):
         self.query = query
@@ -40,101 +54,35 @@ Rules:
             print(f"=== GenerateDeadlines API Call ===")
             print(f"Query: {self.query}")
             
-            client = genai.Client(api_key=self.api_key)
-            full_prompt = f"{self.system_prompt}\n\nLegal Query: {self.query}\n\nGenerate deadlines:"
+            full_prompt = f"{self.system_prompt}\n\nLegal Query: {fit_text(self.query, QUERY_TOKEN_BUDGET)}\n\nGenerate deadlines:"
             
             print(f"Calling Gemini API...")
-            resp = client.models.generate_content(
-                model="gemini-2.0-flash", 
-                contents=[full_prompt],
-                config={
-                    "temperature": 0.3,
-                    "max_output_tokens": 1024,
-                }
-            )
-
-            raw_response = resp.text.strip()
-            print(f"Raw AI Response: {raw_response}")
-            
+            try:
+                json_data = generate_json(
+                    full_prompt,
+                    DEADLINES,
+                    "deadlines",
+                    config={
+                        "temperature": 0.3,
+                        "max_output_tokens": 1024,
+                    },
+                    api_key=self.api_key,
+                    cache=True
+                )
+            except SchemaError as e:
+                print(f"Could not parse deadlines from AI response: {str(e)}")
+                return {"deadlines": [], "error": "Could not parse JSON from AI response"}
             
-            json_data = self._extract_json(raw_response)
+            valid_deadlines = clean_deadlines(json_data["deadlines"])
             
-            if json_data:
-                print(f"Parsed JSON: {json_data}")
-                
-                
-                if "deadlines" in json_data and isinstance(json_data["deadlines"], list):
-                    
-                    valid_deadlines = []
-                    for deadline in json_data["deadlines"]:
-                        if (isinstance(deadline, dict) and 
-                            "task" in deadline and 
-                            "due_date" in deadline and
-                            deadline["task"] and 
-                            deadline["due_date"]):
-                            
-                            
-                            if "completed" not in deadline:
-                                deadline["completed"] = False
-                                
-                            valid_deadlines.append(deadline)
-                    
-                    if valid_deadlines:
-                        result = {"deadlines": valid_deadlines}
-                        print(f"Returning valid deadlines: {result}")
-                        return result
-                    else:
-                        print("No valid deadlines found in response")
-                        return {"deadlines": [], "error": "No valid deadlines in AI response"}
-                else:
-                    print("Invalid JSON structure - missing or invalid 'deadlines' field")
-                    return {"deadlines": [], "error": "Invalid JSON structure from AI"}
+            if valid_deadlines:
+                result = {"deadlines": valid_deadlines}
+                print(f"Returning valid deadlines: {result}")
+                return result
             else:
-                print("Could not extract JSON from response")
-                return {"deadlines": [], "error": "Could not parse JSON from AI response"}
+                print("No valid deadlines found in response")
+                return {"deadlines": [], "error": "No valid deadlines in AI response"}
                 
         except Exception as e:
             print(f"Exception in GenerateDeadlines: {str(e)}")
             return {"deadlines": [], "error": f"API call failed: {str(e)}"}
-
-    def _extract_json(self, text):
-        """Try multiple methods to extract JSON from AI response"""
-        
-        
-        start = text.find("{")
-        end = text.rfind("}") + 1
-        
-        if start != -1 and end > start:
-            json_str = text[start:end]
-            try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
-        
-        
-        json_pattern = r'\{[^{}]*\[[^\[\]]*\][^{}]*\}'
-        matches = re.findall(json_pattern, text, re.DOTALL)
-        
-        for match in matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
-        
-        
-        code_block_pattern = r'```(?:json)?\s*(\{.*?\})\s*```'
-        matches = re.findall(code_block_pattern, text, re.DOTALL | re.IGNORECASE)
-        
-        for match in matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
-        
-        
-        try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            pass
-        
-        return None
\ No newline at end of file
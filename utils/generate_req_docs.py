@@ -1,8 +1,10 @@
 import os
-import json
-from google import genai
 from dotenv import load_dotenv
 
+from utils.llm_gateway import generate_json
+from utils.llm_schemas import DOCUMENTS, SchemaError
+from utils.prompt_budget import fit_text, QUERY_TOKEN_BUDGET
+
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 
@@ -51,22 +53,10 @@ Rules:
 
     def call_api(self):
         try:
-            client = genai.Client(api_key=self.api_key)
-            full_prompt = f"{self.system_prompt}\n\nUser Query: {self.query}"
-            resp = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=[full_prompt]
-            )
-            
-            response = resp.text.strip()
-            start = response.find("{")
-            end = response.rfind("}") + 1
-            output = response[start:end]
-
+            full_prompt = f"{self.system_prompt}\n\nUser Query: {fit_text(self.query, QUERY_TOKEN_BUDGET)}"
             try:
-                data = json.loads(output)
-                return data
-            except json.JSONDecodeError:
+                return generate_json(full_prompt, DOCUMENTS, "documents", api_key=self.api_key, cache=True)
+            except SchemaError:
                 return {"documents": ["Error: Could not generate documents properly."]}
                 
         except Exception as e:
@@ -0,0 +1,164 @@
+import io
+import os
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+from PIL import Image, ImageOps, UnidentifiedImageError
+from utils.blob_store import blob_key
+
+load_dotenv()
+# Longest side sent to Gemini. It tiles images at 768px, and two tiles per
+# side keep small print on scanned documents legible.
+SCAN_MAX_SIDE = int(os.getenv("SCAN_MAX_SIDE", "1536"))
+SCAN_JPEG_QUALITY = int(os.getenv("SCAN_JPEG_QUALITY", "85"))
+
+# Formats Gemini accepts as they are; anything else Pillow can read is re-encoded
+GEMINI_IMAGE_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+PDF_MIME = "application/pdf"
+EXIF_ORIENTATION = 0x0112
+DERIVE_VERSION = 2
+
+
+class UnsupportedDocument(ValueError):
+    """The upload is neither a PDF nor an image Pillow can read"""
+
+
+class PreparedImage:
+    def __init__(self, data, mime_type, source_bytes, cached=False):
+        self.data = data
+        self.mime_type = mime_type
+        self.source_bytes = source_bytes
+        self.cached = cached
+
+
+def _params():
+    # Part of the cache key, so changing the settings (or how derive() treats
+    # an image) never serves stale derivatives
+    return f"{DERIVE_VERSION}:{SCAN_MAX_SIDE}:{SCAN_JPEG_QUALITY}"
+
+
+def derive(data):
+    """
+    Downscale and re-encode one upload for a scan. Returns (bytes, mime_type).
+    PDFs pass through untouched. An upright image already in a Gemini format
+    and within SCAN_MAX_SIDE is kept when re-encoding would not make it smaller.
+    """
+    if data[:5] == b"%PDF-":
+        return data, PDF_MIME
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        source_format = image.format
+        # Gemini ignores EXIF, so a rotated photo has to be re-encoded upright
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) != 1
+        image = ImageOps.exif_transpose(image)
+        encoded, oversized = _encode(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        # OSError also covers truncated files, which only fail once pixels are read
+        raise UnsupportedDocument(f"Unrecognised document format: {str(e)}") from e
+
+    if not oversized and not rotated and source_format in GEMINI_IMAGE_TYPES and len(data) <= len(encoded):
+        return data, GEMINI_IMAGE_TYPES[source_format]
+    return encoded, "image/jpeg"
+
+
+def _encode(image):
+    """Downscale to SCAN_MAX_SIDE and encode as JPEG. Returns (bytes, whether it was downscaled)."""
+    oversized = max(image.size) > SCAN_MAX_SIDE
+    if oversized:
+        image.thumbnail((SCAN_MAX_SIDE, SCAN_MAX_SIDE), Image.LANCZOS)
+
+    if image.mode in ("RGBA", "LA", "P"):
+        # JPEG has no alpha; flatten transparent scans onto white paper
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        image = background
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=SCAN_JPEG_QUALITY, optimize=True)
+    return out.getvalue(), oversized
+
+
+class ScanImagePreparer:
+    """
+    Pre-processing stage in front of Gemini document scans.
+
+    Derived images are stored in the blob store and indexed in `collection`
+    by (source content hash, settings). A document that is scanned again,
+    or the same file uploaded by someone else, reuses the derivative without
+    decoding the original.
+    """
+
+    def __init__(self, blob_store, collection=None):
+        self.blob_store = blob_store
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._times = deque(maxlen=1000)
+        self.metrics = {"prepared": 0, "cache_hits": 0, "passthrough": 0, "bytes_in": 0, "bytes_out": 0, "errors": 0}
+
+    def prepare(self, data, source_key=None):
+        source_key = source_key or blob_key(data)
+        cache_id = f"{source_key}:{_params()}"
+
+        cached = self._lookup(cache_id)
+        if cached is not None:
+            derived, mime_type = cached
+            self._record(len(data), len(derived), None, cache_hit=True)
+            return PreparedImage(derived, mime_type, len(data), cached=True)
+
+        started = time.perf_counter()
+        derived, mime_type = derive(data)
+        self._record(len(data), len(derived), (time.perf_counter() - started) * 1000, passthrough=derived is data)
+        self._store(cache_id, derived, mime_type, len(data))
+        return PreparedImage(derived, mime_type, len(data))
+
+    def _lookup(self, cache_id):
+        if self.collection is None:
+            return None
+        try:
+            entry = self.collection.find_one({"_id": cache_id})
+            if entry and self.blob_store.exists(entry["blob_key"]):
+                return self.blob_store.get(entry["blob_key"]), entry["mime_type"]
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Scan image cache read failed: {str(e)}")
+        return None
+
+    def _store(self, cache_id, derived, mime_type, source_bytes):
+        if self.collection is None:
+            return
+        try:
+            self.collection.update_one(
+                {"_id": cache_id},
+                {"$set": {"blob_key": self.blob_store.put(derived), "mime_type": mime_type,
+                          "source_bytes": source_bytes, "bytes": len(derived), "created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Scan image cache write failed: {str(e)}")
+
+    def _record(self, bytes_in, bytes_out, elapsed_ms, cache_hit=False, passthrough=False):
+        with self._lock:
+            self.metrics["prepared"] += 1
+            self.metrics["cache_hits"] += int(cache_hit)
+            self.metrics["passthrough"] += int(passthrough)
+            self.metrics["bytes_in"] += bytes_in
+            self.metrics["bytes_out"] += bytes_out
+            if elapsed_ms is not None:
+                self._times.append(elapsed_ms)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            times = sorted(self._times)
+        metrics["bytes_saved_ratio"] = round(1 - metrics["bytes_out"] / metrics["bytes_in"], 4) if metrics["bytes_in"] else 0.0
+        if times:
+            metrics["prepare_p50_ms"] = round(times[len(times) // 2], 2)
+            metrics["prepare_p99_ms"] = round(times[min(len(times) - 1, int(len(times) * 0.99))], 2)
+        return metrics
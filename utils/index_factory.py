@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "1024"))
+FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", "8"))
+# PQ codebooks narrower than this lose too much to be worth building
+MIN_PQ_NBITS = 4
+
+INDEX_TYPES = ["flat", "hnsw", "ivfpq", "sq8"]
+
+
+def pq_nbits(n_vectors):
+    """
+    Bits per PQ sub-quantizer that `n_vectors` can train: each codebook has
+    2**nbits centroids and k-means needs at least one point per centroid.
+    """
+    return min(FAISS_PQ_NBITS, int(np.log2(max(n_vectors, 1))))
+
+
+def trainable(kind, n_vectors):
+    return kind != "ivfpq" or pq_nbits(n_vectors) >= MIN_PQ_NBITS
+
+
+def factory_string(kind, n_vectors, dim):
+    """FAISS index_factory description for an index type sized to the corpus"""
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return f"HNSW{FAISS_HNSW_M}"
+    if kind == "sq8":
+        return "SQ8"
+    if kind == "ivfpq":
+        if not trainable(kind, n_vectors):
+            raise ValueError(
+                f"ivfpq needs at least {2 ** MIN_PQ_NBITS} vectors to train, the corpus has {n_vectors}"
+            )
+        # Roughly sqrt(n) lists, with enough points per list to train k-means
+        nlist = max(1, min(FAISS_IVF_NLIST, int(np.sqrt(n_vectors)), n_vectors // 39 or 1))
+        pq_m = FAISS_PQ_M if dim % FAISS_PQ_M == 0 else next(m for m in (32, 16, 8, 4, 2, 1) if dim % m == 0)
+        return f"IVF{nlist},PQ{pq_m}x{pq_nbits(n_vectors)}"
+    raise ValueError(f"Unknown index type: {kind} (expected one of {', '.join(INDEX_TYPES)})")
+
+
+def apply_search_params(index):
+    """Set query-time knobs (nprobe, efSearch) that are not chosen at build time"""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(FAISS_IVF_NPROBE, ivf.nlist)
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+    return index
+
+
+def build_index(vectors, kind=FAISS_INDEX_TYPE):
+    """Train (if needed) and fill a FAISS index of the given type"""
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    index = faiss.index_factory(dim, factory_string(kind, n_vectors, dim))
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return apply_search_params(index)
+
+
+def extract_vectors(index):
+    """Read every stored vector back out of an index (lossy for PQ/SQ indexes)"""
+    import faiss
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def stores_exact_vectors(index):
+    """True when the index keeps full float vectors (flat, or HNSW over flat storage)"""
+    import faiss
+
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return isinstance(index, faiss.IndexFlat)
+
+
+def source_vectors(vectorstore, positions=None, store=None):
+    """
+    The original vectors at the given index positions (all by default).
+    Exact storage is read back directly. Quantised indexes only hold an
+    approximation, so their documents are re-embedded instead, with
+    `store` (an EmbeddingStore) serving texts that were embedded before;
+    rebuilding from reconstructed vectors would compound the error.
+    """
+    index = vectorstore.index
+    positions = list(range(index.ntotal)) if positions is None else list(positions)
+    if stores_exact_vectors(index):
+        return extract_vectors(index)[positions]
+
+    from utils.embeddings import embed_texts
+
+    mapping = vectorstore.index_to_docstore_id
+    texts = [vectorstore.docstore.search(mapping[position]).page_content for position in positions]
+    return embed_texts(texts, store=store)
+
+
+def rebuild(vectorstore, kind=FAISS_INDEX_TYPE, drop_ids=None, store=None):
+    """
+    Rebuild a LangChain FAISS store's index as `kind`, optionally dropping
+    docstore ids. Works for index types that cannot remove vectors in place.
+    """
+    drop_ids = set(drop_ids or [])
+    old_mapping = vectorstore.index_to_docstore_id
+
+    keep_positions = [i for i in range(vectorstore.index.ntotal) if old_mapping[i] not in drop_ids]
+    vectors = source_vectors(vectorstore, keep_positions, store=store)
+    vectorstore.index = build_index(vectors, kind)
+    vectorstore.index_to_docstore_id = {new: old_mapping[old] for new, old in enumerate(keep_positions)}
+
+    dropped = [doc_id for doc_id in old_mapping.values() if doc_id in drop_ids]
+    if dropped:
+        vectorstore.docstore.delete(dropped)
+    return vectorstore
+
+
+def index_memory_bytes(index):
+    import faiss
+    return int(faiss.serialize_index(index).size)
+
+
+def evaluate(vectors, kinds=INDEX_TYPES, k=10, n_queries=200, seed=0):
+    """
+    Compare index types against an exact flat baseline on the given corpus.
+    Queries are corpus vectors with a little noise, so the baseline
+    neighbours are realistic for this data.
+    """
+    import faiss
+
+    rng = np.random.default_rng(seed)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    picks = rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)
+    scale = float(np.std(vectors)) * 0.05
+    queries = vectors[picks] + rng.normal(0, scale, size=(len(picks), vectors.shape[1])).astype(np.float32)
+
+    baseline = faiss.IndexFlatL2(vectors.shape[1])
+    baseline.add(vectors)
+    _, truth = baseline.search(queries, k)
+
+    results = []
+    for kind in kinds:
+        if not trainable(kind, len(vectors)):
+            print(f"Skipping {kind}: {len(vectors)} vectors are too few to train it")
+            continue
+        started = time.perf_counter()
+        index = build_index(vectors, kind)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            _, ids = index.search(query.reshape(1, -1), k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            found[i] = ids[0]
+
+        recall = np.mean([len(set(found[i]) & set(truth[i])) / k for i in range(len(queries))])
+        results.append({
+            "kind": kind,
+            "factory": factory_string(kind, len(vectors), vectors.shape[1]),
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            "memory_mb": round(index_memory_bytes(index) / (1024 * 1024), 2),
+            "build_seconds": round(build_seconds, 2)
+        })
+    return results
+
+
+def _load_live_vectorstore():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from utils.index_store import IndexStore
+    from utils.retriever import EMBEDDING_MODEL_NAME
+
+    store = IndexStore()
+    _, vectorstore = store.load(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), writable=True)
+    return store, vectorstore
+
+
+if __name__ == "__main__":
+    # python -m utils.index_factory evaluate [k]
+    # python -m utils.index_factory build <flat|hnsw|ivfpq|sq8>
+    command = sys.argv[1] if len(sys.argv) > 1 else "evaluate"
+    store, vectorstore = _load_live_vectorstore()
+
+    if command == "evaluate":
+        k = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+        for row in evaluate(source_vectors(vectorstore), k=k):
+            print("  ".join(f"{key}={value}" for key, value in row.items()))
+    elif command == "build":
+        kind = sys.argv[2] if len(sys.argv) > 2 else FAISS_INDEX_TYPE
+        tombstones = store.load_tombstones()
+        store.publish(rebuild(vectorstore, kind, drop_ids=tombstones))
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,213 @@
+import os
+import json
+import shutil
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from utils.index_factory import apply_search_params
+from utils.mmap_docstore import MmapDocstore, RowIds, write_docstore, has_docstore
+from utils.lexical_index import LexicalIndex, LEXICAL_FILE
+
+load_dotenv()
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "faiss_index")
+INDEX_VERSIONS_TO_KEEP = int(os.getenv("INDEX_VERSIONS_TO_KEEP", "3"))
+
+# Name used for an index saved straight into FAISS_INDEX_PATH (the layout
+# produced by the original notebook build)
+BASE_VERSION = "base"
+
+
+class IndexStore:
+    """
+    Versioned on-disk store for the find_users FAISS index.
+
+    Layout:
+        faiss_index/
+            index.faiss, index.pkl          legacy build, version "base"
+            versions/<version>/index.faiss  published builds
+            versions/<version>/docstore.jsonl, docstore.offsets.npy
+                                            documents in index order, read
+                                            through mmap (see MmapDocstore)
+            versions/<version>/lexical.json BM25 index over the same documents
+            versions/<version>/tombstones.json
+                                            docstore ids deleted since the
+                                            last compaction
+            CURRENT                         name of the live version
+
+    A new build is written to a temporary directory next to the live one,
+    renamed into versions/ and only then made live by atomically replacing
+    CURRENT, so readers never see a half-written index.
+    """
+
+    def __init__(self, root=FAISS_INDEX_PATH, keep=INDEX_VERSIONS_TO_KEEP):
+        self.root = root
+        self.keep = keep
+        self.versions_dir = os.path.join(root, "versions")
+        self.current_file = os.path.join(root, "CURRENT")
+
+    def current_version(self):
+        try:
+            with open(self.current_file) as f:
+                version = f.read().strip()
+            if version and os.path.isdir(self.version_path(version)):
+                return version
+        except OSError:
+            pass
+        return BASE_VERSION
+
+    def version_path(self, version):
+        if version == BASE_VERSION:
+            return self.root
+        return os.path.join(self.versions_dir, version)
+
+    def list_versions(self):
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if not name.startswith(".") and os.path.isdir(os.path.join(self.versions_dir, name))
+        )
+
+    def load(self, embedding_model, version=None, writable=False):
+        """
+        Load a version (the live one by default) as a LangChain FAISS store.
+
+        By default the index and docstore are memory-mapped read-only, so
+        workers share one page-cache copy. Pass writable=True to get an
+        in-memory copy that can be modified and published.
+        """
+        import faiss
+        from langchain_community.vectorstores import FAISS
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+
+        version = version or self.current_version()
+        path = self.version_path(version)
+
+        if not has_docstore(path):
+            # Legacy layout with the docstore pickled in index.pkl
+            vectorstore = FAISS.load_local(path, embedding_model, allow_dangerous_deserialization=True)
+        elif writable:
+            index = faiss.read_index(os.path.join(path, "index.faiss"))
+            rows = list(MmapDocstore(path).rows())
+            docstore = InMemoryDocstore(dict(rows))
+            vectorstore = FAISS(embedding_model, index, docstore, {i: doc_id for i, (doc_id, _) in enumerate(rows)})
+        else:
+            docstore = MmapDocstore(path)
+            index = read_index_mmap(os.path.join(path, "index.faiss"))
+            vectorstore = FAISS(embedding_model, index, docstore, RowIds(len(docstore)))
+
+        apply_search_params(vectorstore.index)
+        return version, vectorstore
+
+    def load_tombstones(self, version=None):
+        """Docstore ids that are still in the index but must not be served"""
+        version = version or self.current_version()
+        try:
+            with open(os.path.join(self.version_path(version), "tombstones.json")) as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def load_lexical(self, vectorstore, version=None):
+        """BM25 index for a version, built from the docstore if it was not published with one"""
+        path = self.version_path(version or self.current_version())
+        if os.path.exists(os.path.join(path, LEXICAL_FILE)):
+            return LexicalIndex.load(path)
+        return LexicalIndex.from_vectorstore(vectorstore)
+
+    def publish(self, vectorstore, version=None, tombstones=None):
+        """Write a new build next to the live one and make it live"""
+        version = version or datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+        staging = os.path.join(self.versions_dir, f".staging-{version}")
+        final = self.version_path(version)
+        if os.path.exists(final):
+            raise ValueError(f"Index version already exists: {version}")
+
+        import faiss
+
+        os.makedirs(staging)
+        faiss.write_index(vectorstore.index, os.path.join(staging, "index.faiss"))
+        write_docstore(staging, vectorstore)
+        LexicalIndex.from_vectorstore(vectorstore).save(staging)
+        with open(os.path.join(staging, "tombstones.json"), "w") as f:
+            json.dump(sorted(tombstones or []), f)
+        os.replace(staging, final)
+
+        tmp_current = f"{self.current_file}.tmp-{os.getpid()}"
+        with open(tmp_current, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_current, self.current_file)
+
+        print(f"Published FAISS index version {version}")
+        self.prune()
+        return version
+
+    def prune(self):
+        """Delete old versions, always keeping the live one"""
+        live = self.current_version()
+        stale = [v for v in self.list_versions() if v != live][:-self.keep or None]
+        for version in stale:
+            shutil.rmtree(self.version_path(version), ignore_errors=True)
+
+    def current_marker(self):
+        """Cheap change marker for CURRENT, used to detect new versions"""
+        try:
+            stat = os.stat(self.current_file)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+
+def read_index_mmap(path):
+    """Open a FAISS index memory-mapped when this FAISS build and index type allow it"""
+    import faiss
+
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(path, flags)
+    except RuntimeError as e:
+        print(f"Memory-mapped index load not supported, reading into memory: {str(e)}")
+        return faiss.read_index(path)
+
+
+class IndexHandle:
+    """
+    Reference-counted handle on one loaded index version.
+
+    The retriever swaps handles when a new version goes live. The retired
+    handle keeps its vectorstore until the last in-flight query releases it.
+    """
+
+    def __init__(self, version, vectorstore, tombstones=None, lexical=None):
+        self.version = version
+        self.vectorstore = vectorstore
+        self.tombstones = tombstones or set()
+        self.lexical = lexical
+        self.refs = 0
+        self.retired = False
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self.refs -= 1
+            self._maybe_close()
+
+    def retire(self):
+        with self._lock:
+            self.retired = True
+            self._maybe_close()
+
+    def _maybe_close(self):
+        if self.retired and self.refs == 0 and self.vectorstore is not None:
+            self.vectorstore = None
+            self.lexical = None
+            print(f"Released FAISS index version {self.version}")
@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import socket
+import threading
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from pymongo import ReturnDocument
+from dotenv import load_dotenv
+
+load_dotenv()
+# local: jobs run on a thread pool inside the web worker that enqueued them
+# mongo: jobs wait in the jobs collection and any process running workers claims them
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "local")
+# 0 makes this process enqueue-only, for web workers paired with `python -m utils.job_queue`
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+# A running job whose worker died is handed out again after this long
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class JobQueue:
+    """
+    Background execution for slow (LLM-backed) request handlers.
+
+    Every job is a document in the jobs collection, so its status and result
+    can be read from any gunicorn worker no matter which one runs it.
+    Handlers are registered by name and return the (payload, http_status)
+    pair the endpoint used to send back synchronously.
+    """
+
+    def __init__(self, collection, backend=JOB_QUEUE_BACKEND, workers=JOB_WORKERS):
+        if workers < 0:
+            raise ValueError(f"JOB_WORKERS must be 0 or more, got {workers}")
+        self.collection = collection
+        self.backend = backend
+        self.workers = workers
+        self._handlers = {}
+        self._executor = None
+        self._executor_pid = None
+        self._pollers = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.metrics = {"enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0}
+
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=JOB_RESULT_TTL)
+            self.collection.create_index([("status", 1), ("created_at", 1)])
+        except Exception as e:
+            print(f"Job queue index setup failed: {str(e)}")
+
+    @property
+    def worker_id(self):
+        # Read per call: the queue is built before gunicorn forks its workers
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def handler(self, name):
+        """Register a function as the handler for jobs called `name`"""
+        def register(fn):
+            self._handlers[name] = fn
+            return fn
+        return register
+
+    def enqueue(self, name, owner=None, **kwargs):
+        """Store a job and hand it to a worker; returns the job id"""
+        if name not in self._handlers:
+            raise KeyError(f"No job handler registered for '{name}'")
+
+        job_id = ObjectId()
+        self.collection.insert_one({
+            "_id": job_id,
+            "name": name,
+            "owner": owner,
+            "kwargs": kwargs,
+            "status": QUEUED,
+            "attempts": 0,
+            "created_at": datetime.utcnow()
+        })
+        self.metrics["enqueued"] += 1
+
+        if self.backend == "local" and self.workers > 0:
+            self._get_executor().submit(self._claim_and_run, {"_id": job_id})
+        return str(job_id)
+
+    def get(self, job_id):
+        try:
+            job = self.collection.find_one({"_id": ObjectId(job_id)}, {"kwargs": 0})
+        except Exception:
+            return None
+        # The local backend cannot hand a job to another process, so a lapsed lease means it is lost
+        if (job and self.backend == "local" and job["status"] == RUNNING
+                and job.get("lease_until") and job["lease_until"] < datetime.utcnow()):
+            job.update({"status": FAILED, "error": "Worker stopped before the job finished", "http_status": 500})
+        return job
+
+    def _get_executor(self):
+        # Executors do not survive a fork, so each gunicorn worker builds its own
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _claim(self, query):
+        now = datetime.utcnow()
+        return self.collection.find_one_and_update(
+            query,
+            {"$set": {"status": RUNNING, "worker": self.worker_id, "started_at": now,
+                      "lease_until": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def _claim_next(self):
+        return self._claim({"$or": [
+            {"status": QUEUED},
+            {"status": RUNNING, "lease_until": {"$lt": datetime.utcnow()}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}
+        ]})
+
+    def _claim_and_run(self, query):
+        job = self._claim({**query, "status": QUEUED})
+        if job is not None:
+            self._run(job)
+
+    def _run(self, job):
+        if job["attempts"] > 1:
+            self.metrics["retried"] += 1
+
+        try:
+            payload, http_status = self._handlers[job["name"]](**job.get("kwargs", {}))
+            update = {"status": SUCCEEDED, "result": payload, "http_status": http_status}
+            self.metrics["succeeded"] += 1
+        except Exception as e:
+            print(f"Job {job['_id']} ({job['name']}) failed: {str(e)}")
+            print(traceback.format_exc())
+            update = {"status": FAILED, "error": str(e), "http_status": 500}
+            self.metrics["failed"] += 1
+
+        update["finished_at"] = datetime.utcnow()
+        update["duration_ms"] = round((update["finished_at"] - job["started_at"]).total_seconds() * 1000, 1)
+        self.collection.update_one({"_id": job["_id"], "worker": self.worker_id}, {"$set": update})
+
+    def _poll(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                print(f"Job queue poll failed: {str(e)}")
+                job = None
+            if job is None:
+                self._stop.wait(JOB_POLL_INTERVAL)
+                continue
+            self._run(job)
+
+    def start(self):
+        """Start polling workers for the mongo backend (no-op for local)"""
+        if self.backend != "mongo" or self._pollers:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._poll, name=f"job-poller-{i}", daemon=True)
+            thread.start()
+            self._pollers.append(thread)
+
+    def stop(self):
+        self._stop.set()
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        metrics["backend"] = self.backend
+        metrics["workers"] = self.workers
+        try:
+            metrics["queued"] = self.collection.count_documents({"status": QUEUED})
+            metrics["running"] = self.collection.count_documents({"status": RUNNING})
+        except Exception:
+            pass
+        return metrics
+
+
+def job_response(job_id):
+    """Body of the 202 an endpoint sends after enqueueing"""
+    return {"job_id": job_id, "status": QUEUED, "status_url": f"/api/jobs/{job_id}"}
+
+
+if __name__ == "__main__":
+    # python -m utils.job_queue: dedicated worker process for JOB_QUEUE_BACKEND=mongo.
+    # Importing app registers the handlers; web workers can then run with JOB_WORKERS=0.
+    os.environ.setdefault("RETRIEVER_WARMUP", "false")
+    from app import job_queue
+
+    job_queue.backend = "mongo"
+    job_queue.workers = int(sys.argv[1]) if len(sys.argv) > 1 else max(job_queue.workers, 1)
+    job_queue.start()
+    print(f"Job worker {job_queue.worker_id} running {job_queue.workers} threads")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        job_queue.stop()
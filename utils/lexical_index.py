@@ -0,0 +1,151 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+from collections import Counter, defaultdict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_LATENCY_BUDGET_MS = float(os.getenv("HYBRID_LATENCY_BUDGET_MS", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+LEXICAL_FILE = "lexical.json"
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "by", "with", "is", "are",
+    "was", "were", "be", "been", "it", "its", "this", "that", "as", "at", "from", "my", "me",
+    "i", "we", "our", "you", "your", "he", "she", "they", "his", "her", "their", "has", "have", "had"
+}
+
+# "Section 138", "S. 138", "Order XXXIX", "Rule 2A", "Article 21" -> single tokens.
+# Roman numerals must be well formed and upper case, so "order civil" or
+# "rule did" are left as plain words.
+ROMAN_NUMERAL = r"(?=[MDCLXVI])M{0,3}(?:CM|CD|D?C{0,3})(?:XC|XL|L?X{0,3})(?:IX|IV|V?I{0,3})"
+PROVISION_PATTERN = re.compile(
+    r"\b(?i:(section|sec\.?|s\.|order|rule|article|art\.?))\s*([0-9]+[a-zA-Z]?|" + ROMAN_NUMERAL + r")\b"
+)
+PROVISION_ALIASES = {"sec": "section", "sec.": "section", "s.": "section", "art": "article", "art.": "article"}
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lowercased word tokens plus one combined token per statutory reference"""
+    tokens = []
+    # Matched before lowercasing: the case of a roman numeral is what tells it from a word
+    for kind, number in PROVISION_PATTERN.findall(text):
+        kind = kind.lower()
+        tokens.append(f"{PROVISION_ALIASES.get(kind, kind)}_{number.lower()}")
+    text = text.lower()
+    tokens.extend(word for word in WORD_PATTERN.findall(text) if word not in STOPWORDS)
+    return tokens
+
+
+def document_key(doc):
+    """Identity stored with each BM25 row (fusion itself is keyed by FAISS position)"""
+    return doc.metadata.get("doc_id") or doc.page_content
+
+
+class LexicalIndex:
+    """
+    In-process BM25 inverted index over the find_users corpus, stored as
+    lexical.json next to each FAISS index version. Positions match FAISS
+    vector positions, so a hit can be resolved through the same docstore.
+    """
+
+    def __init__(self, keys, doc_lengths, postings, k1=1.5, b=0.75):
+        self.keys = keys
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.postings = postings
+        self.k1 = k1
+        self.b = b
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    @classmethod
+    def from_texts(cls, keys, texts, **kwargs):
+        postings = defaultdict(list)
+        doc_lengths = []
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings[term].append([position, tf])
+        return cls(list(keys), doc_lengths, dict(postings), **kwargs)
+
+    @classmethod
+    def from_vectorstore(cls, vectorstore):
+        docs = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            for position in range(vectorstore.index.ntotal)
+        ]
+        return cls.from_texts([document_key(doc) for doc in docs], [doc.page_content for doc in docs])
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, LEXICAL_FILE)) as f:
+            data = json.load(f)
+        return cls(data["keys"], data["doc_lengths"], data["postings"], data["k1"], data["b"])
+
+    def save(self, directory):
+        with open(os.path.join(directory, LEXICAL_FILE), "w") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "keys": self.keys,
+                "doc_lengths": self.doc_lengths.tolist(),
+                "postings": self.postings
+            }, f, separators=(",", ":"))
+
+    def search(self, query_text, k):
+        """Return up to k (position, score) pairs, best first"""
+        n_docs = len(self.keys)
+        if not n_docs:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(tokenize(query_text)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[position] / self.avg_length)
+                scores[position] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuse ranked lists of keys into (key, score) pairs, best first; a key
+    scores sum(1 / (k + rank)) over the lists it appears in
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+if __name__ == "__main__":
+    # python -m utils.lexical_index [n_queries]: fused-path latency against the budget
+    from utils.retriever import get_retriever
+
+    retriever = get_retriever()
+    retriever.search("warm up", k=1)
+    with retriever.acquire() as handle:
+        sample = [handle.vectorstore.docstore.search(handle.vectorstore.index_to_docstore_id[i]).page_content[:200]
+                  for i in range(min(handle.vectorstore.index.ntotal, int(sys.argv[1]) if len(sys.argv) > 1 else 100))]
+
+    latencies = []
+    for text in sample:
+        started = time.perf_counter()
+        retriever.search(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    p50, p99 = np.percentile(latencies, 50), np.percentile(latencies, 99)
+    print(f"hybrid search over {len(latencies)} queries: p50={p50:.2f}ms p99={p99:.2f}ms budget={HYBRID_LATENCY_BUDGET_MS}ms")
+    sys.exit(0 if p99 <= HYBRID_LATENCY_BUDGET_MS else 1)
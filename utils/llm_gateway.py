@@ -0,0 +1,256 @@
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from dotenv import load_dotenv
+from utils.prompt_cache import PromptCache, prompt_key
+from utils.llm_schemas import parse
+from utils.rate_limiter import LLMRateLimiter, INTERACTIVE, BATCH
+from utils.llm_resilience import ResilientCaller
+from utils.token_accounting import TokenLedger, usage_of, estimate_prompt_tokens, estimate_tokens
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+LLM_TIMEOUT_MS = int(os.getenv("LLM_TIMEOUT_MS", "60000"))
+# gemini: google-genai; stub: utils.llm_stub, for load tests and CI without quota
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+# Memory-only until the app attaches the shared Mongo tier
+prompt_cache = PromptCache()
+
+# Every outbound call waits here; state is shared by all workers on the host
+limiter = LLMRateLimiter()
+
+# Per-process retries, hedging and circuit breaker around every call
+resilience = ResilientCaller()
+
+# Prompt/response tokens per route; in memory until the app attaches Mongo rollups
+token_ledger = TokenLedger()
+
+
+def configure_prompt_cache(collection):
+    """Back the prompt cache with a Mongo collection shared by all workers"""
+    global prompt_cache
+    prompt_cache = PromptCache(collection)
+    return prompt_cache
+
+
+def configure_token_ledger(collection):
+    """Roll token counts up into a Mongo collection shared by all workers"""
+    global token_ledger
+    token_ledger = TokenLedger(collection)
+    return token_ledger
+
+
+def get_client(api_key=None):
+    """
+    Return the pooled google-genai client for this process.
+
+    One client is kept per API key and reused across requests and threads,
+    so its HTTP connection pool (and the TLS sessions in it) stays warm.
+    Clients are recreated after a fork, since gunicorn workers must not
+    share sockets with the master.
+
+    Any backend works as long as it exposes models.generate_content and
+    models.generate_content_stream with the genai signatures and returns
+    objects carrying .text; LLM_BACKEND=stub swaps in utils.llm_stub.
+    """
+    api_key = api_key or GEMINI_API_KEY
+    key = (os.getpid(), api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _create_client(api_key)
+                _clients[key] = client
+    return client
+
+
+def _create_client(api_key):
+    if LLM_BACKEND == "stub":
+        from utils.llm_stub import StubClient
+        return StubClient()
+    from google import genai
+    return genai.Client(api_key=api_key, http_options={"timeout": LLM_TIMEOUT_MS})
+
+
+def generate(contents, model=GEMINI_MODEL, config=None, api_key=None, priority=BATCH, route="default"):
+    """
+    Single entry point for Gemini generate_content calls. `priority` picks
+    the rate-limiter lane: INTERACTIVE for a user waiting on the answer,
+    BATCH for everything else. Token usage is booked under `route`.
+    """
+    if not isinstance(contents, list):
+        contents = [contents]
+    api_key = api_key or GEMINI_API_KEY
+
+    def call():
+        with limiter.acquire(api_key, priority):
+            return get_client(api_key).models.generate_content(
+                model=model,
+                contents=contents,
+                config=config
+            )
+
+    resp = resilience.call(call)
+    token_ledger.record(route, *usage_of(resp, contents, resp.text))
+    return resp
+
+
+def generate_text(contents, model=GEMINI_MODEL, config=None, api_key=None, cache=False, priority=BATCH,
+                  route="default"):
+    """
+    generate() and return the stripped response text. With cache=True the
+    text is served from, and stored in, the prompt cache; only use it for
+    prompts whose answer depends on nothing but the prompt itself.
+    """
+    if not isinstance(contents, list):
+        contents = [contents]
+
+    key = None
+    if cache:
+        key = prompt_key(model, contents, config)
+        cached = prompt_cache.get(key)
+        if cached is not None:
+            return cached
+
+    resp = generate(contents, model=model, config=config, api_key=api_key, priority=priority, route=route)
+    text = (resp.text or "").strip()
+    if key is not None and text:
+        prompt_cache.put(key, text, model=model)
+    return text
+
+
+class StreamStats:
+    """Per-route time-to-first-chunk and total latency of streamed calls"""
+
+    def __init__(self, window=1000):
+        self._ttfb = defaultdict(lambda: deque(maxlen=window))
+        self._total = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(int)
+
+    def record(self, route, ttfb_ms, total_ms):
+        self._counts[route] += 1
+        if ttfb_ms is not None:
+            self._ttfb[route].append(ttfb_ms)
+        self._total[route].append(total_ms)
+
+    @staticmethod
+    def _percentiles(values):
+        values = sorted(values)
+        if not values:
+            return {}
+        return {
+            "p50_ms": round(values[len(values) // 2], 2),
+            "p99_ms": round(values[min(len(values) - 1, int(len(values) * 0.99))], 2)
+        }
+
+    def get_metrics(self):
+        return {
+            route: {
+                "streams": count,
+                "ttfb": self._percentiles(self._ttfb[route]),
+                "total": self._percentiles(self._total[route])
+            }
+            for route, count in self._counts.items()
+        }
+
+
+stream_stats = StreamStats()
+
+
+def stream(contents, model=GEMINI_MODEL, config=None, api_key=None, route="default", priority=INTERACTIVE):
+    """
+    Yield response text chunks as Gemini produces them. Time to the first
+    non-empty chunk, total time and token usage are recorded under `route`.
+    """
+    if not isinstance(contents, list):
+        contents = [contents]
+
+    api_key = api_key or GEMINI_API_KEY
+    # Streams are not retried once text has reached the client, but they do feed the breaker
+    resilience.breaker.before_call()
+    started = time.perf_counter()
+    first_chunk_at = None
+    answered = False
+    error = None
+    usage_chunk = None
+    sent = []
+    try:
+        # The slot is held until the last chunk, since the call is in flight until then
+        with limiter.acquire(api_key, priority):
+            for chunk in get_client(api_key).models.generate_content_stream(
+                model=model,
+                contents=contents,
+                config=config
+            ):
+                answered = True
+                # Gemini attaches cumulative usage_metadata; the last one covers the whole stream
+                if getattr(chunk, "usage_metadata", None) is not None:
+                    usage_chunk = chunk
+                text = chunk.text
+                if not text:
+                    continue
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                sent.append(text)
+                yield text
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if error is not None:
+            resilience.breaker.record_error(error)
+        elif answered:
+            resilience.breaker.record_success()
+        else:
+            # Closed by the client before Gemini answered
+            resilience.breaker.record_skipped()
+        ttfb_ms = (first_chunk_at - started) * 1000 if first_chunk_at is not None else None
+        stream_stats.record(route, ttfb_ms, (time.perf_counter() - started) * 1000)
+        if usage_chunk is not None:
+            token_ledger.record(route, *usage_of(usage_chunk, contents, "".join(sent)))
+        else:
+            token_ledger.record(route, estimate_prompt_tokens(contents), estimate_tokens("".join(sent)), estimated=True)
+
+
+def generate_json(contents, schema, name, model=GEMINI_MODEL, config=None, api_key=None, cache=False,
+                  priority=BATCH):
+    """
+    Schema-constrained call: Gemini is asked for `schema` as JSON and the
+    reply is parsed and validated once, under the metrics name `name`, which
+    is also the route its tokens are booked under.
+    Raises SchemaError when the reply does not match. With cache=True only
+    validated replies are stored, so a bad answer is never served twice.
+    """
+    if not isinstance(contents, list):
+        contents = [contents]
+    config = {**(config or {}), "response_mime_type": "application/json", "response_schema": schema}
+
+    key = None
+    if cache:
+        key = prompt_key(model, contents, config)
+        cached = prompt_cache.get(key)
+        if cached is not None:
+            return parse(schema, cached, name)
+
+    resp = generate(contents, model=model, config=config, api_key=api_key, priority=priority, route=name)
+    text = resp.text or ""
+    value = parse(schema, text, name)
+    if key is not None:
+        prompt_cache.put(key, text, model=model)
+    return value
+
+
+def image_part(data, mime_type):
+    """Inline image/PDF bytes as a content part"""
+    if LLM_BACKEND == "stub":
+        from utils.llm_stub import stub_part
+        return stub_part(data, mime_type)
+    from google.genai import types
+    return types.Part.from_bytes(data=data, mime_type=mime_type)
@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import queue
+import argparse
+from contextlib import redirect_stdout
+from concurrent.futures import ThreadPoolExecutor
+
+# Default to the offline stub; pass --live to spend real Gemini quota
+if "--live" not in sys.argv:
+    os.environ["LLM_BACKEND"] = "stub"
+    # The utils refuse to call out without a key, even though the stub ignores it
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+
+from utils import llm_gateway
+from utils.query_analysis import Query_Analysis
+from utils.generate_deadlines import GenerateDeadlines
+from utils.generate_req_docs import Generate_Documents
+from utils.query_pipeline import analyse_query
+from utils.doc_scan import Image_Analyser
+from utils.chat_with_lawyer import ChatWithLawyer
+from utils.verify_strategy import run_gemini_verification
+from utils.doc_reference_generator import DocumentReferenceGenerator
+from utils.llm_schemas import parse_stats
+
+QUERIES = [
+    "My landlord is refusing to return my security deposit after I vacated the flat",
+    "A cheque given to me for a business payment bounced for insufficient funds",
+    "My neighbour has built a wall that encroaches on my ancestral land",
+    "My employer has not paid my salary for the last three months",
+    "I want to file for mutual consent divorce and agree on child custody"
+]
+PROGRESS = "Query Analysis: 1/1 completed\nOverall Progress: 45.0% complete"
+# The stub never decodes the image; with --live this should be a real scan
+SAMPLE_IMAGE = base64.b64encode(b"\xff\xd8\xff\xe0" + b"\x00" * 2048).decode()
+
+
+def _query(i):
+    # Distinct text per request so the prompt cache does not flatten the load
+    return f"{QUERIES[i % len(QUERIES)]} (case {i})"
+
+
+def _chat_stream(i):
+    # Time to first chunk is recorded by llm_gateway.stream_stats
+    reply = "".join(ChatWithLawyer(_query(i), PROGRESS, "User: What is your fee?\nLawyer: 50k usd").stream_reply())
+    return bool(reply)
+
+
+# --mode utils: call the util classes directly, skipping Flask, sessions and the job queue
+UTIL_SCENARIOS = {
+    "analysis": lambda i: Query_Analysis(_query(i)).call_api().get("status") != "error",
+    "deadlines": lambda i: bool(GenerateDeadlines(_query(i)).call_api().get("deadlines")),
+    "documents": lambda i: all(isinstance(d, dict) for d in Generate_Documents(_query(i)).call_api().get("documents", [])),
+    "combined": lambda i: bool(analyse_query(_query(i))["analysis"]),
+    "scan": lambda i: Image_Analyser(_query(i), "Rental agreement", SAMPLE_IMAGE).analyze_legal_doc().get("overall_validity") != "error",
+    "chat": lambda i: bool(ChatWithLawyer(_query(i), PROGRESS, "User: What is your fee?").generate_response().get("negotiation_strategy") != "General inquiry"),
+    "chat_stream": _chat_stream,
+    "verification": lambda i: "API call failed" not in run_gemini_verification(_query(i), "Negotiate, then file suit", []).get("analysis", ""),
+    "doc_reference": lambda i: "Reference Generation Error" not in DocumentReferenceGenerator().generate_reference_html("Rental agreement", _query(i))
+}
+
+
+class AppClient:
+    """The Flask app in this process through its test client; the whole request path runs here"""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def request(self, method, path, json=None, data=None):
+        resp = self.client.open(path, method=method, json=json, data=data)
+        return resp.status_code, resp.get_json(silent=True)
+
+    def stream(self, path, json):
+        resp = self.client.post(path, json=json, headers={"Accept": "text/event-stream"}, buffered=False)
+        try:
+            yield from resp.iter_encoded()
+        finally:
+            resp.close()
+
+
+class HttpClient:
+    """A deployed server (e.g. gunicorn with LLM_BACKEND=stub) over HTTP, cookies kept per client"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip("/")
+        self.session = requests.Session()
+
+    def request(self, method, path, json=None, data=None):
+        resp = self.session.request(method, self.base_url + path, json=json, data=data, allow_redirects=False)
+        try:
+            return resp.status_code, resp.json()
+        except ValueError:
+            return resp.status_code, None
+
+    def stream(self, path, json):
+        with self.session.post(self.base_url + path, json=json, headers={"Accept": "text/event-stream"},
+                               stream=True) as resp:
+            yield from resp.iter_content(chunk_size=None)
+
+
+class AppUser:
+    """One signed-up user with its own client, so each load-test thread has its own session"""
+
+    def __init__(self, make_client, email, password):
+        self.client = make_client()
+        self.client.request("POST", "/login", data={"email": email, "password": password})
+        # /login redirects whether or not the password matched; only a session proves it worked
+        status, _ = self.client.request("GET", "/api/queries")
+        if status != 200:
+            raise RuntimeError(f"Login as {email} failed: /api/queries answered HTTP {status}")
+
+    def wait_for_job(self, status, body, interval=0.2):
+        """Follow a 202 to its job's final status, as static/js/jobs.js does"""
+        if status != 202:
+            return status < 400
+        while True:
+            time.sleep(interval)
+            status, job = self.client.request("GET", body["status_url"])
+            if status != 200:
+                return False
+            if job["status"] in ("succeeded", "failed"):
+                return (job.get("http_status") or 500) < 400
+
+    def saved_query_ids(self):
+        _, body = self.client.request("GET", "/api/queries")
+        return [query["id"] for query in body["queries"]]
+
+
+def _analyse(user, i, query_ids):
+    return user.wait_for_job(*user.client.request("POST", "/analyse_query", json={"query": _query(i)}))
+
+
+def _analyse_full(user, i, query_ids):
+    return user.wait_for_job(*user.client.request("POST", f"/analyse_query/full/{query_ids[i % len(query_ids)]}"))
+
+
+def _find_users(user, i, query_ids):
+    status, _ = user.client.request("GET", f"/find_users/{query_ids[i % len(query_ids)]}")
+    return status == 200
+
+
+def _doc_reference(user, i, query_ids):
+    body = {"doc_name": "Rental agreement", "query_data": {"query": _query(i)}}
+    return user.wait_for_job(*user.client.request("POST", "/generate_doc_reference", json=body))
+
+
+def _doc_reference_stream(user, i, query_ids):
+    body = {"doc_name": "Rental agreement", "query_data": {"query": _query(i)}}
+    events = b"".join(user.client.stream("/generate_doc_reference", body))
+    return b"event: error" not in events and b"event: done" in events
+
+
+# --mode app / --mode http: the main endpoints end to end, including sessions, the job queue and SSE
+APP_SCENARIOS = {
+    "analysis": _analyse,
+    "combined": _analyse_full,
+    "find_users": _find_users,
+    "doc_reference": _doc_reference,
+    "doc_reference_stream": _doc_reference_stream
+}
+
+
+def app_scenarios(make_client, email, requests, concurrency):
+    """
+    Sign up `email` as a throwaway user, save `requests` distinct queries
+    for the endpoints that take a query id, and log in one client per
+    worker thread. Setup is not timed; each call borrows a logged-in client.
+    """
+    password = uuid.uuid4().hex
+    status, body = make_client().request("POST", "/api/signup", json={"firstName": "Load", "lastName": "Test",
+                                                                      "email": email, "password": password})
+    if status != 200 or not (body or {}).get("success"):
+        raise RuntimeError(f"Signing up {email} failed with HTTP {status}: {body}")
+
+    logged_in = [AppUser(make_client, email, password) for _ in range(concurrency)]
+    users = queue.Queue()
+    for user in logged_in:
+        users.put(user)
+
+    setup = logged_in[0]
+    for i in range(requests):
+        setup.client.request("POST", "/save_query", json={"query": _query(i)})
+    query_ids = setup.saved_query_ids()
+
+    def bind(fn):
+        def call(i):
+            user = users.get()
+            try:
+                return fn(user, i, query_ids)
+            finally:
+                users.put(user)
+        return call
+
+    return {name: bind(fn) for name, fn in APP_SCENARIOS.items()}
+
+
+def remove_user(db, email):
+    """Delete the throwaway user and everything the run saved under it"""
+    user = db["users"].find_one({"email": email}, {"_id": 1})
+    if not user:
+        return
+    user_id = str(user["_id"])
+    db["queries"].delete_many({"user_id": user_id})
+    db["find_users"].delete_many({"user_id": user_id})
+    db["jobs"].delete_many({"owner": user_id})
+    db["users"].delete_one({"_id": user["_id"]})
+
+
+def server_db():
+    """The database a --mode http server uses, from the same MONGO_URI / MONGO_DB settings"""
+    import ssl
+    from pymongo import MongoClient
+
+    mongo = MongoClient(
+        os.environ["MONGO_URI"],
+        tls=True,
+        tlsCAFile=ssl.get_default_verify_paths().cafile
+    )
+    return mongo[os.environ["MONGO_DB"]]
+
+
+def run(fn, requests, concurrency):
+    def one(i):
+        started = time.perf_counter()
+        try:
+            ok = fn(i)
+        except Exception:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(ms for ms, _ in results)
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))], 1)
+    return {
+        "requests": requests,
+        "degraded": sum(1 for _, ok in results if not ok),
+        "throughput_rps": round(requests / elapsed, 2),
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99)
+    }
+
+
+if __name__ == "__main__":
+    # python -m utils.llm_loadtest [--mode app|http|utils] [--url http://localhost:8000 --write-to-server]
+    #     [--scenarios analysis,combined] [--requests 100] [--concurrency 16] [--live]
+    # Stub behaviour comes from LLM_STUB_LATENCY / LLM_STUB_ERROR_RATE; limits from the LLM_* settings.
+    # --mode app uses MONGO_DB (default soven_legal_loadtest); --mode http benchmarks a running server,
+    # which picks its own LLM_BACKEND. Either way the throwaway user and its data are deleted afterwards.
+    parser = argparse.ArgumentParser(description="Concurrent benchmark of the LLM-backed endpoints")
+    parser.add_argument("--mode", choices=["app", "http", "utils"], default="app")
+    parser.add_argument("--url", default="http://localhost:8000", help="server to drive with --mode http")
+    parser.add_argument("--scenarios", default=None)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--live", action="store_true", help="call Gemini instead of the stub")
+    parser.add_argument("--write-to-server", action="store_true",
+                        help="allow --mode http to create (and afterwards delete) a user on the server")
+    args = parser.parse_args()
+
+    if args.mode == "app":
+        # app connects on import; benchmark users and queries go to a database of their own
+        os.environ.setdefault("MONGO_DB", "soven_legal_loadtest")
+    if args.mode == "http" and not (args.write_to_server and os.getenv("MONGO_URI") and os.getenv("MONGO_DB")):
+        parser.error("--mode http writes to the server's database: pass --write-to-server and set "
+                     "MONGO_URI and MONGO_DB to that database so the run can clean up after itself")
+
+    report = {"mode": args.mode, "backend": llm_gateway.LLM_BACKEND, "concurrency": args.concurrency,
+              "scenarios": {}}
+    # The app and utils log to stdout; keep it clean for the JSON report
+    with redirect_stdout(sys.stderr):
+        email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        try:
+            if args.mode == "utils":
+                scenarios = UTIL_SCENARIOS
+            elif args.mode == "app":
+                report["database"] = os.environ["MONGO_DB"]
+                scenarios = app_scenarios(AppClient, email, args.requests, args.concurrency)
+            else:
+                report["backend"] = "server"
+                scenarios = app_scenarios(lambda: HttpClient(args.url), email, args.requests, args.concurrency)
+
+            for scenario in (args.scenarios or ",".join(scenarios)).split(","):
+                report["scenarios"][scenario] = run(scenarios[scenario], args.requests, args.concurrency)
+                print(f"{scenario}: {report['scenarios'][scenario]}")
+        finally:
+            if args.mode == "app":
+                from app import db
+                remove_user(db, email)
+            elif args.mode == "http":
+                remove_user(server_db(), email)
+
+    # In http mode these belong to the server; read them from its /api/metrics
+    if args.mode != "http":
+        report["limiter"] = llm_gateway.limiter.get_metrics()
+        report["resilience"] = llm_gateway.resilience.get_metrics()
+        report["streams"] = llm_gateway.stream_stats.get_metrics()
+        report["parsing"] = parse_stats.get_metrics()
+        report["tokens"] = llm_gateway.token_ledger.get_metrics()
+    if args.mode == "app":
+        from app import job_queue
+        report["job_queue"] = job_queue.get_metrics()
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,209 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dotenv import load_dotenv
+from utils.rate_limiter import RateLimitTimeout
+
+load_dotenv()
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_CAP = float(os.getenv("LLM_BACKOFF_CAP", "8"))
+# Send a duplicate request once the first has run longer than the recent p95
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Gemini is marked unhealthy; callers should use their fallback straight away"""
+
+
+def status_code(exc):
+    """HTTP status of a google-genai APIError (or anything shaped like one), else None"""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_backpressure(exc):
+    """Raised by our own limiter or breaker before the provider was reached"""
+    return isinstance(exc, (CircuitOpenError, RateLimitTimeout))
+
+
+def is_retryable(exc):
+    # Our own back-pressure says nothing about provider health
+    if is_backpressure(exc):
+        return False
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    # Transport failures (timeouts, dropped connections) carry no status code
+    name = type(exc).__name__
+    return isinstance(exc, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connect" in name
+
+
+class CircuitBreaker:
+    """
+    Opens after LLM_BREAKER_FAILURES consecutive provider failures and stays
+    open for LLM_BREAKER_COOLDOWN seconds. After that a single probe call is
+    let through; its outcome closes the circuit or opens it again.
+    """
+
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.metrics = {"opened": 0, "short_circuited": 0}
+
+    def before_call(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probe_in_flight):
+                self.metrics["short_circuited"] += 1
+                raise CircuitOpenError("Gemini circuit is open")
+            if self.state == HALF_OPEN:
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._probe_in_flight = False
+            self.state = CLOSED
+
+    def record_skipped(self):
+        """The call never reached the provider: free the probe, keep the state"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_error(self, exc):
+        """
+        Book a call that raised `exc`. Only a provider that answered, even
+        with a non-retryable HTTP error, counts as healthy; back-pressure and
+        local errors leave the failure count and state untouched.
+        """
+        if is_retryable(exc):
+            self.record_failure()
+        elif not is_backpressure(exc) and status_code(exc) is not None:
+            self.record_success()
+        else:
+            self.record_skipped()
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self._consecutive >= self.failures:
+                if self.state != OPEN:
+                    self.metrics["opened"] += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Circuit breaker, jittered exponential retries and optional hedging around one LLM call"""
+
+    def __init__(self, max_retries=LLM_MAX_RETRIES, hedge=LLM_HEDGE):
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.breaker = CircuitBreaker()
+        self._latencies = deque(maxlen=1000)
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.metrics = {"calls": 0, "retries": 0, "failures": 0, "hedges": 0, "hedge_wins": 0}
+
+    def backoff(self, attempt):
+        # "Full jitter": uniform over [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+    def call(self, fn):
+        """Run fn() under the breaker, retrying retryable failures"""
+        self.metrics["calls"] += 1
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                result = self._hedged(fn) if self.hedge else self._timed(fn)
+            except Exception as e:
+                self.breaker.record_error(e)
+                if not is_retryable(e):
+                    raise
+                if attempt >= self.max_retries:
+                    self.metrics["failures"] += 1
+                    raise
+                self.metrics["retries"] += 1
+                time.sleep(self.backoff(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    def _timed(self, fn):
+        started = time.perf_counter()
+        result = fn()
+        self._latencies.append(time.perf_counter() - started)
+        return result
+
+    def hedge_after(self):
+        """Seconds after which a duplicate is sent, or None while there are too few samples"""
+        if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * LLM_HEDGE_PERCENTILE))]
+
+    def _get_executor(self):
+        if self._executor is None or self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executor_pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _hedged(self, fn):
+        threshold = self.hedge_after()
+        if threshold is None:
+            return self._timed(fn)
+
+        executor = self._get_executor()
+        primary = executor.submit(self._timed, fn)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        self.metrics["hedges"] += 1
+        backup = executor.submit(self._timed, fn)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.metrics["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        metrics.update(self.breaker.metrics)
+        metrics["breaker_state"] = self.breaker.state
+        metrics["hedging"] = self.hedge
+        threshold = self.hedge_after()
+        metrics["hedge_after_ms"] = round(threshold * 1000, 1) if threshold is not None else None
+        return metrics
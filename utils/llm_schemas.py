@@ -0,0 +1,174 @@
+import json
+import time
+import threading
+from collections import defaultdict, deque
+
+# Response schemas in the OpenAPI subset Gemini accepts as `response_schema`.
+# The same dicts drive validate(), so what we ask for is exactly what we check.
+
+
+def _string(**extra):
+    return {"type": "STRING", **extra}
+
+
+def _array(items):
+    return {"type": "ARRAY", "items": items}
+
+
+def _object(properties, required=None):
+    return {"type": "OBJECT", "properties": properties, "required": list(properties) if required is None else required}
+
+
+QUERY_ANALYSIS = _object({
+    "status": _string(enum=["solvable", "hard", "irrelevant"]),
+    "message": _string()
+})
+
+DEADLINE = _object({
+    "task": _string(),
+    "due_date": _string(description="YYYY-MM-DD"),
+    "completed": {"type": "BOOLEAN"}
+}, required=["task", "due_date"])
+
+DEADLINES = _object({"deadlines": _array(DEADLINE)})
+
+DOCUMENT = _object({
+    "name": _string(),
+    "required_elements": _array(_string()),
+    "visual_reference": _object({
+        "document_type": _string(),
+        "layout_description": _string(),
+        "key_visual_features": _array(_string()),
+        "typical_sections": _array(_string())
+    }, required=[])
+}, required=["name"])
+
+DOCUMENTS = _object({"documents": _array(DOCUMENT)})
+
+COMBINED_ANALYSIS = _object({
+    "status": QUERY_ANALYSIS["properties"]["status"],
+    "message": _string(),
+    "deadlines": _array(DEADLINE),
+    "documents": _array(DOCUMENT)
+}, required=["status", "message"])
+
+CHAT_REPLY = _object({
+    "assistant_reply": _string(),
+    "negotiation_strategy": _string(),
+    "potential_savings": _string()
+}, required=["assistant_reply"])
+
+DOC_SCAN = _object({
+    "document_type_match": {"type": "BOOLEAN"},
+    "authenticity_score": {"type": "INTEGER"},
+    "required_elements_check": _object({
+        "all_present": {"type": "BOOLEAN"},
+        "missing_elements": _array(_string()),
+        "present_elements": _array(_string())
+    }, required=[]),
+    "visual_compliance": _object({
+        "matches_standard": {"type": "BOOLEAN"},
+        "compliance_issues": _array(_string())
+    }, required=[]),
+    "quality_assessment": _object({
+        "readability": _string(enum=["good", "fair", "poor"]),
+        "image_quality": _string(enum=["high", "medium", "low"]),
+        "potential_tampering": {"type": "BOOLEAN"}
+    }, required=[]),
+    "overall_validity": _string(enum=["valid", "invalid", "questionable"]),
+    "detailed_analysis": _string(),
+    "recommendations": _array(_string())
+}, required=["overall_validity", "detailed_analysis"])
+
+STRATEGY_VERIFICATION = _object({
+    "analysis": _string(),
+    "strengths": _array(_string()),
+    "weaknesses": _array(_string()),
+    "improvements": _array(_string()),
+    "suggested_deadlines": _array(DEADLINE)
+}, required=["analysis"])
+
+
+def explanations_schema(keys):
+    """ExplainSuccess answers with one string per similar-case key"""
+    return _object({key: _string() for key in keys}, required=[])
+
+
+class SchemaError(ValueError):
+    """The model's output is not valid JSON or does not match the requested schema"""
+
+
+_PYTHON_TYPES = {"OBJECT": dict, "ARRAY": list, "STRING": str, "BOOLEAN": bool, "INTEGER": int, "NUMBER": (int, float)}
+
+
+def validate(schema, value, path="$"):
+    """Check `value` against `schema`; returns it unchanged or raises SchemaError"""
+    kind = schema["type"]
+    if value is None:
+        if schema.get("nullable"):
+            return value
+        raise SchemaError(f"{path}: expected {kind}, got null")
+    # bool is an int subclass, so it has to be excluded from the numeric types explicitly
+    if not isinstance(value, _PYTHON_TYPES[kind]) or (kind in ("INTEGER", "NUMBER") and isinstance(value, bool)):
+        raise SchemaError(f"{path}: expected {kind}, got {type(value).__name__}")
+
+    if kind == "OBJECT":
+        properties = schema.get("properties", {})
+        for name in schema.get("required", ()):
+            if name not in value:
+                raise SchemaError(f"{path}: missing '{name}'")
+        for name, sub in properties.items():
+            if name in value:
+                validate(sub, value[name], f"{path}.{name}")
+    elif kind == "ARRAY":
+        for i, item in enumerate(value):
+            validate(schema["items"], item, f"{path}[{i}]")
+    elif "enum" in schema and value not in schema["enum"]:
+        raise SchemaError(f"{path}: {value!r} not in {schema['enum']}")
+    return value
+
+
+class ParseStats:
+    """Per-schema parse count, failure rate and parse time"""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._parses = defaultdict(int)
+        self._failures = defaultdict(int)
+        self._times = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, name, elapsed_ms, ok):
+        with self._lock:
+            self._parses[name] += 1
+            if not ok:
+                self._failures[name] += 1
+            self._times[name].append(elapsed_ms)
+
+    def get_metrics(self):
+        metrics = {}
+        with self._lock:
+            for name, count in self._parses.items():
+                times = sorted(self._times[name])
+                metrics[name] = {
+                    "parses": count,
+                    "failures": self._failures[name],
+                    "failure_rate": round(self._failures[name] / count, 4),
+                    "parse_p50_ms": round(times[len(times) // 2], 3),
+                    "parse_p99_ms": round(times[min(len(times) - 1, int(len(times) * 0.99))], 3)
+                }
+        return metrics
+
+
+parse_stats = ParseStats()
+
+
+def parse(schema, text, name="default"):
+    """json.loads + validate, timed and counted under `name`"""
+    started = time.perf_counter()
+    try:
+        value = validate(schema, json.loads(text))
+    except (ValueError, TypeError) as e:
+        parse_stats.record(name, (time.perf_counter() - started) * 1000, ok=False)
+        raise SchemaError(str(e)) from e
+    parse_stats.record(name, (time.perf_counter() - started) * 1000, ok=True)
+    return value
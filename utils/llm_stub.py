@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import random
+from datetime import date, timedelta
+from types import SimpleNamespace
+from dotenv import load_dotenv
+
+load_dotenv()
+# fixed:<ms> | uniform:<min_ms>,<max_ms> | lognormal:<median_ms>,<sigma>
+LLM_STUB_LATENCY = os.getenv("LLM_STUB_LATENCY", "lognormal:800,0.5")
+LLM_STUB_ERROR_RATE = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+# Share of stub errors that are 429s; the rest are 503s
+LLM_STUB_RATE_LIMIT_SHARE = float(os.getenv("LLM_STUB_RATE_LIMIT_SHARE", "0.5"))
+# Fraction of the total latency spent before the first streamed chunk
+LLM_STUB_TTFB_FRACTION = float(os.getenv("LLM_STUB_TTFB_FRACTION", "0.2"))
+
+
+class StubAPIError(Exception):
+    """Shaped like google.genai.errors.APIError so the resilience layer treats it the same"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def sample_latency(spec=LLM_STUB_LATENCY):
+    """Seconds for one call, drawn from the configured distribution"""
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if kind == "fixed":
+        return values[0] / 1000
+    if kind == "uniform":
+        return random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return random.lognormvariate(0, sigma) * median / 1000
+    raise ValueError(f"Unknown LLM_STUB_LATENCY '{spec}'")
+
+
+def _string_value(name, schema, index):
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+    if schema.get("description") == "YYYY-MM-DD" or name.endswith("date"):
+        return (date.today() + timedelta(days=14 * (index + 1))).isoformat()
+    return f"Stub {name.replace('_', ' ')} {index + 1}"
+
+
+def instance(schema, name="value", index=0):
+    """A deterministic value that satisfies `schema` (the llm_schemas subset)"""
+    kind = schema["type"]
+    if kind == "OBJECT":
+        return {key: instance(sub, key, index) for key, sub in schema.get("properties", {}).items()}
+    if kind == "ARRAY":
+        return [instance(schema["items"], name.rstrip("s"), i) for i in range(3)]
+    if kind == "STRING":
+        return _string_value(name, schema, index)
+    if kind == "INTEGER":
+        return 80
+    if kind == "NUMBER":
+        return 0.8
+    if kind == "BOOLEAN":
+        # Plausible defaults: fresh deadlines are open, scanned documents untampered
+        return name not in ("completed", "potential_tampering")
+    return None
+
+
+def _prompt_text(contents):
+    return " ".join(part for part in contents if isinstance(part, str))
+
+
+def canned_text(contents):
+    """Plain-text reply: an HTML page for reference prompts, a short message otherwise"""
+    prompt = _prompt_text(contents)
+    if "HTML" in prompt:
+        sections = "".join(f"<section><h2>Section {i}</h2><p>{'Sample field. ' * 40}</p></section>" for i in range(1, 8))
+        return f"<!DOCTYPE html>\n<html><head><title>Stub reference</title></head><body>{sections}</body></html>"
+    return "Thank you for the update. Given the preparation I have already completed, could we discuss the next steps and a fee that reflects it?"
+
+
+class _StubModels:
+    def __init__(self, latency=LLM_STUB_LATENCY, error_rate=LLM_STUB_ERROR_RATE):
+        self.latency = latency
+        self.error_rate = error_rate
+
+    def _maybe_fail(self):
+        if random.random() < self.error_rate:
+            if random.random() < LLM_STUB_RATE_LIMIT_SHARE:
+                raise StubAPIError(429, "RESOURCE_EXHAUSTED (stub)")
+            raise StubAPIError(503, "UNAVAILABLE (stub)")
+
+    def _reply(self, contents, config):
+        schema = (config or {}).get("response_schema")
+        if schema is not None:
+            return json.dumps(instance(schema))
+        return canned_text(contents if isinstance(contents, list) else [contents])
+
+    def generate_content(self, model, contents, config=None):
+        delay = sample_latency(self.latency)
+        time.sleep(delay)
+        self._maybe_fail()
+        return SimpleNamespace(text=self._reply(contents, config))
+
+    def generate_content_stream(self, model, contents, config=None):
+        delay = sample_latency(self.latency)
+        time.sleep(delay * LLM_STUB_TTFB_FRACTION)
+        self._maybe_fail()
+        text = self._reply(contents, config)
+        chunks = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+        for chunk in chunks:
+            yield SimpleNamespace(text=chunk)
+            time.sleep(delay * (1 - LLM_STUB_TTFB_FRACTION) / len(chunks))
+
+
+class StubClient:
+    """
+    Offline stand-in for genai.Client. It exposes the same
+    models.generate_content / generate_content_stream surface that
+    llm_gateway uses, with schema-valid replies, sampled latency and
+    injected 429/503 errors.
+    """
+
+    def __init__(self, **kwargs):
+        self.models = _StubModels(**kwargs)
+
+
+def stub_part(data, mime_type):
+    """image_part stand-in that keeps the inline_data shape prompt_key fingerprints"""
+    return SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type=mime_type), text=None)
@@ -0,0 +1,100 @@
+import os
+import json
+import mmap
+from collections.abc import Mapping
+import numpy as np
+
+DOCSTORE_FILE = "docstore.jsonl"
+OFFSETS_FILE = "docstore.offsets.npy"
+
+
+def write_docstore(directory, vectorstore):
+    """
+    Write a LangChain FAISS store's documents as JSON lines in index
+    position order, plus a uint64 array of line offsets. Row i of the file
+    is the document for vector i, so no id mapping has to be loaded.
+    """
+    offsets = [0]
+    with open(os.path.join(directory, DOCSTORE_FILE), "wb") as f:
+        for position in range(vectorstore.index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(doc_id)
+            # Store the id in the metadata too, so every reader sees the same doc_id
+            metadata = {**doc.metadata, "doc_id": doc.metadata.get("doc_id") or doc_id}
+            line = json.dumps(
+                {"id": doc_id, "page_content": doc.page_content, "metadata": metadata},
+                separators=(",", ":")
+            ).encode("utf-8") + b"\n"
+            f.write(line)
+            offsets.append(offsets[-1] + len(line))
+    np.save(os.path.join(directory, OFFSETS_FILE), np.asarray(offsets, dtype=np.uint64))
+
+
+def has_docstore(directory):
+    return os.path.exists(os.path.join(directory, DOCSTORE_FILE))
+
+
+class RowIds(Mapping):
+    """index_to_docstore_id for an mmap docstore: vector i maps to row i"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, position):
+        # FAISS hands back numpy integers; docstore keys are plain ints
+        position = int(position)
+        if not 0 <= position < self.size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self.size))
+
+    def __len__(self):
+        return self.size
+
+
+class MmapDocstore:
+    """
+    Read-only docstore over docstore.jsonl. The file and its offsets are
+    memory-mapped, so every worker shares the same page-cache copy and
+    opening it costs the same regardless of corpus size.
+    """
+
+    def __init__(self, directory):
+        from langchain.schema import Document
+
+        self._document_class = Document
+        self._file = open(os.path.join(directory, DOCSTORE_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _row(self, position):
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        return json.loads(self._data[start:end])
+
+    def search(self, position):
+        if not isinstance(position, int) or not 0 <= position < len(self):
+            return f"ID {position} not found."
+        row = self._row(position)
+        metadata = row["metadata"]
+        metadata.setdefault("doc_id", row["id"])
+        return self._document_class(page_content=row["page_content"], metadata=metadata)
+
+    def rows(self):
+        """Yield (docstore id, Document) for every row, for building a writable copy"""
+        for position in range(len(self)):
+            row = self._row(position)
+            metadata = row["metadata"]
+            metadata.setdefault("doc_id", row["id"])
+            yield row["id"], self._document_class(page_content=row["page_content"], metadata=metadata)
+
+    def add(self, texts):
+        raise TypeError("MmapDocstore is read-only; load the index with writable=True")
+
+    def delete(self, ids):
+        raise TypeError("MmapDocstore is read-only; load the index with writable=True")
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+from dotenv import load_dotenv
+from utils.token_accounting import estimate_tokens, CHARS_PER_TOKEN
+
+load_dotenv()
+# Token budgets for the variable-size parts of each prompt
+QUERY_TOKEN_BUDGET = int(os.getenv("QUERY_TOKEN_BUDGET", "1000"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+REFERENCE_TOKEN_BUDGET = int(os.getenv("REFERENCE_TOKEN_BUDGET", "800"))
+CASES_TOKEN_BUDGET = int(os.getenv("CASES_TOKEN_BUDGET", "2000"))
+
+TRUNCATION_MARK = " [...]"
+
+
+def fit_text(text, max_tokens):
+    """Cut `text` to roughly `max_tokens`, on a word boundary where possible"""
+    text = text or ""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = int(max_tokens * CHARS_PER_TOKEN)
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit * 0.8:
+        cut = cut[:space]
+    return cut + TRUNCATION_MARK
+
+
+def _longest_list(value):
+    """The longest list anywhere in a JSON value, or None"""
+    best = None
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            if len(item) > 1 and (best is None or len(item) > len(best)):
+                best = item
+            stack.extend(item)
+    return best
+
+
+def compact_json(value, max_tokens=None):
+    """
+    json.dumps without indentation or spaces. Over budget, the longest list
+    is halved (its tail dropped) until the result fits; if no list is left
+    to shrink, the text is cut.
+    """
+    text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    if max_tokens is None or estimate_tokens(text) <= max_tokens:
+        return text
+
+    value = json.loads(text)
+    while estimate_tokens(text) > max_tokens:
+        longest = _longest_list(value)
+        if longest is None:
+            return fit_text(text, max_tokens)
+        del longest[(len(longest) + 1) // 2:]
+        text = json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return text
+
+
+_TURN_START = re.compile(r"^(User|Lawyer):", re.MULTILINE)
+
+
+def trim_turns(chat_text, max_tokens):
+    """
+    Keep the newest "User: ..." / "Lawyer: ..." turns that fit in
+    `max_tokens`, dropping the oldest first. The newest turn is always kept,
+    cut down itself if it alone is over budget.
+    """
+    chat_text = (chat_text or "").strip()
+    if estimate_tokens(chat_text) <= max_tokens:
+        return chat_text
+
+    starts = [m.start() for m in _TURN_START.finditer(chat_text)] or [0]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    turns = [chat_text[a:b].strip() for a, b in zip(starts, starts[1:] + [len(chat_text)])]
+
+    kept = []
+    used = 0
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn)
+        if kept and used + cost > max_tokens:
+            break
+        kept.append(turn if cost <= max_tokens else fit_text(turn, max_tokens))
+        used += cost
+    dropped = len(turns) - len(kept)
+    note = [f"[{dropped} earlier messages omitted]"] if dropped else []
+    return "\n".join(note + kept[::-1])
+
+
+def _normalise(text):
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def dedup_chunks(chunks, max_tokens, text=lambda chunk: chunk):
+    """
+    Drop chunks whose normalised text repeats an earlier one, then keep
+    chunks in order until `max_tokens` is used. `text` extracts the prompt
+    text of a chunk, so dicts and Documents work as well as strings.
+    """
+    kept = []
+    seen = set()
+    used = 0
+    for chunk in chunks:
+        body = text(chunk)
+        key = _normalise(body)
+        if key in seen:
+            continue
+        cost = estimate_tokens(body)
+        if kept and used + cost > max_tokens:
+            break
+        seen.add(key)
+        kept.append(chunk)
+        used += cost
+    return kept
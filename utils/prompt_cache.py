@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+PROMPT_CACHE_MEMORY_ENTRIES = int(os.getenv("PROMPT_CACHE_MEMORY_ENTRIES", "512"))
+PROMPT_CACHE_TTL = int(os.getenv("PROMPT_CACHE_TTL", str(7 * 24 * 3600)))
+PROMPT_CACHE_MAX_DOCS = int(os.getenv("PROMPT_CACHE_MAX_DOCS", "20000"))
+# How many writes between size checks on the Mongo tier
+PROMPT_CACHE_EVICT_EVERY = int(os.getenv("PROMPT_CACHE_EVICT_EVERY", "100"))
+
+
+def _content_fingerprint(part):
+    if isinstance(part, str):
+        return part
+    inline = getattr(part, "inline_data", None)
+    if inline is not None and inline.data is not None:
+        return {"mime_type": inline.mime_type, "sha256": hashlib.sha256(inline.data).hexdigest()}
+    if getattr(part, "text", None) is not None:
+        return part.text
+    return repr(part)
+
+
+def prompt_key(model, contents, config=None):
+    """Content address of a call: sha256 over (model, prompt parts, generation config)"""
+    payload = json.dumps(
+        {"model": model, "contents": [_content_fingerprint(p) for p in contents], "config": config or {}},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Two-tier cache of LLM responses for deterministic prompts.
+
+    The in-memory tier is a per-process LRU. The optional Mongo tier is
+    shared by every worker. Its documents expire through a TTL index on
+    created_at, and the collection is trimmed to `max_docs` least recently
+    used entries.
+    """
+
+    def __init__(self, collection=None, memory_entries=PROMPT_CACHE_MEMORY_ENTRIES,
+                 ttl=PROMPT_CACHE_TTL, max_docs=PROMPT_CACHE_MAX_DOCS):
+        self.collection = collection
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_docs = max_docs
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.metrics = {"memory_hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+        if self.collection is not None:
+            try:
+                self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+                self.collection.create_index("last_used_at")
+            except Exception as e:
+                print(f"Prompt cache index setup failed: {str(e)}")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.metrics["memory_hits"] += 1
+                return self._memory[key]
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one_and_update(
+                    {"_id": key},
+                    {"$set": {"last_used_at": datetime.utcnow()}, "$inc": {"hits": 1}},
+                    projection={"response": 1}
+                )
+                if doc is not None:
+                    self.metrics["mongo_hits"] += 1
+                    self._remember(key, doc["response"])
+                    return doc["response"]
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"Prompt cache read failed: {str(e)}")
+
+        self.metrics["misses"] += 1
+        return None
+
+    def put(self, key, value, model=None):
+        self._remember(key, value)
+        self.metrics["stores"] += 1
+        if self.collection is None:
+            return
+
+        try:
+            now = datetime.utcnow()
+            self.collection.update_one(
+                {"_id": key},
+                {"$set": {"response": value, "model": model, "created_at": now, "last_used_at": now},
+                 "$setOnInsert": {"hits": 0}},
+                upsert=True
+            )
+            self._writes += 1
+            if self._writes % PROMPT_CACHE_EVICT_EVERY == 0:
+                self._evict()
+        except Exception as e:
+            self.metrics["errors"] += 1
+            print(f"Prompt cache write failed: {str(e)}")
+
+    def _evict(self):
+        excess = self.collection.estimated_document_count() - self.max_docs
+        if excess <= 0:
+            return
+        stale = [doc["_id"] for doc in self.collection.find({}, {"_id": 1}).sort("last_used_at", 1).limit(excess)]
+        self.collection.delete_many({"_id": {"$in": stale}})
+        self.metrics["evictions"] += len(stale)
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        hits = metrics["memory_hits"] + metrics["mongo_hits"]
+        lookups = hits + metrics["misses"]
+        metrics["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        metrics["memory_entries"] = len(self._memory)
+        metrics["persistent"] = self.collection is not None
+        return metrics
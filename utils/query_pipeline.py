@@ -0,0 +1,187 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+from utils.llm_gateway import generate_json
+from utils.llm_schemas import COMBINED_ANALYSIS, SchemaError
+from utils.query_analysis import Query_Analysis
+from utils.generate_deadlines import GenerateDeadlines, clean_deadlines
+from utils.generate_req_docs import Generate_Documents
+from utils.prompt_budget import fit_text, QUERY_TOKEN_BUDGET
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+# combined: one prompt for all three sections; parallel: the three dedicated prompts side by side
+QUERY_PIPELINE_MODE = os.getenv("QUERY_PIPELINE_MODE", "combined")
+QUERY_PIPELINE_WORKERS = int(os.getenv("QUERY_PIPELINE_WORKERS", "6"))
+
+ANALYSIS_STATUSES = {"solvable", "hard", "irrelevant"}
+
+# How often each section had to be regenerated by its dedicated prompt
+pipeline_metrics = {"runs": 0, "analysis_fallbacks": 0, "deadlines_fallbacks": 0, "documents_fallbacks": 0}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Shared by every pipeline run in this process, so concurrent LLM calls stay bounded
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=QUERY_PIPELINE_WORKERS, thread_name_prefix="pipeline")
+                _executor_pid = os.getpid()
+    return _executor
+
+
+SECTION_CALLS = {
+    "analysis": lambda query_text: Query_Analysis(query_text).call_api(),
+    "deadlines": lambda query_text: GenerateDeadlines(query_text).call_api(),
+    "documents": lambda query_text: Generate_Documents(query_text).call_api()
+}
+
+
+def run_sections(query_text, sections, status=None):
+    """
+    Run the dedicated prompts for `sections` concurrently; latency is the
+    slowest, not the sum. Each reply is validated like the combined one, so
+    the error dicts the prompts fall back to come back as None. `status` is
+    the analysis status when it is already known.
+    """
+    futures = {name: _get_executor().submit(SECTION_CALLS[name], query_text) for name in sections}
+    replies = {name: future.result() for name, future in futures.items()}
+
+    results = {}
+    if "analysis" in replies:
+        results["analysis"] = valid_analysis(replies["analysis"])
+        status = (results["analysis"] or {}).get("status", status)
+    if "deadlines" in replies:
+        results["deadlines"] = valid_deadlines(replies["deadlines"], status)
+    if "documents" in replies:
+        results["documents"] = valid_documents(replies["documents"], status)
+    return results
+
+
+class CombinedAnalysis:
+    """One Gemini call that returns the analysis, deadlines and documents for a query"""
+
+    def __init__(self, query, api_key=GEMINI_API_KEY):
+        self.query = query
+        self.api_key = api_key
+        self.system_prompt = """
+You are an expert virtual legal advocate assistant for Indian law.
+For the user's legal query, return ONLY one valid JSON object with three sections:
+
+{
+  "status": "solvable" | "hard" | "irrelevant",
+  "message": "string",
+  "deadlines": [
+    {"task": "string", "due_date": "YYYY-MM-DD", "completed": false}
+  ],
+  "documents": [
+    {
+      "name": "Document Name",
+      "required_elements": ["Element 1", "Element 2"],
+      "visual_reference": {
+        "document_type": "ID Card/Certificate/Form",
+        "layout_description": "string",
+        "key_visual_features": ["Feature 1"],
+        "typical_sections": ["Section 1", "Reference_Link"]
+      }
+    }
+  ]
+}
+
+Rules:
+- status/message: "solvable" if the query is clear and legally solvable, "hard" if solvable but
+  complex (suggest exploring similar users in the Find Users tab), "irrelevant" if it is not a
+  legal issue. Do NOT give legal explanations in the message.
+- deadlines: 3-5 realistic future deadlines relevant to the query; empty list if irrelevant.
+- documents: the documents needed to pursue the query, with the elements each must contain and
+  how an authentic one looks, including a reference link in typical_sections; empty list if irrelevant.
+- Return ONLY the JSON object, no other text.
+"""
+
+    def call_api(self):
+        try:
+            full_prompt = f"{self.system_prompt}\n\nUser Query: {fit_text(self.query, QUERY_TOKEN_BUDGET)}"
+            try:
+                return generate_json(full_prompt, COMBINED_ANALYSIS, "combined_analysis",
+                                     config={"temperature": 0.3}, api_key=self.api_key, cache=True)
+            except SchemaError:
+                return {}
+
+        except Exception as e:
+            print(f"CombinedAnalysis failed: {str(e)}")
+            return {}
+
+
+def valid_analysis(data):
+    if data.get("status") in ANALYSIS_STATUSES and data.get("message"):
+        return {"status": data["status"], "message": data["message"]}
+    return None
+
+
+def valid_deadlines(data, status=None):
+    deadlines = data.get("deadlines")
+    if not isinstance(deadlines, list):
+        return None
+    deadlines = clean_deadlines(deadlines)
+    # An irrelevant query legitimately has none; anything else needs at least one
+    return deadlines if deadlines or status == "irrelevant" else None
+
+
+def valid_documents(data, status=None):
+    documents = data.get("documents")
+    if not isinstance(documents, list):
+        return None
+    documents = [doc for doc in documents if isinstance(doc, dict) and doc.get("name")]
+    return documents if documents or status == "irrelevant" else None
+
+
+def analyse_fully(query_text):
+    """
+    Analysis, deadlines and documents for a query from a single LLM call.
+    Each section is validated on its own, and only the sections that fail
+    are regenerated, concurrently, with their dedicated prompts. Returns
+    {"analysis", "deadlines", "documents", "sources"}; sources records
+    whether each section came from the combined call or a fallback. A
+    section whose fallback also fails validation is None and its source
+    is "failed".
+    """
+    combined = CombinedAnalysis(query_text).call_api()
+    pipeline_metrics["runs"] += 1
+
+    results = {"analysis": valid_analysis(combined)}
+    status = (results["analysis"] or {}).get("status")
+    results["deadlines"] = valid_deadlines(combined, status)
+    results["documents"] = valid_documents(combined, status)
+
+    failed = [name for name, value in results.items() if value is None]
+    results.update(run_sections(query_text, failed, status))
+    for name in failed:
+        pipeline_metrics[f"{name}_fallbacks"] += 1
+
+    sources = {name: "fallback" if name in failed else "combined" for name in SECTION_CALLS}
+    return {**results, "sources": _mark_failed(results, sources)}
+
+
+def _mark_failed(results, sources):
+    return {name: "failed" if results[name] is None else source for name, source in sources.items()}
+
+
+def analyse_in_parallel(query_text):
+    """
+    The three dedicated prompts run concurrently; same return shape as
+    analyse_fully, with "failed" as the source of any invalid section
+    """
+    pipeline_metrics["runs"] += 1
+    results = run_sections(query_text, list(SECTION_CALLS))
+    return {**results, "sources": _mark_failed(results, {name: "separate" for name in SECTION_CALLS})}
+
+
+def analyse_query(query_text, mode=QUERY_PIPELINE_MODE):
+    return analyse_in_parallel(query_text) if mode == "parallel" else analyse_fully(query_text)
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+LLM_RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "4"))
+LLM_BURST = float(os.getenv("LLM_BURST", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Capacity only interactive calls may use, so a batch backlog cannot starve chat assist
+LLM_INTERACTIVE_RESERVED = int(os.getenv("LLM_INTERACTIVE_RESERVED", "2"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+LLM_LIMITER_DIR = os.getenv("LLM_LIMITER_DIR", os.path.join(tempfile.gettempdir(), "legal_ease_llm_limiter"))
+
+INTERACTIVE, BATCH = "interactive", "batch"
+POLL_INTERVAL = 0.02
+
+
+class RateLimitTimeout(Exception):
+    """No Gemini capacity became free within the queue timeout"""
+
+
+class LLMRateLimiter:
+    """
+    Token bucket plus concurrency cap per API key, shared by every gunicorn
+    worker on the host through files in LLM_LIMITER_DIR.
+
+    The bucket state lives in a small JSON file updated under flock. Each
+    concurrency slot is its own lock file, held with a non-blocking flock for
+    the duration of the call, so a slot is released by the kernel if its
+    process dies. Interactive calls may use the last LLM_INTERACTIVE_RESERVED
+    slots and bucket tokens; batch calls may not.
+    """
+
+    def __init__(self, directory=LLM_LIMITER_DIR, rate=LLM_RATE_PER_SECOND, burst=LLM_BURST,
+                 max_concurrency=LLM_MAX_CONCURRENCY, reserved=LLM_INTERACTIVE_RESERVED,
+                 timeout=LLM_QUEUE_TIMEOUT):
+        self.directory = directory
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.reserved = min(reserved, max_concurrency - 1)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._waits = defaultdict(lambda: deque(maxlen=1000))
+        self.metrics = {"acquired": 0, "timeouts": 0, "in_flight": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _key_dir(self, api_key):
+        path = os.path.join(self.directory, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16])
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _take_token(self, key_dir, priority):
+        """Take one token if the caller's lane allows it; otherwise return seconds until one is due"""
+        floor = 0.0 if priority == INTERACTIVE else min(self.reserved, self.burst - 1)
+        with open(os.path.join(key_dir, "bucket.json"), "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+
+            now = time.time()
+            tokens = min(self.burst, state.get("tokens", self.burst) + (now - state.get("updated", now)) * self.rate)
+            wait = 0.0
+            if tokens - 1 >= floor:
+                tokens -= 1
+            else:
+                wait = (floor + 1 - tokens) / self.rate
+
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({"tokens": tokens, "updated": now}))
+            return wait
+
+    def _take_slot(self, key_dir, priority):
+        usable = self.max_concurrency if priority == INTERACTIVE else self.max_concurrency - self.reserved
+        for i in range(usable):
+            f = open(os.path.join(key_dir, f"slot-{i}.lock"), "a")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return f
+            except BlockingIOError:
+                f.close()
+        return None
+
+    @contextmanager
+    def acquire(self, api_key=None, priority=BATCH):
+        """Block until the call may go out, then hold a concurrency slot for its duration"""
+        key_dir = self._key_dir(api_key)
+        started = time.perf_counter()
+        deadline = started + self.timeout
+
+        slot = None
+        while slot is None:
+            slot = self._take_slot(key_dir, priority)
+            if slot is None:
+                self._wait_or_fail(priority, started, deadline, POLL_INTERVAL)
+
+        try:
+            while True:
+                wait = self._take_token(key_dir, priority)
+                if not wait:
+                    break
+                self._wait_or_fail(priority, started, deadline, min(wait, 0.25))
+
+            waited_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self._waits[priority].append(waited_ms)
+                self.metrics["acquired"] += 1
+                self.metrics["in_flight"] += 1
+            try:
+                yield waited_ms
+            finally:
+                with self._lock:
+                    self.metrics["in_flight"] -= 1
+        finally:
+            fcntl.flock(slot, fcntl.LOCK_UN)
+            slot.close()
+
+    def _wait_or_fail(self, priority, started, deadline, pause):
+        if time.perf_counter() + pause > deadline:
+            with self._lock:
+                self.metrics["timeouts"] += 1
+                self._waits[priority].append((time.perf_counter() - started) * 1000)
+            raise RateLimitTimeout(f"Waited {self.timeout}s for Gemini capacity ({priority})")
+        time.sleep(pause)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            for priority, waits in self._waits.items():
+                waits = sorted(waits)
+                metrics[f"{priority}_queue_wait_p50_ms"] = round(waits[len(waits) // 2], 2)
+                metrics[f"{priority}_queue_wait_p99_ms"] = round(waits[min(len(waits) - 1, int(len(waits) * 0.99))], 2)
+        metrics.update({
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "max_concurrency": self.max_concurrency,
+            "interactive_reserved": self.reserved
+        })
+        return metrics
@@ -0,0 +1,76 @@
+# Named projections for the collections that hold uploaded files. Routes ask
+# for a view ("list", "status", ...) instead of writing their own projection,
+# so a listing can never drag file payloads over the wire by accident.
+
+# Fields that carry file bytes (inline base64 on records stored before the blob store)
+PAYLOAD_FIELDS = {
+    "documents": ("base64_format",),
+    "case_files": ("base64_data",)
+}
+
+# Only these views may return payload fields
+PAYLOAD_VIEWS = ("payload",)
+
+VIEWS = {
+    "documents": {
+        # documents.html and the lawyer case page
+        "list": {"name": 1, "user_id": 1, "uploaded_at": 1, "scan_status": 1, "scan_result": 1},
+        # /user/<id>/document_status
+        "status": {"name": 1, "uploaded_at": 1, "scan_status": 1, "scan_result": 1},
+        # progress counters only look at whether a scan finished
+        "progress": {"scan_status": 1},
+        "owner": {"user_id": 1},
+        # the scan job: metadata plus whichever payload the record has
+        "payload": {"user_id": 1, "name": 1, "doc_type": 1, "query": 1, "blob_key": 1, "base64_format": 1}
+    },
+    "case_files": {
+        "list": {"file_name": 1, "original_name": 1, "file_type": 1, "file_size": 1, "mime_type": 1,
+                 "file_category": 1, "description": 1, "uploaded_at": 1, "status": 1},
+        "detail": {"base64_data": 0},
+        "payload": {"blob_key": 1, "base64_data": 1}
+    }
+}
+
+
+def check_views(collection, views):
+    """
+    Reject, at definition time, any non-payload view that could return a
+    payload field: an inclusion projection naming one, or an exclusion
+    projection that does not exclude them all.
+    """
+    payload = PAYLOAD_FIELDS.get(collection, ())
+    for name, projection in views.items():
+        if name in PAYLOAD_VIEWS:
+            continue
+        values = {value for field, value in projection.items() if field != "_id"}
+        if not values or values <= {0, False}:
+            # Empty or exclusion-only: everything not excluded comes back
+            leaked = [field for field in payload if projection.get(field) not in (0, False)]
+        else:
+            leaked = [field for field in payload if projection.get(field)]
+        if leaked:
+            raise ValueError(f"{collection}.{name} view would return payload field(s) {leaked}")
+
+
+class Records:
+    """find/find_one on a collection restricted to one of its named views"""
+
+    def __init__(self, collection, views=None):
+        self.collection = collection
+        self.views = VIEWS[collection.name] if views is None else views
+        check_views(collection.name, self.views)
+
+    def _projection(self, view):
+        if view not in self.views:
+            raise KeyError(f"No '{view}' view for {self.collection.name}")
+        return self.views[view]
+
+    def find(self, query, view):
+        return self.collection.find(query, self._projection(view))
+
+    def find_one(self, query, view):
+        return self.collection.find_one(query, self._projection(view))
+
+
+for _collection, _views in VIEWS.items():
+    check_views(_collection, _views)
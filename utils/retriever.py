@@ -0,0 +1,254 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils.index_store import IndexStore, IndexHandle, FAISS_INDEX_PATH
+from utils.lexical_index import HYBRID_SEARCH, HYBRID_LATENCY_BUDGET_MS, reciprocal_rank_fusion
+
+load_dotenv()
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+RETRIEVER_TOP_K = int(os.getenv("RETRIEVER_TOP_K", "6"))
+# Candidates taken from each of the vector and BM25 rankings before fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "30"))
+
+
+def resident_memory_bytes():
+    """Return the current resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak RSS (KB on Linux, bytes on macOS)
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class FindUsersRetriever:
+    """
+    Long-lived retriever behind /find_users.
+
+    The embedding model and the FAISS index are loaded once per worker
+    process and shared by every request handled by that worker. When a new
+    index version is published to the IndexStore it is loaded in the
+    background and swapped in; queries already running keep the old version
+    until they finish.
+    """
+
+    def __init__(self, index_path=FAISS_INDEX_PATH, model_name=EMBEDDING_MODEL_NAME, k=RETRIEVER_TOP_K, hybrid=HYBRID_SEARCH):
+        self.store = IndexStore(index_path)
+        self.model_name = model_name
+        self.k = k
+        self.hybrid = hybrid
+        self._latencies = deque(maxlen=1000)
+        self.embedding_model = None
+        self._live = None
+        self._marker = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self.metrics = {
+            "loaded": False,
+            "index_version": None,
+            "model_load_seconds": None,
+            "index_load_seconds": None,
+            "rss_before_load_bytes": None,
+            "rss_after_load_bytes": None,
+            "index_swaps": 0,
+            "searches": 0,
+            "last_search_ms": None,
+            "over_budget_searches": 0
+        }
+
+    def _ensure_loaded(self):
+        if self._live is not None:
+            return
+
+        with self._lock:
+            if self._live is not None:
+                return
+
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+
+            self.metrics["rss_before_load_bytes"] = resident_memory_bytes()
+
+            started = time.perf_counter()
+            embedding_model = HuggingFaceEmbeddings(model_name=self.model_name)
+            self.metrics["model_load_seconds"] = round(time.perf_counter() - started, 3)
+
+            self._marker = self.store.current_marker()
+            started = time.perf_counter()
+            version, vectorstore = self.store.load(embedding_model)
+            self.metrics["index_load_seconds"] = round(time.perf_counter() - started, 3)
+
+            self.embedding_model = embedding_model
+            lexical = self.store.load_lexical(vectorstore, version) if self.hybrid else None
+            self._live = IndexHandle(version, vectorstore, self.store.load_tombstones(version), lexical)
+            self.metrics["index_version"] = version
+            self.metrics["rss_after_load_bytes"] = resident_memory_bytes()
+            self.metrics["loaded"] = True
+            print(f"Retriever loaded index {version}: model {self.metrics['model_load_seconds']}s, index {self.metrics['index_load_seconds']}s")
+
+    def reload(self, force=False):
+        """
+        Load the live version from the store and swap it in if it changed.
+        Returns the version now being served.
+        """
+        self._ensure_loaded()
+        with self._reload_lock:
+            marker = self.store.current_marker()
+            version = self.store.current_version()
+            if not force and version == self._live.version:
+                self._marker = marker
+                return version
+
+            started = time.perf_counter()
+            version, vectorstore = self.store.load(self.embedding_model, version)
+            tombstones = self.store.load_tombstones(version)
+            lexical = self.store.load_lexical(vectorstore, version) if self.hybrid else None
+            load_seconds = round(time.perf_counter() - started, 3)
+
+            with self._lock:
+                old = self._live
+                self._live = IndexHandle(version, vectorstore, tombstones, lexical)
+                self._marker = marker
+            old.retire()
+
+            self.metrics["index_version"] = version
+            self.metrics["index_load_seconds"] = load_seconds
+            self.metrics["index_swaps"] += 1
+            print(f"Swapped FAISS index {old.version} -> {version} in {load_seconds}s")
+            return version
+
+    def start_watcher(self, interval=INDEX_RELOAD_INTERVAL):
+        """Poll the store for newly published versions in a daemon thread"""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.store.current_marker() != self._marker:
+                        self.reload()
+                except Exception as e:
+                    print(f"Index reload failed: {str(e)}")
+
+        self._watcher = threading.Thread(target=watch, name="index-watcher", daemon=True)
+        self._watcher.start()
+
+    @contextmanager
+    def acquire(self):
+        """Pin the live index version for the duration of a query"""
+        self._ensure_loaded()
+        with self._lock:
+            handle = self._live.acquire()
+        try:
+            yield handle
+        finally:
+            handle.release()
+
+    def warm_up(self):
+        """Load the model and index, run one throwaway search and start watching for new versions"""
+        self.search("warm up", k=1)
+        self.start_watcher()
+        return self.get_metrics()
+
+    def embed_query(self, query_text):
+        self._ensure_loaded()
+        return self.embedding_model.embed_query(query_text)
+
+    def search(self, query_text, k=None, embedding=None):
+        """
+        Return the k most similar documents for the query text. Pass the
+        query embedding if the caller already has it to skip re-embedding.
+
+        With hybrid search on, vector and BM25 candidates are merged with
+        reciprocal-rank fusion, so exact terms like "Order XXXIX" or
+        "Section 138" are not lost to embedding similarity.
+        """
+        k = k or self.k
+        if embedding is None:
+            embedding = self.embed_query(query_text)
+        with self.acquire() as handle:
+            started = time.perf_counter()
+            # Over-fetch so deleted cases can be dropped without coming up short
+            fetch = k + len(handle.tombstones)
+            if handle.lexical is not None:
+                fetch = max(fetch, HYBRID_CANDIDATES + len(handle.tombstones))
+            if handle.lexical is not None:
+                docs = [doc for doc, _ in self._fuse(handle, query_text, embedding, fetch)]
+            else:
+                docs = handle.vectorstore.similarity_search_by_vector(embedding, k=fetch)
+            if handle.tombstones:
+                docs = [d for d in docs if d.metadata.get("doc_id") not in handle.tombstones]
+            docs = docs[:k]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self._record_latency(elapsed_ms)
+        return docs
+
+    @staticmethod
+    def _vector_positions(vectorstore, embedding, fetch):
+        """FAISS positions of the nearest vectors, best first"""
+        import numpy as np
+
+        query = np.asarray([embedding], dtype=np.float32)
+        if getattr(vectorstore, "_normalize_L2", False):
+            import faiss
+            faiss.normalize_L2(query)
+        _, positions = vectorstore.index.search(query, fetch)
+        return [int(p) for p in positions[0] if p >= 0]
+
+    def _fuse(self, handle, query_text, embedding, fetch):
+        """
+        (Document, fused score) pairs, best first. Both rankings are keyed by
+        FAISS position, which is also the docstore row and the BM25 position,
+        so a document found by both retrievers is merged, whatever its
+        metadata holds.
+        """
+        vectorstore = handle.vectorstore
+        vector_positions = self._vector_positions(vectorstore, embedding, fetch)
+        lexical_positions = [position for position, _ in handle.lexical.search(query_text, fetch)]
+        return [
+            (vectorstore.docstore.search(vectorstore.index_to_docstore_id[position]), score)
+            for position, score in reciprocal_rank_fusion([vector_positions, lexical_positions])
+        ]
+
+    def _record_latency(self, elapsed_ms):
+        self._latencies.append(elapsed_ms)
+        self.metrics["last_search_ms"] = round(elapsed_ms, 2)
+        self.metrics["searches"] += 1
+        if self.hybrid and elapsed_ms > HYBRID_LATENCY_BUDGET_MS:
+            self.metrics["over_budget_searches"] += 1
+            print(f"Hybrid search took {elapsed_ms:.1f}ms, over the {HYBRID_LATENCY_BUDGET_MS}ms budget")
+
+    def get_metrics(self):
+        metrics = dict(self.metrics)
+        latencies = sorted(self._latencies)
+        if latencies:
+            metrics["search_p50_ms"] = round(latencies[len(latencies) // 2], 2)
+            metrics["search_p99_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 2)
+        metrics["hybrid"] = self.hybrid
+        metrics["latency_budget_ms"] = HYBRID_LATENCY_BUDGET_MS
+        metrics["rss_bytes"] = resident_memory_bytes()
+        metrics["pid"] = os.getpid()
+        return metrics
+
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever():
+    """Return the process-wide retriever, creating it on first use"""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = FindUsersRetriever()
+    return _retriever
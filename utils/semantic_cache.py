@@ -0,0 +1,111 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+
+
+class SemanticCache:
+    """
+    In-process cache of answers keyed by query embedding.
+
+    A lookup returns the most similar cached answer whose cosine similarity
+    to the incoming query is at least `threshold`. Entries live in one
+    partition per tenant and are never served across tenants. Each partition
+    is an LRU capped at `max_entries`, and entries expire after `ttl` seconds.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._partitions = {}
+        self._lock = threading.Lock()
+        self._next_key = 0
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, partition, now):
+        expired = [key for key, entry in partition.items() if now - entry["created_at"] > self.ttl]
+        for key in expired:
+            del partition[key]
+        self.metrics["expirations"] += len(expired)
+
+    def lookup(self, tenant, vector):
+        """Return (value, similarity, key) for the closest fresh entry above the threshold, else None"""
+        vector = self._normalize(vector)
+        now = time.time()
+        with self._lock:
+            partition = self._partitions.get(tenant)
+            if partition:
+                self._expire(partition, now)
+            if not partition:
+                self.metrics["misses"] += 1
+                return None
+
+            keys = list(partition.keys())
+            matrix = np.stack([partition[key]["vector"] for key in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.metrics["misses"] += 1
+                return None
+
+            key = keys[best]
+            partition.move_to_end(key)
+            self.metrics["hits"] += 1
+            return partition[key]["value"], float(scores[best]), key
+
+    def store(self, tenant, vector, value):
+        """Cache `value` and return its key, for later annotate() calls"""
+        with self._lock:
+            partition = self._partitions.setdefault(tenant, OrderedDict())
+            self._next_key += 1
+            key = self._next_key
+            partition[key] = {
+                "vector": self._normalize(vector),
+                "value": value,
+                "created_at": time.time()
+            }
+            while len(partition) > self.max_entries:
+                partition.popitem(last=False)
+                self.metrics["evictions"] += 1
+            return key
+
+    def annotate(self, tenant, key, field, values):
+        """
+        Set `field` on the cached cases named in `values`, e.g. explanations
+        that arrived after the entry was stored. The value is replaced rather
+        than edited, so answers already handed out are left alone. A no-op
+        once the entry has expired or been evicted.
+        """
+        with self._lock:
+            entry = self._partitions.get(tenant, {}).get(key)
+            if entry is None:
+                return False
+            entry["value"] = {
+                name: {**case, field: values[name]} if name in values else case
+                for name, case in entry["value"].items()
+            }
+            return True
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics["entries"] = sum(len(p) for p in self._partitions.values())
+            metrics["tenants"] = len(self._partitions)
+        lookups = metrics["hits"] + metrics["misses"]
+        metrics["hit_rate"] = round(metrics["hits"] / lookups, 4) if lookups else 0.0
+        metrics["threshold"] = self.threshold
+        return metrics
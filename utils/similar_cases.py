@@ -0,0 +1,126 @@
+import os
+import threading
+from dotenv import load_dotenv
+from utils.llm_gateway import generate_json
+from utils.llm_schemas import explanations_schema, SchemaError
+from utils.prompt_budget import compact_json, dedup_chunks, fit_text, QUERY_TOKEN_BUDGET, CASES_TOKEN_BUDGET
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+# Structured fields stored next to each vector and rendered by findusers.html
+CASE_FIELDS = ["OID", "name", "advocate", "Query", "state_of_resolvation", "how_it_got_resolved"]
+_FIELD_LOOKUP = {field.lower(): field for field in CASE_FIELDS}
+
+
+def parse_case_text(text):
+    """Read `Field: value` lines out of a legacy knowledge-base chunk"""
+    case = {}
+    for line in text.splitlines():
+        key, sep, value = line.partition(":")
+        field = _FIELD_LOOKUP.get(key.strip().strip("*-# ").lower())
+        if sep and field and field not in case:
+            case[field] = value.strip()
+    return case
+
+
+def case_from_document(doc):
+    """Build a similar_queries entry from a retrieved document"""
+    case = {field: doc.metadata[field] for field in CASE_FIELDS if doc.metadata.get(field)}
+    if len(case) < len(CASE_FIELDS):
+        for field, value in parse_case_text(doc.page_content).items():
+            case.setdefault(field, value)
+
+    case.setdefault("OID", doc.metadata.get("doc_id") or doc.metadata.get("source", ""))
+    case.setdefault("name", "Anonymous")
+    case.setdefault("advocate", "Unknown")
+    case.setdefault("Query", doc.page_content[:300])
+    case.setdefault("state_of_resolvation", "Unknown")
+    case.setdefault("how_it_got_resolved", "")
+    return case
+
+
+def build_similar_queries(docs):
+    """Turn retrieval results into the {"Query1": {...}, ...} payload, one entry per case"""
+    similar = {}
+    seen = set()
+    for doc in docs:
+        case = case_from_document(doc)
+        if case["OID"] in seen:
+            continue
+        seen.add(case["OID"])
+        similar[f"Query{len(similar) + 1}"] = case
+    return similar
+
+
+class ExplainSuccess:
+    """Optional LLM enrichment: explain why each similar case succeeded"""
+
+    def __init__(self, query, similar_queries, api_key=GEMINI_API_KEY):
+        self.query = query
+        self.similar_queries = similar_queries
+        self.api_key = api_key
+        self.system_prompt = """
+You are a legal AI assistant. For each resolved case below, explain in one or two
+sentences why it succeeded and what the user with the new query can learn from it.
+
+Return ONLY a valid JSON object mapping each case key to its explanation:
+{"Query1": "string", "Query2": "string"}
+"""
+
+    def call_api(self):
+        try:
+            # Near-identical retrieved cases add tokens but nothing to explain
+            keys = dedup_chunks(
+                list(self.similar_queries), CASES_TOKEN_BUDGET,
+                text=lambda key: f"{self.similar_queries[key].get('Query', '')} {self.similar_queries[key].get('how_it_got_resolved', '')}"
+            )
+            cases = compact_json({key: self.similar_queries[key] for key in keys})
+            full_prompt = f"{self.system_prompt}\n\nUser Query: {fit_text(self.query, QUERY_TOKEN_BUDGET)}\n\nCases: {cases}"
+            try:
+                return generate_json(full_prompt, explanations_schema(keys), "explain_success",
+                                     api_key=self.api_key)
+            except SchemaError:
+                return {}
+
+        except Exception as e:
+            print(f"ExplainSuccess failed: {str(e)}")
+            return {}
+
+
+def explain_in_background(answers_col, query_id, user_id, query_text, similar_queries, on_explained=None):
+    """
+    Run ExplainSuccess off the request thread and store the result next to
+    the cached answer. `on_explained`, if given, also receives the
+    {key: explanation} map, e.g. to keep a semantic cache entry in step.
+    """
+    def run():
+        explanations = ExplainSuccess(query_text, similar_queries).call_api()
+        explanations = {key: str(text) for key, text in (explanations or {}).items() if key in similar_queries}
+        if not explanations:
+            return
+        answers_col.update_one({"query_id": query_id, "user_id": user_id}, {"$set": {
+            f"result.similar_queries.{key}.why_it_succeeded": text for key, text in explanations.items()
+        }})
+        if on_explained is not None:
+            on_explained(explanations)
+
+    thread = threading.Thread(target=run, name=f"explain-{query_id}", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    # One-off migration: copy the structured fields of every legacy chunk into
+    # its metadata and publish the result as a new index version
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from utils.index_store import IndexStore
+    from utils.retriever import EMBEDDING_MODEL_NAME
+
+    store = IndexStore()
+    _, vectorstore = store.load(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME), writable=True)
+    for doc_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(doc_id)
+        doc.metadata.update(case_from_document(doc))
+        doc.metadata["doc_id"] = doc_id
+    store.publish(vectorstore, tombstones=store.load_tombstones())
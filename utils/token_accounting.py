@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+# Used when the response carries no usage_metadata (stub backend, failed streams)
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "4"))
+# Gemini bills each inline image as a fixed number of tokens
+TOKENS_PER_IMAGE = int(os.getenv("TOKENS_PER_IMAGE", "258"))
+# Mongo rollups are flushed after this many calls or seconds, whichever comes first
+TOKEN_FLUSH_EVERY = int(os.getenv("TOKEN_FLUSH_EVERY", "50"))
+TOKEN_FLUSH_SECONDS = float(os.getenv("TOKEN_FLUSH_SECONDS", "60"))
+
+FIELDS = ("calls", "prompt_tokens", "response_tokens", "estimated_calls")
+
+
+def estimate_tokens(text):
+    """Rough token count of a string; good enough for budgets and for calls without usage data"""
+    if not text:
+        return 0
+    return max(1, int(len(text) / CHARS_PER_TOKEN + 0.5))
+
+
+def estimate_prompt_tokens(contents):
+    total = 0
+    for part in contents:
+        if isinstance(part, str):
+            total += estimate_tokens(part)
+        elif getattr(part, "inline_data", None) is not None:
+            total += TOKENS_PER_IMAGE
+        else:
+            total += estimate_tokens(getattr(part, "text", None) or "")
+    return total
+
+
+def usage_of(resp, contents, text):
+    """
+    (prompt_tokens, response_tokens, estimated) for one call. Gemini's
+    usage_metadata is used when present; otherwise both sides are estimated.
+    """
+    usage = getattr(resp, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    response = getattr(usage, "candidates_token_count", None)
+    if prompt is not None:
+        return prompt, response or 0, False
+    return estimate_prompt_tokens(contents), estimate_tokens(text), True
+
+
+class TokenLedger:
+    """
+    Prompt/response token counts per route.
+
+    Totals since start are kept in memory for /api/metrics. With a Mongo
+    collection attached, the same counts are also rolled up into one
+    document per (route, hour), written in batched $inc upserts so the
+    cost report spans all workers without a write per call.
+    """
+
+    def __init__(self, collection=None, flush_every=TOKEN_FLUSH_EVERY, flush_seconds=TOKEN_FLUSH_SECONDS):
+        self.collection = collection
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._totals = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self._pending = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+        self._pending_calls = 0
+        self._flushed_at = time.monotonic()
+        self.metrics = {"flushes": 0, "errors": 0}
+
+        if self.collection is not None:
+            try:
+                self.collection.create_index([("route", 1), ("hour", -1)])
+            except Exception as e:
+                print(f"Token ledger index setup failed: {str(e)}")
+
+    def record(self, route, prompt_tokens, response_tokens, estimated=False):
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        delta = {"calls": 1, "prompt_tokens": prompt_tokens, "response_tokens": response_tokens,
+                 "estimated_calls": int(estimated)}
+        with self._lock:
+            for field, value in delta.items():
+                self._totals[route][field] += value
+                if self.collection is not None:
+                    self._pending[(route, hour)][field] += value
+            self._pending_calls += 1
+            due = self._pending_calls >= self.flush_every or time.monotonic() - self._flushed_at >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write pending counts to the hourly rollups"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+            self._pending_calls = 0
+            self._flushed_at = time.monotonic()
+        if self.collection is None or not pending:
+            return
+
+        for (route, hour), counts in pending.items():
+            try:
+                self.collection.update_one(
+                    {"_id": f"{route}:{hour:%Y%m%d%H}"},
+                    {"$inc": counts, "$set": {"route": route, "hour": hour}},
+                    upsert=True
+                )
+            except Exception as e:
+                self.metrics["errors"] += 1
+                print(f"Token ledger flush failed: {str(e)}")
+        self.metrics["flushes"] += 1
+
+    def rollup(self, hours=24):
+        """Per-route totals over the last `hours` from Mongo, across all workers"""
+        if self.collection is None:
+            return {}
+        since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=hours)
+        pipeline = [
+            {"$match": {"hour": {"$gte": since}}},
+            {"$group": {"_id": "$route", **{field: {"$sum": f"${field}"} for field in FIELDS}}}
+        ]
+        return {doc.pop("_id"): doc for doc in self.collection.aggregate(pipeline)}
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = {route: dict(counts) for route, counts in self._totals.items()}
+        for counts in metrics.values():
+            counts["avg_prompt_tokens"] = round(counts["prompt_tokens"] / counts["calls"], 1)
+        return {"routes": metrics, **self.metrics, "persistent": self.collection is not None}
@@ -0,0 +1,169 @@
+import os
+import time
+import fcntl
+import tempfile
+from datetime import datetime
+from bson import ObjectId
+from dotenv import load_dotenv
+from utils.blob_store import BLOB_CHUNK_SIZE
+
+load_dotenv()
+# Partial uploads are assembled here; every worker on the host must see the same directory
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "legal_ease_uploads"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+# Size of the pieces clients are asked to send
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(5 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+
+
+class UploadError(Exception):
+    """A request the upload protocol rejects; `status` is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class UploadSessions:
+    """
+    Resumable uploads in fixed-size pieces.
+
+    A session is created with the total size, then the client PUTs
+    consecutive byte ranges. Each piece is streamed from the request body
+    to a part file, so a worker never holds more than BLOB_CHUNK_SIZE of it.
+    The offset check, the write and the offset update all happen under an
+    flock on the part file, so a retried or duplicated piece cannot
+    overwrite bytes another request has already had accepted. After a
+    dropped connection the client asks for the offset and continues from
+    there. complete() streams the finished file into the blob store.
+    """
+
+    def __init__(self, collection, directory=UPLOAD_DIR, max_size=UPLOAD_MAX_BYTES, ttl=UPLOAD_SESSION_TTL):
+        self.collection = collection
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            self.collection.create_index("created_at", expireAfterSeconds=self.ttl)
+        except Exception as e:
+            print(f"Upload session index setup failed: {str(e)}")
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.directory, f"{upload_id}.part")
+
+    def _purge_stale(self):
+        """Part files outlive their session documents when the TTL index removes those"""
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except OSError:
+                pass
+
+    def create(self, owner, filename, size, content_type=""):
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError("size must be a positive number of bytes")
+        if size > self.max_size:
+            raise UploadError(f"File too large. Maximum {self.max_size} bytes allowed.", status=413)
+
+        self._purge_stale()
+        upload_id = str(ObjectId())
+        open(self._part_path(upload_id), "wb").close()
+        self.collection.insert_one({
+            "_id": upload_id,
+            "owner": owner,
+            "filename": filename,
+            "content_type": content_type,
+            "size": size,
+            "offset": 0,
+            "created_at": datetime.utcnow()
+        })
+        return {"upload_id": upload_id, "offset": 0, "size": size, "chunk_size": UPLOAD_CHUNK_SIZE}
+
+    def get(self, upload_id, owner):
+        session = self.collection.find_one({"_id": upload_id, "owner": owner})
+        if not session:
+            raise UploadError("Upload not found", status=404)
+        return session
+
+    def _lock_part(self, f, upload_id, owner):
+        """Take the part file's flock without waiting; one request writes an upload at a time"""
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError("Another piece of this upload is being written", status=409,
+                              offset=self.get(upload_id, owner)["offset"])
+
+    def append(self, upload_id, owner, start, stream, length):
+        """Write `length` bytes read from `stream` at `start`; returns the new offset"""
+        self.get(upload_id, owner)
+        try:
+            f = open(self._part_path(upload_id), "r+b")
+        except FileNotFoundError:
+            raise UploadError("Upload not found", status=404)
+
+        with f:
+            self._lock_part(f, upload_id, owner)
+            # Read under the lock, so the offset cannot move before the write below
+            session = self.get(upload_id, owner)
+            if start != session["offset"]:
+                raise UploadError("Offset mismatch", status=409, offset=session["offset"])
+            if length <= 0 or start + length > session["size"]:
+                raise UploadError("Chunk runs past the declared size", offset=session["offset"])
+
+            # Drop whatever an interrupted attempt left after the accepted offset
+            f.truncate(start)
+            f.seek(start)
+            written = 0
+            while written < length:
+                chunk = stream.read(min(BLOB_CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+            if written != length:
+                raise UploadError("Chunk body shorter than its Content-Range", offset=session["offset"])
+            f.flush()
+
+            updated = self.collection.update_one(
+                {"_id": upload_id, "offset": start},
+                {"$set": {"offset": start + length, "created_at": datetime.utcnow()}}
+            )
+            if updated.matched_count == 0:
+                # The session was completed or expired while this piece was written
+                raise UploadError("Offset mismatch", status=409, offset=self.get(upload_id, owner)["offset"])
+            return start + length
+
+    def complete(self, upload_id, owner, blob_store, max_size=None):
+        """Move a fully received upload into the blob store; returns (key, size, session)"""
+        session = self.get(upload_id, owner)
+        if session["offset"] != session["size"]:
+            raise UploadError("Upload is not complete", status=409, offset=session["offset"])
+
+        path = self._part_path(upload_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            raise UploadError("Upload not found", status=404)
+
+        with f:
+            self._lock_part(f, upload_id, owner)
+            # Claimed under the lock, so a second complete() that locks after this one is refused
+            claimed = self.collection.update_one(
+                {"_id": upload_id, "owner": owner, "completing": {"$ne": True}},
+                {"$set": {"completing": True}}
+            )
+            if claimed.matched_count == 0:
+                raise UploadError("Upload not found", status=404)
+            try:
+                key, size = blob_store.put_file(f, max_size=max_size)
+            except Exception:
+                self.collection.update_one({"_id": upload_id}, {"$set": {"completing": False}})
+                raise
+            os.unlink(path)
+            self.collection.delete_one({"_id": upload_id})
+        return key, size, session
@@ -0,0 +1,55 @@
+import os
+from dotenv import load_dotenv
+
+from utils.llm_gateway import generate_json
+from utils.llm_schemas import STRATEGY_VERIFICATION, SchemaError
+
+load_dotenv()
+GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+
+
+class StrategyVerifier:
+    def __init__(self, case_title, strategy, milestones, api_key=GEMINI_API_KEY):
+        self.case_title = case_title
+        self.strategy = strategy
+        self.milestones = milestones
+        self.api_key = api_key
+        self.system_prompt = """
+You are a senior legal reviewer. Assess the lawyer's strategy for the case below
+against its milestones.
+
+Return ONLY a valid JSON object:
+{
+  "analysis": "string",
+  "strengths": ["string"],
+  "weaknesses": ["string"],
+  "improvements": ["string"],
+  "suggested_deadlines": [{"task": "string", "due_date": "YYYY-MM-DD"}]
+}
+"""
+
+    def _milestone_lines(self):
+        lines = []
+        for m in self.milestones:
+            due = m.get("due_date")
+            due = due.strftime("%Y-%m-%d") if hasattr(due, "strftime") else (due or "no date")
+            lines.append(f"- {m.get('milestone_name', 'Milestone')} (due {due}, {m.get('status', 'not_started')})")
+        return "\n".join(lines) or "No milestones yet."
+
+    def call_api(self):
+        try:
+            full_prompt = (
+                f"{self.system_prompt}\n\nCase: {self.case_title}\n\nStrategy: {self.strategy}"
+                f"\n\nMilestones:\n{self._milestone_lines()}"
+            )
+            try:
+                return generate_json(full_prompt, STRATEGY_VERIFICATION, "strategy_verification", api_key=self.api_key)
+            except SchemaError:
+                return {"analysis": "Could not verify the strategy properly."}
+
+        except Exception as e:
+            return {"analysis": f"API call failed: {str(e)}"}
+
+
+def run_gemini_verification(case_title, strategy, milestones):
+    return StrategyVerifier(case_title, strategy, milestones).call_api()